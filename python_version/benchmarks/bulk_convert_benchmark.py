@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Bulk SDF Conversion Benchmark
+
+Measures records/second of the SDF-to-XYZ conversion pipeline with the RDKit path and the
+fallback parser, in-process and with increasing numbers of worker processes.
+
+Usage: python benchmarks/bulk_convert_benchmark.py [--input FILE.sdf[.gz]] [--records N]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pubchem_mcp_server.xyz_utils import RDKIT_AVAILABLE, generate_3d_from_smiles
+from pubchem_mcp_server.bulk_convert import convert_sdf
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem
+
+# Fragments joined at random into drug-like molecules
+FRAGMENTS = ["c1ccccc1", "c1ccncc1", "C1CCNCC1", "C1CCOCC1", "C(=O)N", "C(=O)O", "OC", "N(C)C",
+             "c1ccc(F)cc1", "c1ccc(Cl)cc1", "S(=O)(=O)N", "CC", "C(C)C", "c1cnc2ccccc2c1", "C#N"]
+
+# Distinct molecules embedded; they are repeated under new CIDs up to the requested count
+DISTINCT_MOLECULES = 200
+
+
+def write_sdf(path: str, count: int) -> None:
+    rng = random.Random(0)
+    blocks = []
+    while len(blocks) < DISTINCT_MOLECULES:
+        mol = generate_3d_from_smiles("".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(2, 5))))
+        if mol is not None:
+            blocks.append(Chem.MolToMolBlock(mol))
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for cid in range(1, count + 1):
+            block = blocks[cid % len(blocks)]
+            f.write(f"{cid}{block[block.index(chr(10)):]}> <PUBCHEM_COMPOUND_CID>\n{cid}\n\n$$$$\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk SDF conversion benchmark")
+    parser.add_argument("--input", help="SDF file to convert (default: a generated gzipped SDF)")
+    parser.add_argument("--records", type=int, default=20000, help="Records to generate")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, cpus // 2, cpus} - {0})
+    with tempfile.TemporaryDirectory() as temp:
+        input_path = args.input
+        if not input_path:
+            if not RDKIT_AVAILABLE:
+                sys.exit("RDKit is required to generate the input, or pass --input")
+            input_path = os.path.join(temp, "input.sdf.gz")
+            write_sdf(input_path, args.records)
+        print(f"{cpus} CPUs")
+        paths = [("RDKit", True)] if RDKIT_AVAILABLE else []
+        for label, use_rdkit in paths + [("fallback parser", False)]:
+            print(label)
+            for workers in worker_counts:
+                stats = convert_sdf(input_path, os.path.join(temp, "output.xyz"), workers=workers,
+                                    use_rdkit=use_rdkit)
+                print(f"  {workers:>3} workers: {stats.records} records in {stats.elapsed:6.2f}s = "
+                      f"{stats.records_per_second:8.0f} records/s ({stats.failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Conformer Generation Benchmark
+
+Compares conformers/second of the single-conformer path (generate_3d_from_smiles, called
+once per conformer) with batched ensemble generation, single- and multithreaded.
+
+Usage: python benchmarks/conformer_benchmark.py [--conformers N] [--rounds R]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pubchem_mcp_server.xyz_utils import RDKIT_AVAILABLE, generate_3d_from_smiles
+from pubchem_mcp_server.conformers import generate_conformers
+
+# Drug-like molecules of increasing flexibility
+MOLECULES = {
+    "aspirin": "CC(=O)OC1=CC=CC=C1C(=O)O",
+    "ibuprofen": "CC(C)CC1=CC=C(C=C1)C(C)C(=O)O",
+    "imatinib": "CC1=C(C=C(C=C1)NC(=O)C2=CC=C(C=C2)CN3CCN(CC3)C)NC4=NC=CC(=N4)C5=CN=CC=C5",
+    "atorvastatin": "CC(C)C1=C(C(=C(N1CCC(CC(CC(=O)O)O)O)C2=CC=C(C=C2)F)C3=CC=CC=C3)C(=O)NC4=CC=CC=C4",
+}
+
+
+def rate(label: str, conformers: int, seconds: float) -> None:
+    print(f"  {label:<28} {conformers:>4} conformers in {seconds:7.2f}s = {conformers / seconds:8.1f}/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Conformer generation benchmark")
+    parser.add_argument("--conformers", type=int, default=20, help="Conformers per molecule")
+    parser.add_argument("--rounds", type=int, default=1, help="Repetitions of each measurement")
+    args = parser.parse_args()
+
+    if not RDKIT_AVAILABLE:
+        sys.exit("RDKit is required for this benchmark")
+    logging.disable(logging.INFO)
+    print(f"{os.cpu_count()} CPUs, {args.conformers} conformers per molecule")
+
+    for name, smiles in MOLECULES.items():
+        print(name)
+        start = time.perf_counter()
+        for _ in range(args.rounds * args.conformers):
+            generate_3d_from_smiles(smiles)
+        rate("single-conformer path", args.rounds * args.conformers, time.perf_counter() - start)
+
+        for label, threads in (("ensemble, 1 thread", 1), ("ensemble, all threads", 0)):
+            produced = 0
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                # No pruning, so every run yields the same number of conformers
+                ensemble = generate_conformers(smiles, args.conformers, rms_threshold=-1.0, num_threads=threads)
+                produced += ensemble.GetNumConformers()
+            rate(label, produced, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Soak Test
+
+Runs the stdio server for a long time against a local PubChem stub and checks that its
+resource usage levels off. Queries follow a Zipfian distribution over the stub's compounds,
+so a few are hot and the long tail keeps adding new ones, as in real use.
+
+The server's RSS, open file descriptors, sockets, log and structure cache size are sampled
+at intervals. After warm-up, SIGUSR2 makes the server start tracemalloc, and each later sample
+sends it again so the server writes a report of Python allocation growth (see profiling.py).
+The test fails if, between the start and the end of the measured period, RSS, traced memory,
+file descriptors or sockets grow by more than the thresholds.
+
+Usage: python benchmarks/soak_test.py [--duration SECONDS] [--warmup SECONDS] [--compounds N]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import accumulate
+from typing import Any, Dict, List, Optional
+
+# Try to import psutil, process statistics are read from /proc if not available
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mcp_server.py")
+
+# Fragments joined into each stub compound's SMILES
+FRAGMENTS = ["c1ccccc1", "c1ccncc1", "C1CCNCC1", "C1CCOCC1", "C(=O)N", "C(=O)O", "OC", "N(C)C",
+             "c1ccc(F)cc1", "c1ccc(Cl)cc1", "S(=O)(=O)N", "CC", "C(C)C", "C#N"]
+
+# 3D record served for every compound, with the CID as its title
+SDF_TEMPLATE = """{cid}
+  -OEChem-
+
+  3  2  0     0  0  0  0  0  0999 V2000
+   -1.2131   -0.2269    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    0.0000    0.6548    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    1.1638   -0.1614    0.0000 O   0  0  0  0  0  0  0  0  0  0  0  0
+  1  2  1  0  0  0  0
+  2  3  1  0  0  0  0
+M  END
+> <PUBCHEM_COMPOUND_CID>
+{cid}
+
+$$$$
+"""
+
+# Samples at the start and end of the measured period whose medians are compared
+EDGE_SAMPLES = 3
+
+TRACED_MEMORY = re.compile(r"Traced memory: current ([\d.]+) MB")
+
+
+def compound_properties(cid: int) -> Dict[str, Any]:
+    rng = random.Random(cid)
+    smiles = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 3)))
+    digest = hashlib.sha1(str(cid).encode()).digest()
+    letters = "".join(chr(ord("A") + b % 26) for b in digest)
+    return {
+        "CID": cid,
+        "MolecularFormula": f"C{cid % 40 + 1}H{cid % 60 + 2}O{cid % 5}",
+        "MolecularWeight": f"{100 + cid % 500}.{cid % 100:02d}",
+        "CanonicalSMILES": smiles,
+        "ConnectivitySMILES": smiles,
+        "IsomericSMILES": smiles,
+        "SMILES": smiles,
+        "InChI": f"InChI=1S/stub{cid}",
+        "InChIKey": f"{letters[:14]}-{letters[14:20]}SA-N",
+        "IUPACName": f"stub compound {cid}",
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """PUG REST property and SDF record endpoints for compounds 1..compounds"""
+
+    compounds = 10000
+    property_pattern = re.compile(r"/compound/(cid|name)/([^/]+)/property/([^/]+)/JSON")
+    record_pattern = re.compile(r"/compound/cid/(\d+)/record/SDF")
+
+    def do_GET(self) -> None:
+        match = self.property_pattern.search(self.path)
+        if match:
+            kind, identifiers, properties = match.groups()
+            rows = []
+            for identifier in identifiers.split(","):
+                cid = int(identifier) if kind == "cid" else int(re.sub(r"\D", "", identifier) or 0)
+                if 1 <= cid <= self.compounds:
+                    known = compound_properties(cid)
+                    rows.append({"CID": cid, **{p: known[p] for p in properties.split(",") if p in known}})
+            if rows:
+                self.respond(200, json.dumps({"PropertyTable": {"Properties": rows}}), "application/json")
+            else:
+                self.respond(404, json.dumps({"Fault": {"Code": "PUGREST.NotFound"}}), "application/json")
+            return
+        match = self.record_pattern.search(self.path)
+        if match and 1 <= int(match.group(1)) <= self.compounds:
+            self.respond(200, SDF_TEMPLATE.format(cid=match.group(1)), "chemical/x-mdl-sdfile")
+            return
+        self.respond(404, "{}", "application/json")
+
+    def respond(self, status: int, body: str, content_type: str) -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ServerDriver:
+    """Sends tool calls to a stdio server subprocess, keeping a fixed number in flight"""
+
+    def __init__(self, process: subprocess.Popen, concurrency: int):
+        self.process = process
+        self.slots = threading.Semaphore(concurrency)
+        self.lock = threading.Lock()
+        self.sent: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.responses = 0
+        self.errors = 0
+        self.next_id = 0
+        self.reader = threading.Thread(target=self.read, daemon=True)
+        self.reader.start()
+
+    def send(self, method: str, params: Dict[str, Any]) -> None:
+        while not self.slots.acquire(timeout=1.0):
+            if self.process.poll() is not None:
+                sys.exit(f"Server exited with code {self.process.returncode}")
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+            self.sent[request_id] = time.perf_counter()
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+
+    def read(self) -> None:
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            with self.lock:
+                started = self.sent.pop(message.get("id"), None)
+                if started is None:
+                    continue
+                self.latencies.append(time.perf_counter() - started)
+                self.responses += 1
+                result = message.get("result") or {}
+                if "error" in message or result.get("isError"):
+                    self.errors += 1
+            self.slots.release()
+
+    def take_latencies(self) -> List[float]:
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def process_stats(pid: int) -> Dict[str, float]:
+    """RSS (MB), open file descriptors and sockets of a process"""
+    if PSUTIL_AVAILABLE:
+        process = psutil.Process(pid)
+        connections = getattr(process, "net_connections", process.connections)
+        return {"rss_mb": process.memory_info().rss / 1e6, "fds": process.num_fds(),
+                "sockets": len(connections(kind="all"))}
+    with open(f"/proc/{pid}/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    links = []
+    for fd in os.listdir(f"/proc/{pid}/fd"):
+        try:
+            links.append(os.readlink(f"/proc/{pid}/fd/{fd}"))
+        except OSError:
+            pass
+    return {"rss_mb": rss_kb / 1e3, "fds": len(links),
+            "sockets": sum(link.startswith("socket:") for link in links)}
+
+
+def directory_stats(path: str, pattern: str = "**/*") -> Dict[str, float]:
+    files = [f for f in glob.glob(os.path.join(path, pattern), recursive=True) if os.path.isfile(f)]
+    return {"files": len(files), "mb": sum(os.path.getsize(f) for f in files) / 1e6}
+
+
+def memory_report(profile_dir: str, pid: int, known: set, timeout: float = 30.0) -> Optional[str]:
+    """Ask the server for a tracemalloc report and wait for it to be written"""
+    os.kill(pid, signal.SIGUSR2)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for path in glob.glob(os.path.join(profile_dir, "*.memory.txt")):
+            if path not in known:
+                known.add(path)
+                time.sleep(0.2)
+                with open(path) as f:
+                    return f.read()
+        time.sleep(0.2)
+    return None
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def growth(samples: List[Dict[str, Any]], key: str) -> Optional[float]:
+    values = [s[key] for s in samples if s.get(key) is not None]
+    if len(values) < 2 * EDGE_SAMPLES:
+        return None
+    return statistics.median(values[-EDGE_SAMPLES:]) - statistics.median(values[:EDGE_SAMPLES])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server soak test")
+    parser.add_argument("--duration", type=float, default=3600, help="Seconds of load after warm-up")
+    parser.add_argument("--warmup", type=float, default=300, help="Seconds of load before measuring")
+    parser.add_argument("--compounds", type=int, default=10000, help="Compounds served by the stub")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of compound popularity")
+    parser.add_argument("--concurrency", type=int, default=4, help="Tool calls in flight")
+    parser.add_argument("--xyz-fraction", type=float, default=0.2, help="Fraction of queries for XYZ structures")
+    parser.add_argument("--name-fraction", type=float, default=0.1, help="Fraction of queries by name")
+    parser.add_argument("--sample-interval", type=float, default=30, help="Seconds between samples")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=32)
+    parser.add_argument("--max-traced-growth-mb", type=float, default=16)
+    parser.add_argument("--max-fd-growth", type=int, default=16)
+    parser.add_argument("--max-socket-growth", type=int, default=8)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Don't collect tracemalloc reports")
+    parser.add_argument("--output", help="Write the samples to this JSON lines file")
+    parser.add_argument("--home", help="Server home directory (default: a temporary directory)")
+    args = parser.parse_args()
+    use_tracemalloc = not args.no_tracemalloc and hasattr(signal, "SIGUSR2")
+
+    StubHandler.compounds = args.compounds
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    temp = None if args.home else tempfile.TemporaryDirectory()
+    home = args.home or temp.name
+    profile_dir = os.path.join(home, "profiles")
+    env = dict(os.environ, HOME=home, PUBCHEM_MCP_PROFILE_DIR=profile_dir,
+               PUBCHEM_MCP_PUBCHEM_URL=f"http://127.0.0.1:{stub.server_address[1]}/rest/pug")
+    server_log = open(os.path.join(home, "server-stderr.log"), "w")
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=server_log, text=True, bufsize=1, env=env)
+    driver = ServerDriver(process, args.concurrency)
+    driver.send("initialize", {"protocolVersion": "2024-11-05", "capabilities": {},
+                               "clientInfo": {"name": "soak-test", "version": "1"}})
+    print(f"Server pid {process.pid}, home {home}, stub on port {stub.server_address[1]}")
+
+    rng = random.Random(0)
+    cum_weights = zipf_weights(args.compounds, args.zipf)
+    cids = range(1, args.compounds + 1)
+    started = time.monotonic()
+    measuring_from = started + args.warmup
+    next_sample = started + args.sample_interval
+    samples: List[Dict[str, Any]] = []
+    known_reports: set = set()
+    last_report: Optional[str] = None
+    tracing = False
+    output = open(args.output, "w") if args.output else None
+
+    try:
+        while time.monotonic() < measuring_from + args.duration:
+            cid = rng.choices(cids, cum_weights=cum_weights)[0]
+            roll = rng.random()
+            if roll < args.xyz_fraction:
+                arguments = {"query": str(cid), "format": "XYZ", "include_3d": True}
+            elif roll < args.xyz_fraction + args.name_fraction:
+                arguments = {"query": f"stubcompound{cid}"}
+            else:
+                arguments = {"query": str(cid)}
+            driver.send("tools/call", {"name": "get_pubchem_data", "arguments": arguments})
+
+            now = time.monotonic()
+            if now < next_sample:
+                continue
+            next_sample = now + args.sample_interval
+            measured = now >= measuring_from
+            sample: Dict[str, Any] = {"elapsed": round(now - started, 1), "measured": measured,
+                                      "responses": driver.responses, "errors": driver.errors}
+            sample.update(process_stats(process.pid))
+            latencies = sorted(driver.take_latencies())
+            if latencies:
+                sample["p50_ms"] = latencies[len(latencies) // 2] * 1e3
+                sample["p99_ms"] = latencies[int(len(latencies) * 0.99)] * 1e3
+            sample["log_mb"] = directory_stats(home, ".pubchem-mcp/*.log")["mb"]
+            cache = directory_stats(os.path.join(home, ".pubchem-mcp", "cache"))
+            sample["cache_files"], sample["cache_mb"] = cache["files"], cache["mb"]
+            if use_tracemalloc and measured:
+                if not tracing:
+                    # The first signal starts tracemalloc in the server
+                    os.kill(process.pid, signal.SIGUSR2)
+                    tracing = True
+                else:
+                    report = memory_report(profile_dir, process.pid, known_reports)
+                    match = TRACED_MEMORY.search(report or "")
+                    if match:
+                        sample["traced_mb"] = float(match.group(1))
+                        last_report = report
+            samples.append(sample)
+            if output:
+                output.write(json.dumps(sample) + "\n")
+                output.flush()
+            print(" ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in sample.items()))
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        stub.shutdown()
+        server_log.close()
+        if output:
+            output.close()
+
+    measured_samples = [s for s in samples if s["measured"]]
+    if last_report:
+        print("\nLast tracemalloc report (allocation growth between the last two samples):")
+        print("\n".join(last_report.splitlines()[:15]))
+    failures = []
+    for key, limit in (("rss_mb", args.max_rss_growth_mb), ("traced_mb", args.max_traced_growth_mb),
+                       ("fds", args.max_fd_growth), ("sockets", args.max_socket_growth)):
+        change = growth(measured_samples, key)
+        if change is None:
+            continue
+        print(f"{key} growth after warm-up: {change:+.1f} (limit {limit})")
+        if change > limit:
+            failures.append(f"{key} grew by {change:.1f}, more than {limit}")
+    for key in ("log_mb", "cache_files", "cache_mb"):
+        change = growth(measured_samples, key)
+        if change is not None:
+            print(f"{key} growth after warm-up: {change:+.1f}")
+    if temp:
+        temp.cleanup()
+    if len(measured_samples) < 2 * EDGE_SAMPLES:
+        sys.exit(f"Only {len(measured_samples)} samples after warm-up, run longer or sample more often")
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+    print("PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Structure Storage Benchmark
+
+Compares bytes per compound and read latency of the structure cache stored as plain text
+(the previous format), gzip, zstd without a dictionary and zstd with a trained dictionary.
+Records are read from an existing cache directory, or generated with RDKit.
+
+Usage: python benchmarks/structure_store_benchmark.py [--source DIR] [--compounds N]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pubchem_mcp_server.xyz_utils import RDKIT_AVAILABLE, generate_3d_from_smiles, mol_to_xyz
+from pubchem_mcp_server import structure_store
+from pubchem_mcp_server.structure_store import ZSTD_AVAILABLE, StructureStore
+
+if ZSTD_AVAILABLE:
+    import zstandard
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem
+    from rdkit.Chem import rdMolDescriptors
+
+# Fragments joined at random into drug-like molecules
+FRAGMENTS = ["c1ccccc1", "c1ccncc1", "C1CCNCC1", "C1CCOCC1", "C(=O)N", "C(=O)O", "OC", "N(C)C",
+             "c1ccc(F)cc1", "c1ccc(Cl)cc1", "S(=O)(=O)N", "CC", "C(C)C", "c1cnc2ccccc2c1", "C#N"]
+
+# Filesystem block size, small files occupy at least one block
+BLOCK_SIZE = 4096
+
+
+def generate_records(count: int) -> List[str]:
+    rng = random.Random(0)
+    records = []
+    while len(records) < count:
+        smiles = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(2, 5)))
+        mol = generate_3d_from_smiles(smiles)
+        if mol is None:
+            continue
+        info = {"id": str(len(records) + 1), "formula": rdMolDescriptors.CalcMolFormula(mol)}
+        if len(records) % 2:
+            records.append(Chem.MolToMolBlock(mol) + "$$$$\n")
+        else:
+            records.append(mol_to_xyz(mol, info))
+    return records
+
+
+def load_records(source: Path, count: int) -> List[str]:
+    store = StructureStore(source)
+    records = []
+    for name in sorted(set(store.names())):
+        text = store.read(name)
+        if text:
+            records.append(text)
+        if len(records) >= count:
+            break
+    return records
+
+
+def measure(label: str, directory: Path, records: List[str], write: Callable[[Path, str], None],
+            read: Callable[[Path], str]) -> None:
+    paths = [directory / f"{i}.rec" for i in range(len(records))]
+    for path, text in zip(paths, records):
+        write(path, text)
+    # The dictionary is shared by every record, so it is reported separately
+    sizes = [os.path.getsize(path) for path in directory.rglob("*")
+             if path.is_file() and structure_store.DICT_DIR_NAME not in path.parts]
+    logical = sum(sizes) / len(records)
+    on_disk = sum(-(-size // BLOCK_SIZE) * BLOCK_SIZE for size in sizes) / len(records)
+
+    start = time.perf_counter()
+    for path, text in zip(paths, records):
+        assert read(path) == text
+    latency = (time.perf_counter() - start) / len(records) * 1e6
+    print(f"  {label:<24} {logical:9.0f} B/compound {on_disk:9.0f} B on disk {latency:8.1f} us/read")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Structure storage benchmark")
+    parser.add_argument("--source", type=Path, help="Structure cache directory to sample records from")
+    parser.add_argument("--compounds", type=int, default=1000, help="Number of records")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.source:
+        records = load_records(args.source, args.compounds)
+    elif RDKIT_AVAILABLE:
+        records = generate_records(args.compounds)
+    else:
+        sys.exit("RDKit is required to generate records, or pass --source")
+    if not records:
+        sys.exit("No records found")
+    print(f"{len(records)} records, mean {sum(len(r) for r in records) / len(records):.0f} characters")
+
+    formats: List[Tuple[str, Callable, Callable]] = [
+        ("plain text", lambda path, text: path.write_text(text, encoding="utf-8"),
+         lambda path: path.read_text(encoding="utf-8")),
+        ("gzip", lambda path, text: path.write_bytes(gzip.compress(text.encode(), structure_store.GZIP_LEVEL, mtime=0)),
+         lambda path: gzip.decompress(path.read_bytes()).decode()),
+    ]
+    if ZSTD_AVAILABLE:
+        compressor = zstandard.ZstdCompressor(level=structure_store.ZSTD_LEVEL)
+        decompressor = zstandard.ZstdDecompressor()
+        formats.append(("zstd, no dictionary", lambda path, text: path.write_bytes(compressor.compress(text.encode())),
+                        lambda path: decompressor.decompress(path.read_bytes()).decode()))
+
+    with tempfile.TemporaryDirectory() as temp:
+        for i, (label, write, read) in enumerate(formats):
+            directory = Path(temp) / str(i)
+            directory.mkdir()
+            measure(label, directory, records, write, read)
+
+        if ZSTD_AVAILABLE:
+            # The store's own format, with a dictionary trained on a sample of the records
+            store = StructureStore(Path(temp) / "store")
+            sample = records[::max(1, len(records) // structure_store.TRAIN_SAMPLES)]
+            dict_id = store.train_dictionary([text.encode() for text in sample])
+            measure("zstd, trained dictionary", store.directory, records,
+                    lambda path, text: store.write(path.name, text),
+                    lambda path: store.read(path.name))
+            dictionary = store.directory / structure_store.DICT_DIR_NAME / f"{dict_id}.zdict"
+            print(f"  dictionary: {os.path.getsize(dictionary)} B shared by all records")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,203 +12,992 @@ import logging
 import traceback
 import requests
 import re
+import argparse
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import Callable, Dict, Any, Optional, List, Tuple
 
-# Ensure no buffering
-os.environ['PYTHONUNBUFFERED'] = '1'
+# Shared HTTP session (connection pool) and PubChem rate limiter
+from pubchem_mcp_server.upstream import PUBCHEM_REST_URL, pubchem_get, pubchem_post
+from pubchem_mcp_server.context import InflightRequests, RequestCancelled, request_scope
+from pubchem_mcp_server.admission import BATCH, DOWNLOAD, LOOKUP, STRUCTURE, AdmissionController, Overloaded
+from pubchem_mcp_server.xyz_utils import structure_cache
+from pubchem_mcp_server.cache import PropertyCache, EXPIRED
+from pubchem_mcp_server.similarity import FingerprintIndex, fingerprint, similarity_available
+from pubchem_mcp_server.compounds import CompoundStore, read_smiles_file
+from pubchem_mcp_server import substructure
+from pubchem_mcp_server.formula_index import FormulaIndex, NUMPY_AVAILABLE
+from pubchem_mcp_server.inchikey_index import InChIKeyIndex, CONNECTIVITY_PATTERN, is_inchikey
+from pubchem_mcp_server.smiles_index import SmilesIndex, canonical_smiles, inchikey_from_inchi, is_inchi, looks_like_smiles
+from pubchem_mcp_server.conformers import get_conformer_ensemble, ensemble_to_sdf, ensemble_to_xyz, ensemble_to_packed
+from pubchem_mcp_server.packed_xyz import atoms_to_packed, xyz_to_packed
+from pubchem_mcp_server.geometry import ANALYSES, CONTACT_SCALE, analyze, geometry_available, parse_xyz
+from pubchem_mcp_server.descriptors import (DESCRIPTOR_SETS, DescriptorCache, compute_batch, descriptors_available,
+                                            matrix_payload, molecule_key, resolve_descriptor_names, to_matrix)
+from pubchem_mcp_server.bulk_convert import convert_sdf, log_progress
+from pubchem_mcp_server.tracing import current_span, span, trace_request
+from pubchem_mcp_server.profiling import PROFILE_MODES, install_signal_handlers, profile_request, start_profiling
+from pubchem_mcp_server.compound_table import DEFAULT_TABLE_PATH, CompoundTable, build_from_file, open_compound_table
+from pubchem_mcp_server.snapshot import (DEFAULT_SNAPSHOT_PATH, SnapshotError, default_export_path, export_snapshot,
+                                         import_snapshot)
+import contextvars
 
-# Set up logging
-log_dir = os.path.expanduser("~/.pubchem-mcp")
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, f"pubchem_mcp_server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-
-logging.basicConfig(
-    filename=log_file,
-    level=logging.DEBUG,
-    format='[%(asctime)s] [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Module-level code must stay cheap: process pool workers are spawned, and a spawned worker
+# re-imports this script. Files, tables and signal handlers are set up by startup().
 
 logger = logging.getLogger("pubchem_mcp_server")
 
-# Global cache
-_cache: Dict[str, Dict[str, str]] = {}
-
-# Create HTTP session
-def create_session() -> requests.Session:
-    """Create a requests session with retry functionality"""
-    session = requests.Session()
-    retry_strategy = requests.adapters.Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+# Log file of this process, created by setup_logging()
+log_file: Optional[str] = None
+
+# Global cache: fresh entries are served directly, stale ones while refreshing in the background.
+# "cid:<CID>" entries hold every property known for the compound (a superset of what was
+# asked for so far); "name:<name>", "smiles:<canonical SMILES>" and "inchi:<InChI>" entries
+# only map a query to its CID.
+_cache = PropertyCache()
+
+# Read-only compound table shared by every server process on the host through the page cache,
+# consulted after the in-process cache and before PubChem; opened by startup()
+_compound_table: Optional[CompoundTable] = None
+
+# Fingerprints of every compound seen, for local similarity search
+_similarity_index = FingerprintIndex()
+
+# Maximum number of similarity search results
+SIMILARITY_MAX_RESULTS = 1000
+
+# SMILES of every compound seen, and their pattern fingerprints for substructure screening
+_compound_store = CompoundStore()
+_pattern_index = substructure.PatternIndex()
+
+# Maximum number of substructure search results
+SUBSTRUCTURE_MAX_RESULTS = 10000
+
+# Formula and molecular weight of every compound seen, for formula and mass searches
+_formula_index = FormulaIndex()
+
+# Maximum number of formula search results
+FORMULA_MAX_RESULTS = 10000
+
+# InChIKeys of every compound seen, for identity and connectivity lookups
+_inchikey_index = InChIKeyIndex()
+
+# Canonical SMILES of every compound seen and of earlier SMILES queries, for identity lookups
+_smiles_index = SmilesIndex()
+
+# How get_pubchem_data interprets a query
+QUERY_TYPES = ['name', 'cid', 'smiles', 'inchi', 'inchikey']
+
+# InChIKey block of a standard InChIKey without stereo or isotope layers
+NO_STEREO_BLOCK = 'UHFFFAOYSA'
+
+# Descriptor values computed locally, per InChIKey and descriptor
+_descriptor_cache = DescriptorCache()
+
+# Maximum number of SMILES per descriptor request
+DESCRIPTORS_MAX_SMILES = 10000
+
+# Maximum conformers per ensemble
+CONFORMERS_MAX = 300
+
+# Maximum number of requests in a profiling window
+PROFILE_MAX_REQUESTS = 1000
+
+# Administrative tools (profiling) are only listed and accepted when enabled
+ADMIN_TOOLS_ENABLED = os.environ.get("PUBCHEM_MCP_ADMIN_TOOLS", "0") == "1"
+
+# Output formats that return a 3D structure (and require include_3d)
+STRUCTURE_FORMATS = ('XYZ', 'PACKED_XYZ')
+
+# Properties retrieved for every compound, and returned when no properties are requested
+PROPERTIES = [
+    'IUPACName',
+    'MolecularFormula',
+    'MolecularWeight',
+    'CanonicalSMILES',
+    'InChI',
+    'InChIKey'
+]
+
+# Properties that can be requested from PUG REST
+VALID_PROPERTIES = [
+    'MolecularFormula', 'MolecularWeight', 'CanonicalSMILES', 'IsomericSMILES', 'SMILES',
+    'ConnectivitySMILES', 'InChI', 'InChIKey', 'IUPACName', 'Title', 'XLogP', 'ExactMass',
+    'MonoisotopicMass', 'TPSA', 'Complexity', 'Charge', 'HBondDonorCount', 'HBondAcceptorCount',
+    'RotatableBondCount', 'HeavyAtomCount', 'IsotopeAtomCount', 'AtomStereoCount',
+    'DefinedAtomStereoCount', 'UndefinedAtomStereoCount', 'BondStereoCount',
+    'DefinedBondStereoCount', 'UndefinedBondStereoCount', 'CovalentUnitCount', 'PatentCount',
+    'PatentFamilyCount', 'LiteratureCount', 'Volume3D', 'XStericQuadrupole3D',
+    'YStericQuadrupole3D', 'ZStericQuadrupole3D', 'FeatureCount3D', 'FeatureAcceptorCount3D',
+    'FeatureDonorCount3D', 'FeatureAnionCount3D', 'FeatureCationCount3D', 'FeatureRingCount3D',
+    'FeatureHydrophobeCount3D', 'ConformerModelRMSD3D', 'EffectiveRotorCount3D',
+    'ConformerCount3D', 'Fingerprint2D'
+]
+
+# Names PubChem may return a requested property under
+PROPERTY_ALIASES = {
+    'CanonicalSMILES': 'ConnectivitySMILES',
+    'IsomericSMILES': 'SMILES',
+}
+
+# Numeric properties PUG REST returns as text, kept as text in compound tables
+TEXT_PROPERTIES = ['MolecularWeight', 'ExactMass', 'MonoisotopicMass']
+
+# Maximum number of CIDs per batched property request
+PROPERTY_BATCH_SIZE = 100
+
+# Progress callback: (progress, total, message)
+ProgressCallback = Callable[[float, Optional[float], Optional[str]], None]
+
+# Maximum number of compounds fetched concurrently by batch requests
+BATCH_MAX_WORKERS = 4
+
+# Maximum number of queries accepted in one batch request
+BATCH_MAX_SIZE = 100
+
+# Concurrency and queue limits per class of tool call; calls beyond them are shed
+_admission = AdmissionController()
+
+# Class of each tool, for tools whose class does not depend on their arguments.
+# Administrative tools have none and are never shed.
+TOOL_CLASSES = {
+    "get_pubchem_data_batch": BATCH,
+    "download_structure": DOWNLOAD,
+    "similarity_search": LOOKUP,
+    "substructure_search": STRUCTURE,
+    "search_by_formula": LOOKUP,
+    "inchikey_lookup": LOOKUP,
+    "generate_conformers": STRUCTURE,
+    "compute_descriptors": STRUCTURE,
+    "analyze_geometry": STRUCTURE,
+}
+
+# JSON-RPC error code of shed tool calls
+OVERLOADED_ERROR_CODE = -32000
+
+# Maximum number of tool calls processed concurrently per process: every call running or
+# queued within the admission limits has a thread, plus a few for administrative calls
+MAX_CONCURRENT_REQUESTS = _admission.capacity() + 4
+
+# Methods that run on the request pool instead of the reader thread
+TOOL_CALL_METHODS = {"call_tool", "tools/call"}
+
+_request_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="mcp-request")
+
+# In-flight requests of clients that don't track their own (e.g. the stdio loop)
+_inflight = InflightRequests()
+
+def make_progress_reporter(params: Dict[str, Any], notify: Optional[Callable[[Dict[str, Any]], None]]) -> Optional[ProgressCallback]:
+    """Create a callback sending MCP progress notifications, if the client asked for them"""
+    progress_token = (params.get("_meta") or {}).get("progressToken")
+    if progress_token is None or notify is None:
+        return None
+    
+    def report(progress: float, total: Optional[float] = None, message: Optional[str] = None):
+        notification_params = {"progressToken": progress_token, "progress": progress}
+        if total is not None:
+            notification_params["total"] = total
+        if message:
+            notification_params["message"] = message
+        try:
+            notify({
+                "jsonrpc": "2.0",
+                "method": "notifications/progress",
+                "params": notification_params
+            })
+        except Exception as e:
+            logger.warning(f"Failed to send progress notification: {e}")
+    
+    return report
+
+def validate_properties(properties: Any) -> Optional[str]:
+    """Check a requested property list, returning an error message if it is invalid"""
+    if not isinstance(properties, list) or not properties or not all(isinstance(p, str) for p in properties):
+        return "Parameter 'properties' must be a non-empty list of property names"
+    unknown = [p for p in properties if p not in VALID_PROPERTIES]
+    if unknown:
+        return f"Unknown properties: {', '.join(unknown)}"
+    return None
+
+def fetch_properties(identifier_path: str, properties: List[str],
+                     conditional_key: Optional[str] = None,
+                     post_data: Optional[Dict[str, str]] = None) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Optional[str]]]]:
+    """
+    Fetch properties from PubChem for the compound(s) identified by identifier_path.
+    With post_data the identifier is sent in a POST body instead (e.g. identifier_path
+    "smiles" and {"smiles": ...}), so structures of any length and character can be used.
+    Returns (rows, validators), or None if conditional_key's cached entry is unchanged upstream (HTTP 304).
+    Raises LookupError if no compound is found and requests exceptions on HTTP errors.
+    """
+    # Build API URL
+    url = f"{PUBCHEM_REST_URL}/compound/{identifier_path}/property/{','.join(properties)}/JSON"
+    
+    headers = _cache.conditional_headers(conditional_key) if conditional_key else {}
+    if post_data is not None:
+        response = pubchem_post(url, post_data, timeout=180, headers=headers)
+    else:
+        response = pubchem_get(url, timeout=180, headers=headers)
+    if response.status_code == 304 and conditional_key:
+        return None
+    
+    response.raise_for_status()
+    result = response.json()
+    # PubChem answers structures it does not know with CID 0
+    rows = [props for props in result.get('PropertyTable', {}).get('Properties', []) if props and props.get('CID')]
+    
+    if not rows:
+        raise LookupError("Compound not found or no data available")
+    
+    # Create data dictionaries
+    data_rows = []
+    for props in rows:
+        data = {}
+        for prop in properties:
+            value = props.get(prop, props.get(PROPERTY_ALIASES.get(prop, prop), ''))
+            data[prop] = str(value) if prop == 'MolecularWeight' else value
+        data['CID'] = str(props.get('CID'))
+        data_rows.append(data)
+    
+    validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+    return data_rows, validators
+
+def store_properties(data: Dict[str, Any], validators: Optional[Dict[str, Optional[str]]] = None):
+    """Add fetched properties to the compound's cache entry"""
+    cid_key = f"cid:{data['CID']}"
+    known = _cache.peek(cid_key)
+    if known is None or set(data) >= set(known):
+        # A complete record: keep its validators for conditional refreshes
+        _cache.set(cid_key, data, **(validators or {}))
+    else:
+        _cache.merge(cid_key, data)
+    index_properties(data)
+
+def index_properties(data: Dict[str, Any]):
+    """Add a compound's properties to the local search indexes"""
+    if data.get('MolecularFormula') and data.get('MolecularWeight'):
+        # PubChem's values take precedence over ones computed from the SMILES
+        try:
+            _formula_index.add_many([(int(data['CID']), data['MolecularFormula'], float(data['MolecularWeight']))])
+        except ValueError:
+            pass
+    if data.get('InChIKey'):
+        _inchikey_index.add_many([(int(data['CID']), data['InChIKey'])])
+    if data.get('CanonicalSMILES'):
+        index_compounds([(int(data['CID']), data['CanonicalSMILES'])])
+    # CanonicalSMILES has no stereochemistry, so it only identifies compounds without any
+    if data.get('IsomericSMILES'):
+        _smiles_index.add_many([(int(data['CID']), canonical_smiles(data['IsomericSMILES']))])
+    elif data.get('CanonicalSMILES') and data.get('InChIKey', '')[15:25] == NO_STEREO_BLOCK:
+        _smiles_index.add_many([(int(data['CID']), canonical_smiles(data['CanonicalSMILES']))])
+
+def index_compounds(compounds: List[Tuple[int, str]]) -> int:
+    """Add (cid, smiles) pairs to the local compound store and search indexes"""
+    _compound_store.add_many(compounds)
+    _pattern_index.add_many(compounds)
+    _formula_index.add_smiles_many(compounds)
+    _inchikey_index.add_smiles_many(compounds)
+    return _similarity_index.add_many(compounds)
+
+def load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """Load a cache snapshot into the property cache, structure cache and search indexes"""
+    def on_record(key: str, value: Any):
+        if key.startswith('cid:') and isinstance(value, dict) and value.get('CID'):
+            index_properties(value)
+    
+    try:
+        return import_snapshot(path, _cache, structure_cache, on_record)
+    except (OSError, SnapshotError) as e:
+        # Start cold rather than not at all
+        logger.error(f"Unable to load snapshot {path}: {e}")
+        return None
+
+def export_cache_snapshot(path: Optional[str] = None, max_entries: Optional[int] = None) -> str:
+    """Export the property cache and the matching cached structures to a snapshot file"""
+    try:
+        result = export_snapshot(path or default_export_path(), _cache, structure_cache, max_entries)
+        return json.dumps(result, indent=2)
+    except OSError as e:
+        return f"Error: Unable to write snapshot: {str(e)}"
+
+def import_compounds(path: str) -> int:
+    """Index every compound of a CID<tab>SMILES file"""
+    total = 0
+    for batch in read_smiles_file(path):
+        total += index_compounds(batch)
+        # PubChem's CID-SMILES files hold isomeric SMILES
+        _smiles_index.add_smiles_many(batch)
+        logger.info(f"Indexed {total} compounds from {path}")
+    print(f"Indexed {total} compounds from {path}", file=sys.stderr)
+    return total
+
+def convert_sdf_file(input_path: str, output_path: Optional[str], per_cid: bool,
+                     workers: int, use_rdkit: bool):
+    """Convert a local SDF file to XYZ, printing throughput when done"""
+    if not output_path:
+        output_path = re.sub(r'(\.sdf)?(\.gz)?$', '', input_path, flags=re.IGNORECASE) + ('_xyz' if per_cid else '.xyz')
+    stats = convert_sdf(input_path, output_path, per_cid, workers, use_rdkit, on_progress=log_progress)
+    print(f"Converted {stats.converted} of {stats.records} records to {output_path} in {stats.elapsed:.1f}s "
+          f"({stats.records_per_second:.0f} records/s, {workers} workers, {stats.failed} failed)", file=sys.stderr)
+
+def missing_properties(data: Optional[Dict[str, Any]], cache_state: str, properties: List[str]) -> List[str]:
+    """Properties that must be fetched to answer a request, given the cached record"""
+    wanted = list(dict.fromkeys(PROPERTIES + properties))
+    if data is None or cache_state == EXPIRED:
+        # Refetch everything known so the record stays consistent
+        known = [p for p in (data or {}) if p != 'CID']
+        return list(dict.fromkeys(wanted + known))
+    return [p for p in wanted if p not in data]
+
+def lookup_compound_table(cid: Optional[str], inchikey: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Properties of a compound from the compound table, or None if it is not there"""
+    if _compound_table is None:
+        return None
+    with span("properties.table", cid=cid or "", inchikey=inchikey or "") as current:
+        record = _compound_table.get(int(cid)) if cid else _compound_table.get_by_inchikey(inchikey)
+        current.set_attribute("hit", record is not None)
+    if record is None:
+        return None
+    data = {prop: value for prop, value in record.items() if prop in VALID_PROPERTIES}
+    for prop, alias in PROPERTY_ALIASES.items():
+        if prop not in data and alias in record:
+            data[prop] = record[alias]
+    data['CID'] = record['CID']
+    return data
+
+def prefetch_properties(cids: List[str], properties: List[str]):
+    """Fetch missing properties for many CIDs in a few batched requests"""
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for cid in dict.fromkeys(cids):
+        data, cache_state = _cache.lookup(f"cid:{cid}")
+        missing = missing_properties(data, cache_state, properties)
+        if missing:
+            table_data = lookup_compound_table(cid, None)
+            if table_data is not None and all(p in table_data for p in missing):
+                store_properties(table_data)
+                continue
+            groups.setdefault(tuple(missing), []).append(cid)
+    
+    for missing, group in groups.items():
+        for start in range(0, len(group), PROPERTY_BATCH_SIZE):
+            chunk = group[start:start + PROPERTY_BATCH_SIZE]
+            try:
+                rows, _ = fetch_properties(f"cid/{','.join(chunk)}", list(missing))
+                for data in rows:
+                    store_properties(data)
+                logger.info(f"Prefetched {len(missing)} properties for {len(rows)} CIDs")
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                # Compounds not covered here are fetched individually later
+                logger.warning(f"Batched property fetch failed for {len(chunk)} CIDs: {str(e)}")
+
+def refresh_cache_entry(cache_key: str):
+    """Re-fetch a cache entry (used by the cache's background refresh)"""
+    kind, _, identifier = cache_key.partition(":")
+    if kind == "cid":
+        known = _cache.peek(cache_key) or {}
+        properties = [p for p in known if p != 'CID'] or PROPERTIES
+        fetched = fetch_properties(f"cid/{identifier}", properties, conditional_key=cache_key)
+        if fetched is None:
+            logger.info(f"Cache entry unchanged upstream: {cache_key}")
+            _cache.revalidate(cache_key)
+            return
+        rows, validators = fetched
+        store_properties(rows[0], validators)
+    elif kind in ("smiles", "inchi"):
+        rows, _ = fetch_properties(kind, PROPERTIES, post_data={kind: identifier})
+        store_properties(rows[0])
+        _cache.set(cache_key, {'CID': rows[0]['CID']})
+    else:
+        rows, _ = fetch_properties(f"{kind}/{identifier}", PROPERTIES)
+        store_properties(rows[0])
+        _cache.set(cache_key, {'CID': rows[0]['CID']})
+
+_cache.set_refresher(refresh_cache_entry)
 
 # PubChem API functions
-def get_pubchem_data(query: str, format: str = 'JSON', include_3d: bool = False) -> str:
-    """Get PubChem compound data"""
-    logger.info(f"Getting PubChem data: query={query}, format={format}, include_3d={include_3d}")
+# A CID, alone or prefixed as in "CID 2244" or "CID:2244"
+CID_PATTERN = re.compile(r'^(?:CID\s*:?\s*)?(\d+)$', re.IGNORECASE)
+
+def parse_cid(query: str) -> Optional[str]:
+    """The CID of a CID query, as digits, or None if it is not one"""
+    match = CID_PATTERN.match(query.strip())
+    return match.group(1) if match else None
+
+def detect_query_type(query: str) -> str:
+    """Whether a query is a CID, InChIKey, InChI, SMILES string or compound name"""
+    if parse_cid(query):
+        return 'cid'
+    if is_inchikey(query):
+        return 'inchikey'
+    if is_inchi(query):
+        return 'inchi'
+    if looks_like_smiles(query):
+        return 'smiles'
+    return 'name'
+
+def get_pubchem_data(query: str, format: str = 'JSON', include_3d: bool = False,
+                     progress: Optional[ProgressCallback] = None,
+                     properties: Optional[List[str]] = None,
+                     query_type: Optional[str] = None) -> str:
+    """Get PubChem compound data, optionally restricted to the given properties"""
+    logger.info(f"Getting PubChem data: query={query}, query_type={query_type}, format={format}, "
+                f"include_3d={include_3d}, properties={properties}")
+    
+    # Stages: resolved CID -> properties fetched [-> SDF downloaded -> 3D generated]
+    total_stages = 4 if format.upper() in STRUCTURE_FORMATS and include_3d else 2
+    def report(stage: int, message: str):
+        if progress:
+            progress(stage, total_stages, message)
     
     if not query or not query.strip():
         return "Error: Query cannot be empty"
     
+    properties = properties or PROPERTIES
     query_str = query.strip()
-    is_cid = re.match(r'^\d+$', query_str) is not None
-    cache_key = f"cid:{query_str}" if is_cid else f"name:{query_str.lower()}"
-    identifier_path = f"cid/{query_str}" if is_cid else f"name/{query_str}"
-    cid = query_str if is_cid else None
-    
-    # Check cache
-    if cache_key in _cache:
-        logger.info(f"Retrieving data from cache: {cache_key}")
-        data = _cache[cache_key]
+    # A detected name that is also valid SMILES is retried as SMILES if no compound has that name
+    smiles_fallback = False
+    if not query_type:
+        query_type = detect_query_type(query_str)
+        smiles_fallback = query_type == 'name' and canonical_smiles(query_str) is not None
+    cid = None
+    inchikey = None
+    canonical = None
+    post_data = None
+    
+    if query_type == 'cid':
+        if not parse_cid(query_str):
+            return f"Error: Invalid CID: {query_str}"
+        query_str = parse_cid(query_str)
+        cache_key = f"cid:{query_str}"
+        identifier_path = f"cid/{query_str}"
+        cid = query_str
+    elif query_type == 'inchikey':
+        inchikey = query_str.upper()
+        if not is_inchikey(inchikey):
+            return f"Error: Invalid InChIKey: {query_str}"
+        cache_key = f"inchikey:{inchikey}"
+        identifier_path = f"inchikey/{inchikey}"
+    elif query_type == 'inchi':
+        if not is_inchi(query_str):
+            return f"Error: Invalid InChI: {query_str}"
+        cache_key = f"inchi:{query_str}"
+        identifier_path = "inchi"
+        post_data = {'inchi': query_str}
+        # Identical structures have identical InChIKeys
+        inchikey = inchikey_from_inchi(query_str)
+    elif query_type == 'smiles':
+        canonical = canonical_smiles(query_str)
+        # Without RDKit the SMILES is used as given
+        cache_key = f"smiles:{canonical or query_str}"
+        identifier_path = "smiles"
+        post_data = {'smiles': query_str}
+        known_cid = _smiles_index.get(canonical) if canonical else None
+        cid = str(known_cid) if known_cid is not None else None
+    else:
+        cache_key = f"name:{query_str.lower()}"
+        identifier_path = f"name/{query_str}"
+    
+    if inchikey and not cid:
+        # Compounds seen before resolve locally without asking PubChem
+        known_cid = _inchikey_index.get(inchikey)
+        cid = str(known_cid) if known_cid is not None else None
+    
+    # Check cache: resolve names to a CID, then look up the compound's record
+    if not cid:
+        alias, _ = _cache.lookup(cache_key)
+        if alias:
+            cid = alias['CID']
+    data, cache_state = _cache.lookup(f"cid:{cid}") if cid else (None, EXPIRED)
+    missing = missing_properties(data, cache_state, properties)
+    current_span().set_attribute("cache_state", cache_state if data is not None else "miss")
+    
+    table_data = None
+    if missing and (cid or inchikey):
+        table_data = lookup_compound_table(cid, inchikey if not cid else None)
+    
+    if not missing:
+        logger.info(f"Retrieving data from cache ({cache_state}): {cache_key}")
+        stage_message = "Properties loaded from cache"
+    elif table_data is not None and all(p in table_data for p in missing):
+        logger.info(f"Retrieving data from compound table: {cache_key}")
+        store_properties(table_data)
         if not cid:
-            cid = data.get('CID')
-            if not cid:
-                return "Error: CID not found in cached data"
+            cid = table_data['CID']
+            _cache.set(cache_key, {'CID': cid})
+        data = _cache.peek(f"cid:{cid}") or table_data
+        stage_message = "Properties loaded from compound table"
     else:
-        # Define properties to retrieve
-        properties = [
-            'IUPACName',
-            'MolecularFormula',
-            'MolecularWeight',
-            'CanonicalSMILES',
-            'InChI',
-            'InChIKey'
-        ]
-        
-        # Build API URL
-        url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/{identifier_path}/property/{','.join(properties)}/JSON"
-        
         try:
-            session = create_session()
-            response = session.get(url, timeout=180)
-            response.raise_for_status()
-            result = response.json()
-            props = result.get('PropertyTable', {}).get('Properties', [{}])[0]
-            
-            if not props:
-                return "Error: Compound not found or no data available"
-            
+            # Only the missing columns are fetched (everything for unknown compounds)
+            path = f"cid/{cid}" if cid else identifier_path
+            with span("properties.fetch", path=path, properties=len(missing)):
+                rows, validators = fetch_properties(path, missing, post_data=None if cid else post_data)
+            fetched = rows[0]
+            with span("properties.store", cid=fetched['CID']):
+                store_properties(fetched, validators)
             if not cid:
-                cid = str(props.get('CID'))
-                if not cid:
-                    return "Error: CID not found in response"
-            
-            # Create data dictionary
-            data = {
-                'IUPACName': props.get('IUPACName', ''),
-                'MolecularFormula': props.get('MolecularFormula', ''),
-                'MolecularWeight': str(props.get('MolecularWeight', '')),
-                'CanonicalSMILES': props.get('CanonicalSMILES', ''),
-                'InChI': props.get('InChI', ''),
-                'InChIKey': props.get('InChIKey', ''),
-                'CID': cid
-            }
-            
-            # Update cache
-            _cache[cache_key] = data
-            if cid and f"cid:{cid}" != cache_key:
-                _cache[f"cid:{cid}"] = data
-                
+                cid = fetched['CID']
+                _cache.set(cache_key, {'CID': cid})
+                if canonical:
+                    # The next query for this structure, in any SMILES spelling, resolves locally
+                    _smiles_index.add_many([(int(cid), canonical)])
+            data = _cache.peek(f"cid:{cid}") or fetched
+            stage_message = "Properties fetched"
+        except LookupError as e:
+            if smiles_fallback:
+                return get_pubchem_data(query, format, include_3d, progress, properties, 'smiles')
+            return f"Error: {str(e)}"
         except requests.exceptions.RequestException as e:
-            error_msg = str(e)
-            try:
-                if hasattr(e, 'response') and e.response:
-                    error_data = e.response.json()
-                    error_msg = error_data.get('Fault', {}).get('Details', [{}])[0].get('Message', str(e))
-            except:
-                pass
-            return f"Error: {error_msg}"
+            not_found = getattr(e, 'response', None) is not None and e.response.status_code == 404
+            if smiles_fallback and not_found:
+                logger.info(f"No compound named {query_str}, trying it as SMILES")
+                return get_pubchem_data(query, format, include_3d, progress, properties, 'smiles')
+            if data is None or any(p not in data for p in properties):
+                error_msg = str(e)
+                try:
+                    if hasattr(e, 'response') and e.response:
+                        error_data = e.response.json()
+                        error_msg = error_data.get('Fault', {}).get('Details', [{}])[0].get('Message', str(e))
+                except:
+                    pass
+                return f"Error: {error_msg}"
+            # PubChem is degraded: an expired entry is better than no answer
+            logger.warning(f"Serving expired cache entry {cache_key} after fetch failed: {str(e)}")
+            stage_message = "Properties loaded from cache (expired)"
+    
+    if not cid:
+        return "Error: CID not found in compound data"
+    report(1, f"Resolved CID {cid}")
+    report(2, stage_message)
     
     # Handle different output formats
     fmt = format.upper()
     
-    # XYZ format - 3D structure
-    if fmt == 'XYZ':
+    # XYZ format - 3D structure, as text or packed binary coordinates
+    if fmt in STRUCTURE_FORMATS:
         if include_3d:
             try:
                 # Get compound info
                 compound_info = {
                     'id': data['CID'],
-                    'name': data['IUPACName'],
-                    'formula': data['MolecularFormula'],
-                    'smiles': data['CanonicalSMILES'],
-                    'inchikey': data['InChIKey']
+                    'name': data.get('IUPACName', ''),
+                    'formula': data.get('MolecularFormula', ''),
+                    'smiles': data.get('CanonicalSMILES', ''),
+                    'inchikey': data.get('InChIKey', '')
                 }
                 
                 # Get XYZ structure
-                xyz_structure = get_xyz_structure(data['CID'], compound_info)
+                # Packed coordinates are built from the parsed atoms, without going through XYZ text
+                with span("xyz.structure", cid=data['CID']):
+                    xyz_structure = get_xyz_structure(data['CID'], compound_info,
+                                                      on_sdf_downloaded=lambda: report(3, "SDF downloaded"),
+                                                      packed=fmt == 'PACKED_XYZ')
                 
                 if xyz_structure:
+                    report(4, "3D structure generated")
                     return xyz_structure
                 else:
                     return "Error: Unable to generate 3D structure"
             except Exception as e:
                 return f"Error: Error generating 3D structure: {str(e)}"
         else:
-            return "Error: include_3d parameter must be true when using XYZ format"
+            return f"Error: include_3d parameter must be true when using {fmt} format"
     
     # CSV format
     elif fmt == 'CSV':
-        headers = ['CID', 'IUPACName', 'MolecularFormula', 'MolecularWeight', 
-                  'CanonicalSMILES', 'InChI', 'InChIKey']
-        values = [data.get(h, '') for h in headers]
+        headers = ['CID'] + properties
+        values = [str(data.get(h, '')) for h in headers]
         return f"{','.join(headers)}\n{','.join(values)}"
     
     # Default JSON format
     else:
-        return json.dumps(data, indent=2)
+        result = {p: data.get(p, '') for p in properties}
+        result['CID'] = data['CID']
+        return json.dumps(result, indent=2)
+
+def _traced_batch_query(query: str, format: str, include_3d: bool,
+                        properties: Optional[List[str]]) -> str:
+    # Each compound counts against the limits of the call it stands for
+    item_class = tool_class("get_pubchem_data", {"format": format, "include_3d": include_3d})
+    with span("batch.query", query=query):
+        try:
+            with _admission.admit(item_class):
+                return get_pubchem_data(query, format, include_3d, None, properties)
+        except Overloaded as e:
+            return f"Error: {str(e)}"
+
+def get_pubchem_data_batch(queries: List[str], format: str = 'JSON', include_3d: bool = False,
+                           progress: Optional[ProgressCallback] = None,
+                           properties: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Get PubChem data for several compounds, reporting each result as soon as it completes"""
+    logger.info(f"Getting PubChem data for batch of {len(queries)} queries")
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    
+    # Fetch what's missing for all CID queries at once instead of one request per compound
+    cids = [cid for cid in map(parse_cid, queries) if cid]
+    if len(cids) > 1:
+        with span("properties.prefetch", cids=len(cids)):
+            prefetch_properties(cids, properties or PROPERTIES)
+    
+    with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(queries))) as executor:
+        # Workers run in a copy of the request context so cancellation reaches them
+        futures = {
+            executor.submit(contextvars.copy_context().run, _traced_batch_query,
+                            query, format, include_3d, properties): index
+            for index, query in enumerate(queries)
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error getting PubChem data for {queries[index]}: {str(e)}")
+                result = f"Error: {str(e)}"
+            entry = {
+                "query": queries[index],
+                "result": result,
+                "isError": result.startswith("Error:")
+            }
+            results[index] = entry
+            # Stream the partial result so clients can start on it right away
+            if progress:
+                progress(completed, len(queries), json.dumps(entry))
+    
+    return results
+
+def similarity_search(query: str, query_type: Optional[str] = None, top_k: int = 10,
+                      threshold: float = 0.0) -> str:
+    """Find the indexed compounds most similar to a SMILES string, CID or compound name"""
+    logger.info(f"Similarity search: query={query}, query_type={query_type}, top_k={top_k}, threshold={threshold}")
+    
+    if not similarity_available():
+        return "Error: Similarity search requires RDKit and NumPy"
+    
+    query_str = query.strip()
+    if not query_type:
+        if parse_cid(query_str):
+            query_type = 'cid'
+        elif fingerprint(query_str) is not None:
+            query_type = 'smiles'
+        else:
+            query_type = 'name'
+    
+    query_fp = None
+    if query_type == 'cid':
+        if not parse_cid(query_str):
+            return f"Error: Invalid CID: {query_str}"
+        query_str = parse_cid(query_str)
+        query_fp = _similarity_index.get(int(query_str))
+    if query_fp is None:
+        smiles = query_str
+        if query_type != 'smiles':
+            # Fetching the compound also adds it to the index
+            result = get_pubchem_data(query_str, properties=['CanonicalSMILES'])
+            if result.startswith("Error:"):
+                return result
+            smiles = json.loads(result)['CanonicalSMILES']
+        query_fp = fingerprint(smiles)
+        if query_fp is None:
+            return f"Error: Unable to parse SMILES: {smiles}"
+    
+    results = []
+    for cid, similarity in _similarity_index.search(query_fp, top_k, threshold):
+        entry = {'CID': str(cid), 'Similarity': round(similarity, 4)}
+        known = _cache.peek(f"cid:{cid}") or {}
+        for prop in ('IUPACName', 'CanonicalSMILES'):
+            if prop in known:
+                entry[prop] = known[prop]
+        results.append(entry)
+    
+    return json.dumps({'indexed': len(_similarity_index), 'results': results}, indent=2)
+
+def substructure_search(query: str, query_type: Optional[str] = None, max_results: int = 100,
+                        progress: Optional[ProgressCallback] = None) -> str:
+    """Find the stored compounds containing a SMILES or SMARTS substructure"""
+    logger.info(f"Substructure search: query={query}, query_type={query_type}, max_results={max_results}")
+    
+    def on_matches(checked: int, total: int, new_matches: List[int]):
+        # Stream the matches of each completed chunk
+        if progress:
+            progress(checked, total, json.dumps([str(cid) for cid in new_matches]))
+    
+    try:
+        matches, stats = substructure.substructure_search(query.strip(), _pattern_index, _compound_store,
+                                                          query_type, max_results, on_matches)
+    except (ValueError, RuntimeError) as e:
+        return f"Error: {str(e)}"
+    
+    results = []
+    for cid in matches:
+        entry = {'CID': str(cid), 'CanonicalSMILES': _compound_store.get(cid)}
+        known = _cache.peek(f"cid:{cid}") or {}
+        if 'IUPACName' in known:
+            entry['IUPACName'] = known['IUPACName']
+        results.append(entry)
+    
+    return json.dumps(dict(stats, truncated=len(matches) >= max_results, results=results), indent=2)
+
+def search_by_formula(formula: Optional[str] = None, elements: Optional[Dict[str, Any]] = None,
+                      min_weight: Optional[float] = None, max_weight: Optional[float] = None,
+                      allow_other_elements: bool = True, max_results: int = 100) -> str:
+    """Find stored compounds by exact formula, element counts and/or molecular weight window"""
+    logger.info(f"Formula search: formula={formula}, elements={elements}, weight={min_weight}-{max_weight}")
+    
+    if not NUMPY_AVAILABLE:
+        return "Error: Formula search requires NumPy"
+    if formula is None and not elements and min_weight is None and max_weight is None:
+        return "Error: Provide a formula, element constraints or a weight range"
+    
+    try:
+        total, matches = _formula_index.search(formula, elements, min_weight, max_weight,
+                                               allow_other_elements, limit=max_results)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    
+    results = [
+        {'CID': str(cid), 'MolecularFormula': found_formula, 'MolecularWeight': str(weight)}
+        for cid, found_formula, weight in matches
+    ]
+    return json.dumps({'indexed': len(_formula_index), 'total': total, 'results': results}, indent=2)
 
-def get_xyz_structure(cid: str, compound_info: Dict[str, str]) -> Optional[str]:
-    """Get XYZ format 3D structure for a compound"""
+def inchikey_lookup(inchikey: str) -> str:
+    """Find the stored compound with an InChIKey and all compounds sharing its connectivity block"""
+    logger.info(f"InChIKey lookup: {inchikey}")
+    
+    key = inchikey.strip().upper()
+    if not is_inchikey(key) and not CONNECTIVITY_PATTERN.match(key):
+        return "Error: Expected a full InChIKey or its 14-character connectivity block"
+    
+    exact = _inchikey_index.get(key) if is_inchikey(key) else None
+    variants = []
+    for cid, variant_key in _inchikey_index.connectivity_matches(key):
+        entry = {'CID': str(cid), 'InChIKey': variant_key}
+        known = _cache.peek(f"cid:{cid}") or {}
+        if 'IUPACName' in known:
+            entry['IUPACName'] = known['IUPACName']
+        smiles = _compound_store.get(cid)
+        if smiles:
+            entry['CanonicalSMILES'] = smiles
+        variants.append(entry)
+    
+    return json.dumps({
+        'indexed': len(_inchikey_index),
+        'exact_match': str(exact) if exact is not None else None,
+        'connectivity_matches': variants
+    }, indent=2)
+
+def get_conformers(query: str, num_conformers: int = 10, rms_threshold: float = 0.5,
+                   format: str = 'XYZ') -> str:
+    """Generate (or load from cache) an energy-ranked conformer ensemble for a compound"""
+    logger.info(f"Generating conformers: query={query}, num_conformers={num_conformers}, rms_threshold={rms_threshold}")
+    
+    # Isomeric SMILES, so the ensemble keeps the compound's stereochemistry
+    result = get_pubchem_data(query, properties=['IsomericSMILES', 'InChIKey', 'IUPACName', 'MolecularFormula'])
+    if result.startswith("Error:"):
+        return result
+    data = json.loads(result)
+    smiles = data.get('IsomericSMILES') or (_cache.peek(f"cid:{data['CID']}") or {}).get('CanonicalSMILES')
+    if not smiles:
+        return "Error: No SMILES available for this compound"
+    
+    with span("conformers.ensemble", num_conformers=num_conformers):
+        ensemble = get_conformer_ensemble(smiles, data.get('InChIKey'), num_conformers, rms_threshold)
+    if ensemble is None:
+        return "Error: Unable to generate conformers"
+    
+    if format.upper() == 'SDF':
+        return ensemble_to_sdf(ensemble, f"CID {data['CID']}")
+    compound_info = {
+        'id': data['CID'],
+        'name': data.get('IUPACName', ''),
+        'formula': data.get('MolecularFormula', ''),
+        'inchikey': data.get('InChIKey', '')
+    }
+    if format.upper() == 'PACKED_XYZ':
+        return ensemble_to_packed(ensemble, compound_info)
+    return ensemble_to_xyz(ensemble, compound_info)
+
+def compute_compound_descriptors(queries: Optional[List[str]] = None, smiles: Optional[List[str]] = None,
+                                 descriptors: Any = None, format: str = 'JSON') -> str:
+    """Compute RDKit descriptors locally for compounds (resolved through the property cache) and SMILES"""
+    logger.info(f"Computing descriptors: queries={len(queries or [])}, smiles={len(smiles or [])}, descriptors={descriptors}")
+    
+    if not descriptors_available():
+        return "Error: Descriptor computation requires RDKit"
+    if format.upper() == 'MATRIX' and not NUMPY_AVAILABLE:
+        return "Error: MATRIX format requires NumPy"
+    try:
+        names = resolve_descriptor_names(descriptors)
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    
+    # Rows: (label, identifying fields, InChIKey, SMILES or None if the query failed)
+    rows: List[Tuple[str, Dict[str, Any], Optional[str], Optional[str]]] = []
+    if queries:
+        for entry in get_pubchem_data_batch(queries, properties=['CanonicalSMILES', 'InChIKey']):
+            if entry["isError"]:
+                rows.append((entry["query"], {'query': entry["query"], 'error': entry["result"]}, None, None))
+                continue
+            data = json.loads(entry["result"])
+            rows.append((str(data['CID']), {'query': entry["query"], 'CID': str(data['CID'])},
+                         data.get('InChIKey'), data.get('CanonicalSMILES')))
+    for s in smiles or []:
+        rows.append((s, {'SMILES': s}, molecule_key(s), s))
+    
+    with span("descriptors.compute", compounds=len(rows), descriptors=len(names)):
+        computed = iter(compute_batch([(key, s) for _, _, key, s in rows if s], names, _descriptor_cache))
+        values = [next(computed) if s else None for _, _, _, s in rows]
+    
+    if format.upper() == 'MATRIX':
+        return matrix_payload(to_matrix(values, names), names, [label for label, _, _, _ in rows])
+    
+    results = []
+    for (_, fields, _, s), row_values in zip(rows, values):
+        entry = dict(fields)
+        if row_values is not None:
+            # NaN (descriptor failed) is not valid JSON
+            entry['descriptors'] = {name: None if value != value else value for name, value in row_values.items()}
+        elif 'error' not in entry:
+            entry['error'] = f"Error: Unable to parse SMILES: {s}"
+        results.append(entry)
+    return json.dumps(results, indent=2)
+
+def _analyze_structure(query: str, analyses: Optional[List[str]], contact_scale: float) -> Dict[str, Any]:
+    """Geometry of one compound's 3D structure, read from the structure cache when possible"""
+    with span("geometry.query", query=query):
+        result = get_pubchem_data(query, properties=['MolecularFormula'])
+        if result.startswith("Error:"):
+            return {'query': query, 'error': result}
+        cid = str(json.loads(result)['CID'])
+        xyz = structure_cache.read(f"{cid}.xyz")
+        if xyz is None:
+            xyz = get_pubchem_data(cid, 'XYZ', include_3d=True)
+            if xyz.startswith("Error:"):
+                return {'query': query, 'CID': cid, 'error': xyz}
+        symbols, coordinates = parse_xyz(xyz)
+        with span("geometry.analyze", atoms=len(symbols)):
+            return {'query': query, 'CID': cid, **analyze(symbols, coordinates, analyses, contact_scale)}
+
+def analyze_geometry(queries: List[str], analyses: Optional[List[str]] = None,
+                     contact_scale: float = CONTACT_SCALE) -> str:
+    """Analyze the 3D structures of one or more compounds"""
+    logger.info(f"Analyzing geometry: queries={len(queries)}, analyses={analyses}")
+    
+    if not geometry_available():
+        return "Error: Geometry analysis requires NumPy"
+    unknown = [a for a in analyses or [] if a not in ANALYSES]
+    if unknown:
+        return f"Error: Unknown analyses: {', '.join(unknown)}; options: {', '.join(ANALYSES)}"
+    
+    def run(query: str) -> Dict[str, Any]:
+        try:
+            return _analyze_structure(query, analyses, contact_scale)
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error analyzing geometry of {query}: {str(e)}")
+            return {'query': query, 'error': f"Error: {str(e)}"}
+    
+    with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(queries))) as executor:
+        # Workers run in a copy of the request context so cancellation reaches them
+        futures = [executor.submit(contextvars.copy_context().run, run, query) for query in queries]
+        results = [future.result() for future in futures]
+    
+    if len(queries) == 1:
+        if 'error' in results[0]:
+            return results[0]['error']
+        return json.dumps(results[0], indent=2)
+    return json.dumps(results, indent=2)
+
+def get_xyz_structure(cid: str, compound_info: Dict[str, str],
+                      on_sdf_downloaded: Optional[Callable[[], None]] = None,
+                      packed: bool = False) -> Optional[str]:
+    """Get XYZ format 3D structure for a compound, as text or packed (see packed_xyz)"""
+    cache_name = f"{cid}.packed" if packed else f"{cid}.xyz"
     try:
         # Get 3D structure from PubChem
-        url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/SDF/?record_type=3d&response_type=save"
+        url = f"{PUBCHEM_REST_URL}/compound/cid/{cid}/record/SDF/?record_type=3d&response_type=save"
         
-        session = create_session()
-        response = session.get(url)
+        response = pubchem_get(url, timeout=180)
         
         if response.status_code == 200 and response.text and "NO_3D_SCREENING_AVAILABLE" not in response.text:
             sdf_data = response.text
-            xyz_data = convert_sdf_to_xyz(sdf_data, compound_info)
+            if on_sdf_downloaded:
+                on_sdf_downloaded()
+            with span("xyz.convert_sdf", size=len(sdf_data), packed=packed):
+                if packed:
+                    xyz_data = convert_sdf_to_packed(sdf_data, compound_info)
+                else:
+                    xyz_data = convert_sdf_to_xyz(sdf_data, compound_info)
             if xyz_data:
+                # Keep a copy to serve while PubChem is unavailable
+                try:
+                    structure_cache.write(cache_name, xyz_data)
+                except Exception as e:
+                    logger.error(f"Error writing cache file {cache_name}: {str(e)}")
                 return xyz_data
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error getting XYZ structure: {str(e)}")
     
-    # Return error if fetching from PubChem fails
+    # Serve a previously cached (possibly stale) structure if fetching from PubChem fails
+    if structure_cache.exists(cache_name):
+        try:
+            logger.info(f"Serving cached XYZ structure: {cache_name}")
+            return structure_cache.read(cache_name)
+        except Exception as e:
+            logger.error(f"Error reading cache file {cache_name}: {str(e)}")
+    
+    # Only the text form may have been cached, e.g. by an older version or a snapshot
+    if packed and structure_cache.exists(f"{cid}.xyz"):
+        try:
+            xyz_text = structure_cache.read(f"{cid}.xyz")
+            if xyz_text:
+                logger.info(f"Serving cached XYZ structure packed: {cid}.xyz")
+                return xyz_to_packed(xyz_text)
+        except Exception as e:
+            logger.error(f"Error reading cache file {cid}.xyz: {str(e)}")
+    
     return None
 
+def parse_sdf_atoms(sdf_data: str) -> List[Tuple[str, float, float, float]]:
+    """(element, x, y, z) of each atom in the first record of an SDF"""
+    lines = sdf_data.strip().split('\n')
+    
+    # Get atom count (usually in line 4)
+    counts_line = lines[3].strip()
+    atom_count = int(counts_line.split()[0])
+    
+    # Parse atom coordinates (starting from line 5)
+    atoms = []
+    for i in range(4, 4 + atom_count):
+        if i < len(lines):
+            parts = lines[i].strip().split()
+            if len(parts) >= 4:
+                x, y, z = float(parts[0]), float(parts[1]), float(parts[2])
+                element = parts[3]
+                atoms.append((element, x, y, z))
+    return atoms
+
+def xyz_comment(compound_info: Dict[str, str]) -> str:
+    """XYZ comment line describing a compound"""
+    return f"PubChem CID: {compound_info['id']} - {compound_info['name']} - Formula: {compound_info['formula']}"
+
 def convert_sdf_to_xyz(sdf_data: str, compound_info: Dict[str, str]) -> Optional[str]:
     """Convert SDF format to XYZ format"""
     try:
-        # Parse SDF data
-        lines = sdf_data.strip().split('\n')
-        
-        # Get atom count (usually in line 4)
-        counts_line = lines[3].strip()
-        atom_count = int(counts_line.split()[0])
-        
-        # Parse atom coordinates (starting from line 5)
-        atoms = []
-        for i in range(4, 4 + atom_count):
-            if i < len(lines):
-                parts = lines[i].strip().split()
-                if len(parts) >= 4:
-                    x, y, z = float(parts[0]), float(parts[1]), float(parts[2])
-                    element = parts[3]
-                    atoms.append((element, x, y, z))
+        atoms = parse_sdf_atoms(sdf_data)
         
         # Create XYZ format
         xyz_lines = []
         xyz_lines.append(str(len(atoms)))
-        xyz_lines.append(f"PubChem CID: {compound_info['id']} - {compound_info['name']} - Formula: {compound_info['formula']}")
+        xyz_lines.append(xyz_comment(compound_info))
         
         for element, x, y, z in atoms:
             xyz_lines.append(f"{element} {x:.6f} {y:.6f} {z:.6f}")
@@ -219,6 +1008,15 @@ def convert_sdf_to_xyz(sdf_data: str, compound_info: Dict[str, str]) -> Optional
         logger.error(f"Error converting SDF to XYZ: {str(e)}")
         return None
 
+def convert_sdf_to_packed(sdf_data: str, compound_info: Dict[str, str]) -> Optional[str]:
+    """Convert SDF format to packed XYZ, packing the parsed coordinates directly"""
+    try:
+        atoms = parse_sdf_atoms(sdf_data)
+        return atoms_to_packed(atoms, xyz_comment(compound_info))
+    except Exception as e:
+        logger.error(f"Error converting SDF to packed XYZ: {str(e)}")
+        return None
+
 def download_structure(cid: str, format: str = 'sdf') -> str:
     """Download compound structure"""
     logger.info(f"Downloading structure: cid={cid}, format={format}")
@@ -231,13 +1029,12 @@ def download_structure(cid: str, format: str = 'sdf') -> str:
     # Build API URL
     format_lower = format.lower()
     if format_lower == 'sdf':
-        url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/SDF/?record_type=3d&response_type=save"
+        url = f"{PUBCHEM_REST_URL}/compound/cid/{cid}/record/SDF/?record_type=3d&response_type=save"
     else:
-        url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/{format_lower}/?response_type=save"
+        url = f"{PUBCHEM_REST_URL}/compound/cid/{cid}/record/{format_lower}/?response_type=save"
     
     try:
-        session = create_session()
-        response = session.get(url, timeout=180)
+        response = pubchem_get(url, timeout=180)
         response.raise_for_status()
         
         # Return structure data
@@ -248,7 +1045,7 @@ def download_structure(cid: str, format: str = 'sdf') -> str:
 
 def get_tools_list() -> List[Dict[str, Any]]:
     """Get list of available tools"""
-    return [
+    tools = [
         {
             "name": "get_pubchem_data",
             "description": "Retrieve compound structure and property data",
@@ -257,16 +1054,26 @@ def get_tools_list() -> List[Dict[str, Any]]:
                 "properties": {
                     "query": {
                         "type": "string",
-                        "description": "Compound name or PubChem CID",
+                        "description": "Compound name, PubChem CID, SMILES, InChI or InChIKey",
+                    },
+                    "query_type": {
+                        "type": "string",
+                        "description": "How to interpret the query, default: detected automatically",
+                        "enum": QUERY_TYPES,
                     },
                     "format": {
                         "type": "string",
-                        "description": "Output format, options: 'JSON', 'CSV', or 'XYZ', default: 'JSON'",
-                        "enum": ["JSON", "CSV", "XYZ"],
+                        "description": "Output format, options: 'JSON', 'CSV', 'XYZ', or 'PACKED_XYZ' (XYZ as base64 float32 coordinates and uint8 atomic numbers in a JSON object), default: 'JSON'",
+                        "enum": ["JSON", "CSV", "XYZ", "PACKED_XYZ"],
                     },
                     "include_3d": {
                         "type": "boolean",
-                        "description": "Whether to include 3D structure information (only effective when format is 'XYZ'), default: false",
+                        "description": "Whether to include 3D structure information (only effective when format is 'XYZ' or 'PACKED_XYZ'), default: false",
+                    },
+                    "properties": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": VALID_PROPERTIES},
+                        "description": "PubChem properties to return (JSON and CSV formats), default: IUPACName, MolecularFormula, MolecularWeight, CanonicalSMILES, InChI, InChIKey",
                     },
                 },
                 "required": ["query"],
@@ -294,98 +1101,459 @@ def get_tools_list() -> List[Dict[str, Any]]:
                 },
                 "required": ["cid"],
             },
-        }
-    ]
-
-def handle_tool_call(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-    """Handle tool call"""
-    logger.info(f"Handling tool call: {tool_name}, arguments: {arguments}")
-    
-    if tool_name == "get_pubchem_data":
-        query = arguments.get("query")
-        format_type = arguments.get("format", "JSON")
-        include_3d = arguments.get("include_3d", False)
-        
-        if not query:
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Error: Missing required parameter 'query'"
-                    }
-                ],
-                "isError": True
-            }
-        
-        # Validate that XYZ format requires include_3d parameter
-        if format_type.upper() == "XYZ" and not include_3d:
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "When using XYZ format, include_3d parameter must be set to true"
-                    }
-                ],
-                "isError": True
-            }
-        
-        try:
-            result = get_pubchem_data(query, format_type, include_3d)
-            
-            # Check for errors
-            if result.startswith("Error:"):
-                return {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": result
-                        }
-                    ],
-                    "isError": True
-                }
-            
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": result
-                    }
-                ]
-            }
-        except Exception as e:
-            logger.error(f"Error executing get_pubchem_data: {str(e)}")
-            logger.error(traceback.format_exc())
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": f"Error: {str(e)}"
-                    }
-                ],
-                "isError": True
-            }
-    
-    elif tool_name == "download_structure":
-        cid = arguments.get("cid")
-        format_type = arguments.get("format", "sdf")
-        filename = arguments.get("filename")
-        
-        if not cid:
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Error: Missing required parameter 'cid'"
-                    }
-                ],
-                "isError": True
-            }
-        
-        try:
-            # Download structure
-            structure_data = download_structure(cid, format_type)
-            
-            # Check for errors
+        },
+        {
+            "name": "get_pubchem_data_batch",
+            "description": "Retrieve property data for several compounds at once; with a progress token, each result is streamed in a progress notification as it completes",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"Compound names, PubChem CIDs, SMILES, InChIs or InChIKeys (at most {BATCH_MAX_SIZE})",
+                    },
+                    "format": {
+                        "type": "string",
+                        "description": "Output format for each compound, options: 'JSON', 'CSV', 'XYZ', or 'PACKED_XYZ', default: 'JSON'",
+                        "enum": ["JSON", "CSV", "XYZ", "PACKED_XYZ"],
+                    },
+                    "include_3d": {
+                        "type": "boolean",
+                        "description": "Whether to include 3D structure information (only effective when format is 'XYZ' or 'PACKED_XYZ'), default: false",
+                    },
+                    "properties": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": VALID_PROPERTIES},
+                        "description": "PubChem properties to return (JSON and CSV formats), default: IUPACName, MolecularFormula, MolecularWeight, CanonicalSMILES, InChI, InChIKey",
+                    },
+                },
+                "required": ["queries"],
+            },
+        },
+        {
+            "name": "similarity_search",
+            "description": "Find compounds similar to a query structure (Morgan fingerprint Tanimoto similarity) among the compounds indexed locally: every compound retrieved so far plus any imported with --index-smiles",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "SMILES string, PubChem CID or compound name",
+                    },
+                    "query_type": {
+                        "type": "string",
+                        "description": "How to interpret the query, default: detected automatically",
+                        "enum": ["smiles", "cid", "name"],
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": f"Number of results (at most {SIMILARITY_MAX_RESULTS}), default: 10",
+                    },
+                    "threshold": {
+                        "type": "number",
+                        "description": "Minimum Tanimoto similarity (0-1), default: 0",
+                    },
+                },
+                "required": ["query"],
+            },
+        },
+        {
+            "name": "substructure_search",
+            "description": "Find locally stored compounds containing a substructure; with a progress token, matches are streamed in progress notifications as they are found",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Substructure as SMILES or SMARTS",
+                    },
+                    "query_type": {
+                        "type": "string",
+                        "description": "How to parse the query, default: SMILES, falling back to SMARTS",
+                        "enum": ["smiles", "smarts"],
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": f"Stop after this many matches (at most {SUBSTRUCTURE_MAX_RESULTS}), default: 100",
+                    },
+                },
+                "required": ["query"],
+            },
+        },
+        {
+            "name": "search_by_formula",
+            "description": "Find locally stored compounds by molecular formula, element counts or molecular weight range",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "formula": {
+                        "type": "string",
+                        "description": "Exact molecular formula, e.g. 'C9H8O4'",
+                    },
+                    "elements": {
+                        "type": "object",
+                        "additionalProperties": {"type": ["integer", "string"]},
+                        "description": "Element count constraints: a count or a range such as '6-8', '>=1', '<=2', e.g. {\"C\": \"6-8\", \"N\": \">=1\"}",
+                    },
+                    "min_weight": {
+                        "type": "number",
+                        "description": "Minimum molecular weight (g/mol)",
+                    },
+                    "max_weight": {
+                        "type": "number",
+                        "description": "Maximum molecular weight (g/mol)",
+                    },
+                    "allow_other_elements": {
+                        "type": "boolean",
+                        "description": "Whether elements not listed in 'elements' may be present, default: true",
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": f"Number of results, lightest first (at most {FORMULA_MAX_RESULTS}), default: 100",
+                    },
+                },
+            },
+        },
+        {
+            "name": "inchikey_lookup",
+            "description": "Look up an InChIKey among locally stored compounds, returning the exact match and every stereoisomer or protonation variant sharing its connectivity block",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "inchikey": {
+                        "type": "string",
+                        "description": "Full InChIKey, or its first 14 characters (connectivity block)",
+                    },
+                },
+                "required": ["inchikey"],
+            },
+        },
+        {
+            "name": "generate_conformers",
+            "description": "Generate an energy-ranked 3D conformer ensemble (ETKDG embedding, MMFF94 optimization) as multi-frame XYZ or multi-record SDF",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Compound name, PubChem CID, SMILES, InChI or InChIKey",
+                    },
+                    "num_conformers": {
+                        "type": "integer",
+                        "description": f"Maximum number of conformers (at most {CONFORMERS_MAX}), default: 10",
+                    },
+                    "rms_threshold": {
+                        "type": "number",
+                        "description": "Conformers closer than this heavy-atom RMSD (Angstrom) to a lower-energy one are dropped, default: 0.5",
+                    },
+                    "format": {
+                        "type": "string",
+                        "description": "Output format, options: 'XYZ', 'SDF', or 'PACKED_XYZ' (one frame per conformer), default: 'XYZ'",
+                        "enum": ["XYZ", "SDF", "PACKED_XYZ"],
+                    },
+                },
+                "required": ["query"],
+            },
+        },
+        {
+            "name": "compute_descriptors",
+            "description": "Compute RDKit molecular descriptors (logP, TPSA, H-bond donors/acceptors, rotatable bonds, ring counts, Lipinski rule-of-five flags, ...) locally for compounds or SMILES, without extra PubChem requests",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"Compound names, PubChem CIDs, SMILES, InChIs or InChIKeys (at most {BATCH_MAX_SIZE})",
+                    },
+                    "smiles": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"SMILES strings (at most {DESCRIPTORS_MAX_SMILES})",
+                    },
+                    "descriptors": {
+                        "description": f"Descriptor set ({', '.join(repr(name) for name in DESCRIPTOR_SETS)}) or a list of RDKit descriptor names, plus 'LipinskiViolations' and 'Lipinski', default: 'druglike'",
+                        "anyOf": [
+                            {"type": "string"},
+                            {"type": "array", "items": {"type": "string"}},
+                        ],
+                    },
+                    "format": {
+                        "type": "string",
+                        "description": "Output format: 'JSON' (one object per compound) or 'MATRIX' (base64 float64 compounds x descriptors matrix, NaN where unavailable), default: 'JSON'",
+                        "enum": ["JSON", "MATRIX"],
+                    },
+                },
+            },
+        },
+        {
+            "name": "analyze_geometry",
+            "description": "Analyze compounds' 3D structures without transferring coordinates: centroid, bounding box, inertia tensor (principal moments, radius of gyration, shape ratios), perceived bonds, close non-bonded contacts and optionally the distance matrix",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"Compound names, PubChem CIDs, SMILES, InChIs or InChIKeys (at most {BATCH_MAX_SIZE})",
+                    },
+                    "analyses": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(ANALYSES)},
+                        "description": "Analyses to run, default: ['summary', 'inertia', 'bonds']. 'distances' returns the distance matrix as base64 float32",
+                    },
+                    "contact_scale": {
+                        "type": "number",
+                        "description": f"Non-bonded atoms closer than this fraction of their van der Waals radii sum are reported as contacts, default: {CONTACT_SCALE}",
+                    },
+                },
+                "required": ["queries"],
+            },
+        }
+    ]
+    if ADMIN_TOOLS_ENABLED:
+        tools.append({
+            "name": "profile_next_n_requests",
+            "description": "Administrative: profile the next tool calls of this server process, writing cProfile statistics, folded stacks for flame graphs and tracemalloc memory reports to ~/.pubchem-mcp/profiles",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "requests": {
+                        "type": "integer",
+                        "description": f"Number of tool calls to profile (at most {PROFILE_MAX_REQUESTS}), default: 10",
+                    },
+                    "mode": {
+                        "type": "string",
+                        "description": "'cprofile' (deterministic, request threads only), 'sampling' (stack samples of every thread) or 'both', default: 'cprofile'",
+                        "enum": list(PROFILE_MODES),
+                    },
+                    "memory": {
+                        "type": "boolean",
+                        "description": "Also compare tracemalloc snapshots taken at the start and end of the window, default: false",
+                    },
+                },
+            },
+        })
+        tools.append({
+            "name": "export_cache_snapshot",
+            "description": "Administrative: export this server's property cache and the cached 3D structures of those compounds to a snapshot file, which new servers load at startup with --snapshot or PUBCHEM_MCP_SNAPSHOT",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Snapshot file to write on the server, default: a new file in ~/.pubchem-mcp/snapshots",
+                    },
+                    "max_entries": {
+                        "type": "integer",
+                        "description": "Only export the most recently used property records (and their structures), default: all records and every cached structure",
+                    },
+                },
+            },
+        })
+        tools.append({
+            "name": "get_server_stats",
+            "description": "Administrative: admission control metrics (running and queued calls, queue peaks, shed calls and average service time per class of tool call) and property cache statistics of this server process",
+            "inputSchema": {
+                "type": "object",
+                "properties": {},
+            },
+        })
+    return tools
+
+def handle_tool_call(tool_name: str, arguments: Dict[str, Any],
+                     progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Handle tool call"""
+    logger.info(f"Handling tool call: {tool_name}, arguments: {arguments}")
+    
+    if tool_name == "get_pubchem_data":
+        query = arguments.get("query")
+        query_type = arguments.get("query_type")
+        format_type = arguments.get("format", "JSON")
+        include_3d = arguments.get("include_3d", False)
+        properties = arguments.get("properties")
+        
+        if not query:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Missing required parameter 'query'"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if properties is not None:
+            properties_error = validate_properties(properties)
+            if properties_error:
+                return {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"Error: {properties_error}"
+                        }
+                    ],
+                    "isError": True
+                }
+        
+        if query_type is not None and query_type not in QUERY_TYPES:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: Invalid query_type '{query_type}', options: {', '.join(QUERY_TYPES)}"
+                    }
+                ],
+                "isError": True
+            }
+        
+        # Validate that XYZ formats require include_3d parameter
+        if format_type.upper() in STRUCTURE_FORMATS and not include_3d:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"When using {format_type.upper()} format, include_3d parameter must be set to true"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = get_pubchem_data(query, format_type, include_3d, progress, properties, query_type)
+            
+            # Check for errors
+            if result.startswith("Error:"):
+                return {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": result
+                        }
+                    ],
+                    "isError": True
+                }
+            
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ]
+            }
+        except Exception as e:
+            logger.error(f"Error executing get_pubchem_data: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "get_pubchem_data_batch":
+        queries = arguments.get("queries")
+        format_type = arguments.get("format", "JSON")
+        include_3d = arguments.get("include_3d", False)
+        properties = arguments.get("properties")
+        
+        if not queries or not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Parameter 'queries' must be a non-empty list of strings"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if len(queries) > BATCH_MAX_SIZE:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: At most {BATCH_MAX_SIZE} queries are allowed per batch"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if properties is not None:
+            properties_error = validate_properties(properties)
+            if properties_error:
+                return {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"Error: {properties_error}"
+                        }
+                    ],
+                    "isError": True
+                }
+        
+        if format_type.upper() in STRUCTURE_FORMATS and not include_3d:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"When using {format_type.upper()} format, include_3d parameter must be set to true"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            results = get_pubchem_data_batch(queries, format_type, include_3d, progress, properties)
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": json.dumps(results, indent=2)
+                    }
+                ],
+                "isError": all(entry["isError"] for entry in results)
+            }
+        except Exception as e:
+            logger.error(f"Error executing get_pubchem_data_batch: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "download_structure":
+        cid = arguments.get("cid")
+        format_type = arguments.get("format", "sdf")
+        filename = arguments.get("filename")
+        
+        if not cid:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Missing required parameter 'cid'"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            # Download structure
+            structure_data = download_structure(cid, format_type)
+            
+            # Check for errors
             if structure_data.startswith("Error:"):
                 return {
                     "content": [
@@ -429,7 +1597,361 @@ def handle_tool_call(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any
                     "isError": True
                 }
         except Exception as e:
-            logger.error(f"Error executing download_structure: {str(e)}")
+            logger.error(f"Error executing download_structure: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "similarity_search":
+        query = arguments.get("query")
+        query_type = arguments.get("query_type")
+        top_k = arguments.get("top_k", 10)
+        threshold = arguments.get("threshold", 0.0)
+        
+        if not query or not isinstance(query, str):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Missing required parameter 'query'"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if not isinstance(top_k, int) or not 1 <= top_k <= SIMILARITY_MAX_RESULTS:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: Parameter 'top_k' must be an integer between 1 and {SIMILARITY_MAX_RESULTS}"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = similarity_search(query, query_type, top_k, float(threshold))
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ],
+                "isError": result.startswith("Error:")
+            }
+        except Exception as e:
+            logger.error(f"Error executing similarity_search: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "substructure_search":
+        query = arguments.get("query")
+        query_type = arguments.get("query_type")
+        max_results = arguments.get("max_results", 100)
+        
+        if not query or not isinstance(query, str):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Missing required parameter 'query'"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if not isinstance(max_results, int) or not 1 <= max_results <= SUBSTRUCTURE_MAX_RESULTS:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: Parameter 'max_results' must be an integer between 1 and {SUBSTRUCTURE_MAX_RESULTS}"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = substructure_search(query, query_type, max_results, progress)
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ],
+                "isError": result.startswith("Error:")
+            }
+        except Exception as e:
+            logger.error(f"Error executing substructure_search: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "search_by_formula":
+        formula = arguments.get("formula")
+        elements = arguments.get("elements")
+        min_weight = arguments.get("min_weight")
+        max_weight = arguments.get("max_weight")
+        allow_other_elements = arguments.get("allow_other_elements", True)
+        max_results = arguments.get("max_results", 100)
+        
+        if elements is not None and not isinstance(elements, dict):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Parameter 'elements' must be an object mapping element symbols to constraints"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if not isinstance(max_results, int) or not 1 <= max_results <= FORMULA_MAX_RESULTS:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: Parameter 'max_results' must be an integer between 1 and {FORMULA_MAX_RESULTS}"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = search_by_formula(formula, elements, min_weight, max_weight,
+                                       allow_other_elements, max_results)
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ],
+                "isError": result.startswith("Error:")
+            }
+        except Exception as e:
+            logger.error(f"Error executing search_by_formula: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "inchikey_lookup":
+        inchikey = arguments.get("inchikey")
+        
+        if not inchikey or not isinstance(inchikey, str):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Missing required parameter 'inchikey'"
+                    }
+                ],
+                "isError": True
+            }
+        
+        result = inchikey_lookup(inchikey)
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": result
+                }
+            ],
+            "isError": result.startswith("Error:")
+        }
+    
+    elif tool_name == "generate_conformers":
+        query = arguments.get("query")
+        num_conformers = arguments.get("num_conformers", 10)
+        rms_threshold = arguments.get("rms_threshold", 0.5)
+        format_type = arguments.get("format", "XYZ")
+        
+        if not query:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Missing required parameter 'query'"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if not isinstance(num_conformers, int) or not 1 <= num_conformers <= CONFORMERS_MAX:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: Parameter 'num_conformers' must be an integer between 1 and {CONFORMERS_MAX}"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = get_conformers(query, num_conformers, float(rms_threshold), format_type)
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ],
+                "isError": result.startswith("Error:")
+            }
+        except Exception as e:
+            logger.error(f"Error executing generate_conformers: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "compute_descriptors":
+        queries = arguments.get("queries") or []
+        smiles = arguments.get("smiles") or []
+        descriptors = arguments.get("descriptors")
+        format_type = arguments.get("format", "JSON")
+        
+        if not isinstance(queries, list) or not isinstance(smiles, list) \
+                or not all(isinstance(q, str) for q in queries + smiles) or not queries + smiles:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Parameters 'queries' and 'smiles' must be lists of strings, and at least one must be non-empty"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if len(queries) > BATCH_MAX_SIZE or len(smiles) > DESCRIPTORS_MAX_SMILES:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: At most {BATCH_MAX_SIZE} queries and {DESCRIPTORS_MAX_SMILES} SMILES are allowed per request"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = compute_compound_descriptors(queries, smiles, descriptors, format_type)
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ],
+                "isError": result.startswith("Error:")
+            }
+        except Exception as e:
+            logger.error(f"Error executing compute_descriptors: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "analyze_geometry":
+        queries = arguments.get("queries")
+        analyses = arguments.get("analyses")
+        contact_scale = arguments.get("contact_scale", CONTACT_SCALE)
+        
+        if isinstance(queries, str):
+            queries = [queries]
+        if isinstance(analyses, str):
+            analyses = [analyses]
+        if not queries or not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Parameter 'queries' must be a non-empty list of strings"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if len(queries) > BATCH_MAX_SIZE:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: At most {BATCH_MAX_SIZE} queries are allowed per request"
+                    }
+                ],
+                "isError": True
+            }
+        
+        if not isinstance(contact_scale, (int, float)) or not 0 < contact_scale <= 2:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Parameter 'contact_scale' must be a number between 0 and 2"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            result = analyze_geometry(queries, analyses, float(contact_scale))
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": result
+                    }
+                ],
+                "isError": result.startswith("Error:")
+            }
+        except Exception as e:
+            logger.error(f"Error executing analyze_geometry: {str(e)}")
             logger.error(traceback.format_exc())
             return {
                 "content": [
@@ -441,6 +1963,86 @@ def handle_tool_call(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any
                 "isError": True
             }
     
+    elif tool_name == "profile_next_n_requests" and ADMIN_TOOLS_ENABLED:
+        requests_count = arguments.get("requests", 10)
+        mode = arguments.get("mode", "cprofile")
+        memory = arguments.get("memory", False)
+        
+        if not isinstance(requests_count, int) or not 1 <= requests_count <= PROFILE_MAX_REQUESTS:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: Parameter 'requests' must be an integer between 1 and {PROFILE_MAX_REQUESTS}"
+                    }
+                ],
+                "isError": True
+            }
+        
+        try:
+            session = start_profiling(requests_count, mode, bool(memory))
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": json.dumps(session.status(), indent=2)
+                    }
+                ],
+                "isError": False
+            }
+        except (ValueError, RuntimeError) as e:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Error: {str(e)}"
+                    }
+                ],
+                "isError": True
+            }
+    
+    elif tool_name == "export_cache_snapshot" and ADMIN_TOOLS_ENABLED:
+        path = arguments.get("path")
+        max_entries = arguments.get("max_entries")
+        
+        if max_entries is not None and (not isinstance(max_entries, int) or max_entries < 1):
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Error: Parameter 'max_entries' must be a positive integer"
+                    }
+                ],
+                "isError": True
+            }
+        
+        result = export_cache_snapshot(path, max_entries)
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": result
+                }
+            ],
+            "isError": result.startswith("Error:")
+        }
+    
+    elif tool_name == "get_server_stats" and ADMIN_TOOLS_ENABLED:
+        stats = {
+            "admission": _admission.stats(),
+            "cache": _cache.get_stats(),
+            "compound_table": len(_compound_table) if _compound_table is not None else None
+        }
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": json.dumps(stats, indent=2)
+                }
+            ],
+            "isError": False
+        }
+    
     else:
         return {
             "content": [
@@ -452,175 +2054,413 @@ def handle_tool_call(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any
             "isError": True
         }
 
-def main():
-    """Main function - MCP server entry point"""
-    logger.info("PubChem MCP server started")
+def tool_class(tool_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+    """Admission class of a tool call"""
+    if tool_name == "get_pubchem_data":
+        if str(arguments.get("format", "JSON")).upper() in STRUCTURE_FORMATS and arguments.get("include_3d"):
+            return STRUCTURE
+        return LOOKUP
+    return TOOL_CLASSES.get(tool_name)
+
+def overloaded_response(request_id: Any, error: Overloaded) -> Dict[str, Any]:
+    """JSON-RPC error for a shed tool call, with a retry hint"""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": OVERLOADED_ERROR_CODE,
+            "message": str(error),
+            "data": {
+                "retryAfter": error.retry_after,
+                "toolClass": error.tool_class
+            }
+        }
+    }
+
+def run_tool_call(request_id: Any, tool_name: str, arguments: Dict[str, Any],
+                  progress: Optional[ProgressCallback] = None,
+                  inflight: Optional[InflightRequests] = None) -> Optional[Dict[str, Any]]:
+    """
+    Run a tool call under its own deadline and cancellation; returns None if the client cancelled it.
+    Raises Overloaded if the call was shed.
+    """
+    inflight = inflight or _inflight
+    context = inflight.start(request_id)
+    try:
+        with request_scope(context), trace_request("tools/call", tool=tool_name, request_id=str(request_id)) as root, \
+                _admission.admit(tool_class(tool_name, arguments)), profile_request():
+            result = handle_tool_call(tool_name, arguments, progress)
+            root.set_attribute("is_error", bool(result.get("isError")))
+    finally:
+        inflight.finish(request_id)
     
-    while True:
-        try:
-            # Read a line
-            line = sys.stdin.readline()
-            if not line:
-                logger.info("Input ended")
-                break
-                
-            logger.debug(f"Received: {line.strip()}")
-            
-            # Parse request
-            request = json.loads(line)
-            request_id = request.get("id")
-            method = request.get("method")
-            params = request.get("params", {})
-            
-            logger.info(f"Processing request: method={method}, id={request_id}")
-            
-            # Handle different types of requests
-            if method == "initialize":
-                # Log client info
-                client_info = params.get("clientInfo", {})
-                client_name = client_info.get("name", "unknown")
-                client_version = client_info.get("version", "unknown")
-                protocol_version = params.get("protocolVersion", "unknown")
-                logger.info(f"Client: {client_name} {client_version}, Protocol version: {protocol_version}")
-                
-                # Create correct initialization response
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "protocolVersion": protocol_version,
-                        "serverInfo": {
-                            "name": "pubchem-mcp-server",
-                            "version": "1.0.0"
-                        },
-                        "capabilities": {
-                            "tools": {}
-                        }
-                    }
-                }
-                
-            elif method == "list_tools":
-                logger.info("Processing tools list request")
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "tools": get_tools_list()
-                    }
+    if context.cancelled:
+        # The client no longer expects a response
+        logger.info(f"Request cancelled: id={request_id}, reason={context.cancel_reason}")
+        return None
+    return result
+
+def handle_request(request: Dict[str, Any],
+                   notify: Optional[Callable[[Dict[str, Any]], None]] = None,
+                   inflight: Optional[InflightRequests] = None) -> Optional[Dict[str, Any]]:
+    """
+    Handle a parsed JSON-RPC request and build its response.
+    notify, if given, sends JSON-RPC notifications (such as progress) to the client.
+    inflight tracks the client's running requests so they can be cancelled.
+    Returns None when there is nothing to send back (notifications, cancelled requests).
+    """
+    request_id = request.get("id")
+    method = request.get("method")
+    params = request.get("params", {})
+    
+    logger.info(f"Processing request: method={method}, id={request_id}")
+    
+    # Notifications get no response
+    if method == "notifications/cancelled":
+        cancelled_id = params.get("requestId")
+        if (inflight or _inflight).cancel(cancelled_id, params.get("reason")):
+            logger.info(f"Cancelling request: id={cancelled_id}")
+        return None
+    if "id" not in request and isinstance(method, str) and method.startswith("notifications/"):
+        logger.info(f"Received notification: {method}")
+        return None
+    
+    # Handle different types of requests
+    if method == "initialize":
+        # Log client info
+        client_info = params.get("clientInfo", {})
+        client_name = client_info.get("name", "unknown")
+        client_version = client_info.get("version", "unknown")
+        protocol_version = params.get("protocolVersion", "unknown")
+        logger.info(f"Client: {client_name} {client_version}, Protocol version: {protocol_version}")
+        
+        # Create correct initialization response
+        response = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "result": {
+                "protocolVersion": protocol_version,
+                "serverInfo": {
+                    "name": "pubchem-mcp-server",
+                    "version": "1.0.0"
+                },
+                "capabilities": {
+                    "tools": {}
                 }
-                
-            elif method == "call_tool":
-                logger.info("Processing tool call request")
-                tool_name = params.get("name")
-                arguments = params.get("arguments", {})
-                
-                if not tool_name:
-                    logger.warning("Missing tool name")
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32602,
-                            "message": "Invalid params: missing tool name"
-                        }
-                    }
-                else:
-                    result = handle_tool_call(tool_name, arguments)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": result
-                    }
-            
-            # These methods may be used in some MCP clients
-            elif method == "tools/list":
-                logger.info("Processing tools/list request")
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "tools": get_tools_list()
-                    }
+            }
+        }
+        
+    elif method == "list_tools":
+        logger.info("Processing tools list request")
+        response = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "result": {
+                "tools": get_tools_list()
+            }
+        }
+        
+    elif method == "call_tool":
+        logger.info("Processing tool call request")
+        tool_name = params.get("name")
+        arguments = params.get("arguments", {})
+        
+        if not tool_name:
+            logger.warning("Missing tool name")
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32602,
+                    "message": "Invalid params: missing tool name"
                 }
-            
-            elif method == "tools/call":
-                logger.info("Processing tools/call request")
-                tool_name = params.get("name")
-                arguments = params.get("arguments", {})
-                
-                if not tool_name:
-                    logger.warning("Missing tool name")
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32602,
-                            "message": "Invalid params: missing tool name"
-                        }
-                    }
-                else:
-                    result = handle_tool_call(tool_name, arguments)
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": result
-                    }
-            
-            else:
-                logger.warning(f"Unknown method: {method}")
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": f"Method not found: {method}"
-                    }
+            }
+        else:
+            progress = make_progress_reporter(params, notify)
+            try:
+                result = run_tool_call(request_id, tool_name, arguments, progress, inflight)
+            except Overloaded as e:
+                return overloaded_response(request_id, e)
+            if result is None:
+                return None
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": result
+            }
+    
+    # These methods may be used in some MCP clients
+    elif method == "tools/list":
+        logger.info("Processing tools/list request")
+        response = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "result": {
+                "tools": get_tools_list()
+            }
+        }
+    
+    elif method == "tools/call":
+        logger.info("Processing tools/call request")
+        tool_name = params.get("name")
+        arguments = params.get("arguments", {})
+        
+        if not tool_name:
+            logger.warning("Missing tool name")
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32602,
+                    "message": "Invalid params: missing tool name"
                 }
-            
-            # Serialize response
-            response_json = json.dumps(response)
-            logger.debug(f"Sending response: {response_json}")
-            
-            # Write to stdout and flush immediately
-            sys.stdout.write(response_json + "\n")
-            sys.stdout.flush()
-            
-            logger.info(f"Response sent: method={method}, id={request_id}")
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
+            }
+        else:
+            progress = make_progress_reporter(params, notify)
+            try:
+                result = run_tool_call(request_id, tool_name, arguments, progress, inflight)
+            except Overloaded as e:
+                return overloaded_response(request_id, e)
+            if result is None:
+                return None
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": result
+            }
+    
+    else:
+        logger.warning(f"Unknown method: {method}")
+        response = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": -32601,
+                "message": f"Method not found: {method}"
+            }
+        }
+    
+    return response
+
+def process_line(line: str, notify: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 inflight: Optional[InflightRequests] = None) -> Optional[str]:
+    """Process one line of JSON-RPC input and return the serialized response"""
+    request_id = None
+    try:
+        logger.debug(f"Received: {line.strip()}")
+        
+        # Parse request
+        request = json.loads(line)
+        request_id = request.get("id")
+        method = request.get("method")
+        
+        response = handle_request(request, notify, inflight)
+        if response is None:
+            return None
+        
+        # Serialize response
+        response_json = json.dumps(response)
+        logger.debug(f"Sending response: {response_json}")
+        logger.info(f"Response ready: method={method}, id={request_id}")
+        return response_json
+        
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parsing error: {e}")
+        error_response = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {
+                "code": -32700,
+                "message": "Parse error: Invalid JSON"
+            }
+        }
+        return json.dumps(error_response)
+        
+    except Exception as e:
+        logger.error(f"Unhandled exception: {e}")
+        logger.error(traceback.format_exc())
+        try:
             error_response = {
                 "jsonrpc": "2.0",
-                "id": None,
+                "id": request_id,
                 "error": {
-                    "code": -32700,
-                    "message": "Parse error: Invalid JSON"
+                    "code": -32603,
+                    "message": f"Internal error: {str(e)}"
                 }
             }
-            sys.stdout.write(json.dumps(error_response) + "\n")
-            sys.stdout.flush()
-            
-        except Exception as e:
-            logger.error(f"Unhandled exception: {e}")
-            logger.error(traceback.format_exc())
+            return json.dumps(error_response)
+        except:
+            logger.error("Failed to build error response")
+            return None
+
+_stdout_lock = Lock()
+
+def write_stdout(message_json: str):
+    """Write one JSON-RPC message to stdout; notifications may come from worker threads"""
+    with _stdout_lock:
+        # Write to stdout and flush immediately
+        sys.stdout.write(message_json + "\n")
+        sys.stdout.flush()
+
+def dispatch_line(line: str, send: Callable[[str], None], inflight: InflightRequests):
+    """
+    Process one line of JSON-RPC input, sending the response (and any notifications) with send.
+    Tool calls run on the request pool so the reader keeps handling other messages,
+    such as cancellations, while they are in flight.
+    """
+    def notify(message: Dict[str, Any]):
+        send(json.dumps(message))
+    
+    def process():
+        response_json = process_line(line, notify, inflight)
+        if response_json is not None:
+            send(response_json)
+    
+    try:
+        method = json.loads(line).get("method")
+    except (json.JSONDecodeError, AttributeError):
+        method = None
+    
+    if method in TOOL_CALL_METHODS:
+        def process_dispatched():
             try:
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "id": request_id if 'request_id' in locals() else None,
-                    "error": {
-                        "code": -32603,
-                        "message": f"Internal error: {str(e)}"
-                    }
-                }
-                sys.stdout.write(json.dumps(error_response) + "\n")
-                sys.stdout.flush()
-            except:
-                logger.error("Failed to send error response")
+                process()
+            finally:
+                inflight.done()
+        
+        inflight.dispatched()
+        _request_executor.submit(process_dispatched)
+    else:
+        process()
+
+def setup_logging():
+    """Log to a new timestamped file in ~/.pubchem-mcp"""
+    global log_file
+    if log_file is not None:
+        return
+    # Ensure no buffering
+    os.environ['PYTHONUNBUFFERED'] = '1'
+    log_dir = os.path.expanduser("~/.pubchem-mcp")
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"pubchem_mcp_server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.DEBUG,
+        format='[%(asctime)s] [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+def startup(snapshot: Optional[str] = None):
+    """Set up logging, the compound table and signal handlers, and load a snapshot, before serving"""
+    global _compound_table
+    setup_logging()
+    if _compound_table is None:
+        _compound_table = open_compound_table(DEFAULT_TABLE_PATH)
+    install_signal_handlers()
+    if snapshot:
+        load_snapshot(snapshot)
+
+def main(snapshot: Optional[str] = None):
+    """Main function - MCP server entry point"""
+    startup(snapshot)
+    logger.info("PubChem MCP server started")
+    
+    while True:
+        # Read a line
+        line = sys.stdin.readline()
+        if not line:
+            logger.info("Input ended")
+            break
+        
+        dispatch_line(line, write_stdout, _inflight)
+    
+    # Let requests still in flight finish and send their responses
+    _request_executor.shutdown(wait=True)
+
+def run_daemon(socket_path: str, snapshot: Optional[str] = None):
+    """Daemon mode - serve many shims from one process sharing caches and rate limiting"""
+    from pubchem_mcp_server.daemon import serve
+    
+    startup(snapshot)
+    logger.info(f"PubChem MCP daemon starting on {socket_path}")
+    if not serve(socket_path, dispatch_line):
+        logger.info("Daemon already running, exiting")
+
+def run_shim(socket_path: str):
+    """Shim mode - forward stdio to the shared daemon, starting it if needed"""
+    from pubchem_mcp_server.daemon import run_shim as forward
+    
+    start_command = [sys.executable, os.path.abspath(__file__), "--daemon", "--socket", socket_path]
+    logger.info(f"PubChem MCP shim forwarding to {socket_path}")
+    forward(socket_path, start_command)
+
+def run_http(address: str, snapshot: Optional[str] = None):
+    """HTTP mode - serve many clients over Streamable HTTP from one process"""
+    from pubchem_mcp_server.http_transport import run_http as serve_http
+    
+    host, _, port = address.rpartition(":")
+    startup(snapshot)
+    serve_http(handle_request, host=host or "127.0.0.1", port=int(port), max_workers=MAX_CONCURRENT_REQUESTS)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    from pubchem_mcp_server.daemon import DEFAULT_SOCKET_PATH
+    
+    parser = argparse.ArgumentParser(description="PubChem MCP server")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", action="store_true",
+                      help="Run the shared backend daemon on a Unix socket")
+    mode.add_argument("--shim", action="store_true",
+                      help="Forward stdio to the shared daemon, auto-starting it on first use")
+    mode.add_argument("--http", metavar="[HOST:]PORT",
+                      help="Serve Streamable HTTP (with SSE for long-running results) instead of stdio")
+    mode.add_argument("--index-smiles", metavar="FILE",
+                      help="Add compounds from a CID<tab>SMILES file to the local search indexes and exit")
+    mode.add_argument("--convert-sdf", metavar="FILE",
+                      help="Convert a (possibly gzipped) SDF file to XYZ and exit")
+    mode.add_argument("--build-compound-table", metavar="FILE",
+                      help="Build the memory-mapped compound table from a CSV or tab-separated property file with a CID column and exit")
+    mode.add_argument("--compact-structures", action="store_true",
+                      help="Retrain the structure compression dictionary, recompress the structure cache and exit")
+    convert = parser.add_argument_group("SDF conversion options")
+    convert.add_argument("--output", metavar="PATH",
+                         help="Multi-frame XYZ file, or directory with --per-cid (default: next to the input). "
+                              "With --build-compound-table, the table file (default: $PUBCHEM_MCP_COMPOUND_TABLE "
+                              "or ~/.pubchem-mcp/compounds.table)")
+    convert.add_argument("--per-cid", action="store_true",
+                         help="Write one <CID>.xyz file per record instead of a multi-frame XYZ file")
+    convert.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                         help="Conversion processes (default: one per CPU, 1 converts in-process)")
+    convert.add_argument("--no-rdkit", action="store_true",
+                         help="Use the fast RDKit-free SDF parser")
+    parser.add_argument("--socket", default=os.environ.get("PUBCHEM_MCP_SOCKET", DEFAULT_SOCKET_PATH),
+                        help="Daemon socket path (default: $PUBCHEM_MCP_SOCKET or ~/.pubchem-mcp/daemon.sock)")
+    parser.add_argument("--snapshot", metavar="FILE", default=DEFAULT_SNAPSHOT_PATH or None,
+                        help="Load a cache snapshot at startup (default: $PUBCHEM_MCP_SNAPSHOT)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
     try:
-        main()
+        args = parse_args()
+        setup_logging()
+        if args.daemon:
+            run_daemon(args.socket, args.snapshot)
+        elif args.shim:
+            run_shim(args.socket)
+        elif args.http:
+            run_http(args.http, args.snapshot)
+        elif args.index_smiles:
+            import_compounds(args.index_smiles)
+        elif args.convert_sdf:
+            convert_sdf_file(args.convert_sdf, args.output, args.per_cid, args.workers, not args.no_rdkit)
+        elif args.build_compound_table:
+            build_from_file(args.build_compound_table, args.output or DEFAULT_TABLE_PATH, TEXT_PROPERTIES)
+        elif args.compact_structures:
+            structure_cache.compact()
+        else:
+            main(args.snapshot)
     except Exception as e:
         logger.critical(f"Fatal error: {e}")
         logger.critical(traceback.format_exc())
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1) 
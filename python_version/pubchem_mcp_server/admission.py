@@ -0,0 +1,185 @@
+"""
+Admission Control Module
+
+Bounds the tool calls a server process works on, so that a burst is answered with a
+fast "overloaded, retry after N seconds" error instead of queueing until every client
+times out.
+
+Tool calls are grouped into classes with their own limits (cheap lookups are not held up
+behind slow 3D structure generation). Each class runs at most `concurrency` calls at once
+and lets at most `queue` more wait for a slot; further calls are shed immediately. A
+queued call is also shed if it waits longer than the queue timeout, and gives up when
+its request is cancelled or runs out of time.
+
+Limits are set per class with PUBCHEM_MCP_LIMIT_<CLASS>="<concurrency>[:<queue>]".
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .context import current_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+LOOKUP = "lookup"
+STRUCTURE = "structure"
+DOWNLOAD = "download"
+BATCH = "batch"
+
+# Default (concurrency, queue) per class: cached or local lookups, CPU-bound RDKit work
+# (3D structures, conformers, substructure search), bulk PubChem transfers, and batch calls
+# (whose compounds are also admitted one by one as lookups or structures)
+DEFAULT_LIMITS: Dict[str, Tuple[int, int]] = {
+    LOOKUP: (8, 32),
+    STRUCTURE: (2, 8),
+    DOWNLOAD: (4, 16),
+    BATCH: (2, 8),
+}
+
+# Longest a call waits in a queue before it is shed (seconds)
+DEFAULT_QUEUE_TIMEOUT = float(os.environ.get("PUBCHEM_MCP_QUEUE_TIMEOUT", "30"))
+
+# Bounds of the suggested retry delay (seconds)
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+# Weight of the latest call in the average service time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a call is shed; retry_after is the suggested delay in seconds"""
+
+    def __init__(self, tool_class: str, retry_after: int, queued: int):
+        super().__init__(f"Server overloaded ({tool_class} calls), retry after {retry_after} seconds")
+        self.tool_class = tool_class
+        self.retry_after = retry_after
+        self.queued = queued
+
+
+def _limits_from_env(name: str, default: Tuple[int, int]) -> Tuple[int, int]:
+    spec = os.environ.get(f"PUBCHEM_MCP_LIMIT_{name.upper()}")
+    if not spec:
+        return default
+    try:
+        concurrency, _, queue = spec.partition(":")
+        return max(1, int(concurrency)), (max(0, int(queue)) if queue else default[1])
+    except ValueError:
+        logger.warning(f"Invalid PUBCHEM_MCP_LIMIT_{name.upper()}={spec!r}, using {default[0]}:{default[1]}")
+        return default
+
+
+class ClassLimiter:
+    """Concurrency slots and a bounded wait queue for one class of tool calls"""
+
+    def __init__(self, name: str, concurrency: int, queue: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.queue_timeouts = 0
+        self.service_time = 1.0
+        self._condition = threading.Condition()
+
+    def _retry_after(self) -> int:
+        # Time for the calls ahead to drain through the slots
+        backlog = (self.active + self.queued + 1) / self.concurrency
+        return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(backlog * self.service_time))))
+
+    def _shed(self) -> Overloaded:
+        self.shed += 1
+        return Overloaded(self.name, self._retry_after(), self.queued)
+
+    def acquire(self, timeout: float) -> None:
+        """Take a slot, waiting in the queue if there is room; raises Overloaded otherwise"""
+        context = current_context()
+        with self._condition:
+            if self.active < self.concurrency and self.queued == 0:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.queued >= self.queue:
+                raise self._shed()
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            deadline = time.monotonic() + timeout
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.queue_timeouts += 1
+                        raise self._shed()
+                    # Wake up now and then to notice cancellation and the request deadline
+                    self._condition.wait(min(remaining, 0.1))
+                    if context is not None:
+                        context.check()
+            finally:
+                self.queued -= 1
+            self.active += 1
+            self.admitted += 1
+
+    def release(self, elapsed: float) -> None:
+        with self._condition:
+            self.active -= 1
+            self.service_time += SERVICE_TIME_SMOOTHING * (elapsed - self.service_time)
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {"concurrency": self.concurrency, "queue_limit": self.queue, "active": self.active,
+                    "queued": self.queued, "peak_queued": self.peak_queued, "admitted": self.admitted,
+                    "shed": self.shed, "queue_timeouts": self.queue_timeouts,
+                    "avg_service_seconds": round(self.service_time, 3)}
+
+
+class AdmissionController:
+    """Per-class limiters for the tool calls of one server process"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        if limits is None:
+            limits = {name: _limits_from_env(name, default) for name, default in DEFAULT_LIMITS.items()}
+        self.limiters = {name: ClassLimiter(name, *limit) for name, limit in limits.items()}
+        self.queue_timeout = queue_timeout
+
+    def capacity(self) -> int:
+        """Calls that can be running or queued at once"""
+        return sum(limiter.concurrency + limiter.queue for limiter in self.limiters.values())
+
+    @contextmanager
+    def admit(self, tool_class: Optional[str]) -> Iterator[None]:
+        """Run the enclosed call within its class's limits; None runs it unconditionally"""
+        limiter = self.limiters.get(tool_class) if tool_class else None
+        if limiter is None:
+            yield
+            return
+        try:
+            limiter.acquire(self.queue_timeout)
+        except Overloaded as e:
+            logger.warning(f"Shed {tool_class} call: {limiter.active} running, {e.queued} queued, "
+                           f"retry after {e.retry_after}s")
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, shed counts and service times per class"""
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
@@ -0,0 +1,76 @@
+"""
+Append File Module
+
+Appends records to files shared by several processes: server and daemon processes and
+their workers all write to the same indexes and stores under ~/.pubchem-mcp.
+
+Each append holds an exclusive lock on the file, so records written by different processes
+never interleave. A record left partial by a writer that died mid-write is cut off before
+the next append, and readers skip a trailing partial record.
+"""
+
+import os
+from typing import BinaryIO, Iterable, Iterator
+
+# Try to import fcntl, appends are unlocked where it is not available (Windows)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Bytes read at a time when looking back for the end of the last complete line
+SCAN_BLOCK = 64 * 1024
+
+
+def open_append(path: str) -> BinaryIO:
+    """Open a file for locked_append, creating it and its directory if needed"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Readable too, to find the end of the last complete record
+    return open(path, "a+b")
+
+
+def _complete_size(fd: int, size: int, header_size: int, record_size: int) -> int:
+    """Size of the file without a trailing partial record"""
+    if size < header_size:
+        return 0
+    if record_size:
+        return header_size + (size - header_size) // record_size * record_size
+    end = size
+    while end > header_size:
+        start = max(header_size, end - SCAN_BLOCK)
+        newline = os.pread(fd, end - start, start).rfind(b"\n")
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return header_size
+
+
+def locked_append(file: BinaryIO, data: bytes, header: bytes = b"", record_size: int = 0) -> None:
+    """
+    Append data to a file from open_append. An empty file gets header first. Records are
+    lines, or fixed-size binary records after the header when record_size is given.
+    """
+    fd = file.fileno()
+    if FCNTL_AVAILABLE:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        size = os.fstat(fd).st_size
+        complete = _complete_size(fd, size, len(header), record_size)
+        if complete < size:
+            os.ftruncate(fd, complete)
+        if complete == 0:
+            data = header + data
+        file.write(data)
+        file.flush()
+    finally:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def complete_lines(lines: Iterable[str]) -> Iterator[str]:
+    """The lines of a text file, without a trailing line that lacks its newline"""
+    for line in lines:
+        if not line.endswith("\n"):
+            return
+        yield line
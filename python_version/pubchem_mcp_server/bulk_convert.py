@@ -0,0 +1,213 @@
+"""
+Bulk Conversion Module
+
+Converts large local SDF files (plain or gzipped) to XYZ. Records are streamed from the
+input in chunks and converted on a process pool, with the RDKit path (sdf_to_mol +
+mol_to_xyz) or the RDKit-free parse_sdf fallback. Results are written in input order, as a
+single multi-frame XYZ file or as one file per CID.
+
+Chunks are consumed in submission order from a bounded window of in-flight chunks. That
+window is the reorder buffer: chunks that finish early wait in it until the chunks before
+them are written, and no new chunks are read while it is full, so memory stays bounded
+however large the input is.
+"""
+
+import gzip
+import io
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .xyz_utils import RDKIT_AVAILABLE, XYZData, mol_to_xyz, parse_sdf, sdf_to_mol
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Records per worker task
+CHUNK_SIZE = 200
+
+# In-flight chunks per worker, the bound of the reorder buffer
+WINDOW_PER_WORKER = 4
+
+# Seconds between progress reports
+REPORT_INTERVAL = 5.0
+
+GZIP_MAGIC = b"\x1f\x8b"
+RECORD_END = "$$$$"
+CID_TAG = "> <PUBCHEM_COMPOUND_CID>"
+
+
+class ConversionStats:
+    """Counts and rate of a bulk conversion"""
+
+    def __init__(self):
+        self.records = 0
+        self.converted = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "records": self.records,
+            "converted": self.converted,
+            "failed": self.failed,
+            "seconds": round(self.elapsed, 3),
+            "records_per_second": round(self.records_per_second, 1),
+        }
+
+
+def open_sdf(path: str) -> io.TextIOBase:
+    """Text stream of an SDF file, decompressing it if it is gzipped"""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == GZIP_MAGIC:
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_sdf_records(path: str) -> Iterator[str]:
+    """Records of an SDF file, each without its $$$$ terminator"""
+    with open_sdf(path) as f:
+        lines: List[str] = []
+        for line in f:
+            if line.rstrip() == RECORD_END:
+                yield "".join(lines)
+                lines = []
+            else:
+                lines.append(line)
+        if any(line.strip() for line in lines):
+            yield "".join(lines)
+
+
+def _chunks(records: Iterator[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _record_id(record: str) -> str:
+    """PubChem CID of a record from its data items, or its title line"""
+    position = record.find(CID_TAG)
+    if position >= 0:
+        value = record[position + len(CID_TAG):].lstrip("\r\n").split("\n", 1)[0].strip()
+        if value:
+            return value
+    return record.split("\n", 1)[0].strip()
+
+
+def convert_record(record: str, use_rdkit: bool = True) -> Tuple[str, Optional[str]]:
+    """(record ID, XYZ text or None) of one SDF record"""
+    record_id = _record_id(record)
+    compound_info = {"id": record_id}
+    if use_rdkit and RDKIT_AVAILABLE:
+        mol = sdf_to_mol(record)
+        if mol is not None:
+            xyz = mol_to_xyz(mol, compound_info)
+            if xyz:
+                return record_id, xyz
+    atoms = parse_sdf(record)
+    if atoms:
+        return record_id, XYZData(len(atoms), f"id={record_id}" if record_id else "", atoms).to_string()
+    return record_id, None
+
+
+def _convert_chunk(records: List[str], use_rdkit: bool) -> List[Tuple[str, Optional[str]]]:
+    # Per-record INFO logging from xyz_utils would cost more than the conversion itself
+    logging.getLogger("pubchem_mcp_server.xyz_utils").setLevel(logging.WARNING)
+    try:
+        from rdkit import RDLogger
+        RDLogger.DisableLog("rdApp.*")
+    except ImportError:
+        pass
+    return [convert_record(record, use_rdkit) for record in records]
+
+
+def _safe_filename(record_id: str, index: int) -> str:
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in record_id).strip("._")
+    return name or f"record{index}"
+
+
+def convert_sdf(input_path: str, output_path: str, per_cid: bool = False,
+                workers: int = os.cpu_count() or 1, use_rdkit: bool = True,
+                chunk_size: int = CHUNK_SIZE,
+                on_progress: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
+    """
+    Convert every record of an SDF file to XYZ, in input order. With per_cid, output_path is
+    a directory that receives one <CID>.xyz file per record; otherwise it is a multi-frame XYZ
+    file. workers <= 1 converts in this process. Records that cannot be converted are
+    counted as failed and skipped.
+    """
+    stats = ConversionStats()
+    chunks = _chunks(iter_sdf_records(input_path), chunk_size)
+    if per_cid:
+        Path(output_path).mkdir(parents=True, exist_ok=True)
+        output = None
+    else:
+        output = open(output_path, "w", encoding="utf-8")
+    last_report = time.perf_counter()
+
+    def write(results: List[Tuple[str, Optional[str]]]) -> None:
+        nonlocal last_report
+        for record_id, xyz in results:
+            stats.records += 1
+            if xyz is None:
+                stats.failed += 1
+                continue
+            stats.converted += 1
+            if output is not None:
+                output.write(xyz if xyz.endswith("\n") else xyz + "\n")
+            else:
+                name = _safe_filename(record_id, stats.records)
+                (Path(output_path) / f"{name}.xyz").write_text(xyz, encoding="utf-8")
+        if time.perf_counter() - last_report >= REPORT_INTERVAL:
+            last_report = time.perf_counter()
+            if on_progress:
+                on_progress(stats)
+
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                write(_convert_chunk(chunk, use_rdkit))
+        else:
+            # spawn: forking a process that runs HTTP and worker threads is unsafe
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                window = deque()
+                for chunk in chunks:
+                    window.append(pool.submit(_convert_chunk, chunk, use_rdkit))
+                    if len(window) >= workers * WINDOW_PER_WORKER:
+                        write(window.popleft().result())
+                while window:
+                    write(window.popleft().result())
+    finally:
+        if output is not None:
+            output.close()
+    return stats
+
+
+def log_progress(stats: ConversionStats) -> None:
+    logger.info(f"Converted {stats.converted}/{stats.records} records "
+                f"({stats.records_per_second:.0f} records/s, {stats.failed} failed)")
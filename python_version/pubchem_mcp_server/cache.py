@@ -0,0 +1,278 @@
+"""
+Property Cache Module
+
+In-memory cache of compound property records with per-entry freshness.
+
+- Fresh entries are served directly.
+- Stale entries (past their TTL but within the stale window) are served immediately
+  while a background worker refreshes them (stale-while-revalidate).
+- Frequently accessed entries whose TTL is about to lapse are refreshed ahead of time.
+- Refreshes send the entry's ETag / Last-Modified validators so unchanged records can be
+  revalidated with a cheap 304 response.
+- The cache holds at most max_entries records, evicting the least recently used.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# How long an entry is fresh (seconds)
+DEFAULT_TTL = float(os.environ.get("PUBCHEM_MCP_CACHE_TTL", str(24 * 3600)))
+
+# How long after expiry a stale entry may still be served while it is refreshed (seconds)
+DEFAULT_STALE_TTL = float(os.environ.get("PUBCHEM_MCP_CACHE_STALE_TTL", str(7 * 24 * 3600)))
+
+# Maximum number of entries kept in memory
+DEFAULT_MAX_ENTRIES = int(os.environ.get("PUBCHEM_MCP_CACHE_MAX_ENTRIES", "100000"))
+
+# Refresh-ahead: hot entries expiring within this fraction of the TTL are refreshed early
+REFRESH_AHEAD_FRACTION = 0.1
+
+# Refresh-ahead: decayed access count that makes an entry hot
+HOT_ACCESS_COUNT = 5.0
+
+# Interval between refresh-ahead scans; access counts are halved at each scan (seconds)
+REFRESH_AHEAD_INTERVAL = 60.0
+
+# Background refresh workers
+REFRESH_WORKERS = 2
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+MISS = "miss"
+
+# refresher(key) re-fetches an entry and stores it with set() or revalidate()
+Refresher = Callable[[str], Any]
+
+
+class CacheEntry:
+    """A cached record with its freshness and revalidation metadata"""
+
+    __slots__ = ("value", "expires_at", "etag", "last_modified", "hits")
+
+    def __init__(self, value: Any, expires_at: float, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None):
+        self.value = value
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+        self.hits = 0.0
+
+
+class PropertyCache:
+    """Bounded LRU cache with stale-while-revalidate and refresh-ahead"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, stale_ttl: float = DEFAULT_STALE_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresher: Optional[Refresher] = None
+        self._refreshing: Set[str] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._scanner: Optional[threading.Thread] = None
+        self.stats = {"fresh": 0, "stale": 0, "expired": 0, "miss": 0,
+                      "refreshes": 0, "revalidated": 0, "evictions": 0}
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set_refresher(self, refresher: Refresher) -> None:
+        """Set the function used to refresh entries in the background"""
+        self._refresher = refresher
+
+    def lookup(self, key: str) -> Tuple[Optional[Any], str]:
+        """
+        Look up an entry, returning (value, state) where state is fresh, stale, expired or miss.
+        Stale entries are scheduled for a background refresh.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats[MISS] += 1
+                return None, MISS
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            if now < entry.expires_at:
+                state = FRESH
+            elif now < entry.expires_at + self.stale_ttl:
+                state = STALE
+            else:
+                state = EXPIRED
+            self.stats[state] += 1
+            value = entry.value
+
+        if state == STALE:
+            self.refresh_in_background(key)
+        return value, state
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Get an entry's value regardless of freshness, without counting an access"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry else None
+
+    def set(self, key: str, value: Any, etag: Optional[str] = None,
+            last_modified: Optional[str] = None) -> None:
+        """Store a freshly fetched value"""
+        with self._lock:
+            previous = self._entries.get(key)
+            entry = CacheEntry(value, time.time() + self.ttl, etag, last_modified)
+            if previous is not None:
+                entry.hits = previous.hits
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        self._start_refresh_ahead()
+
+    def merge(self, key: str, values: Dict[str, Any]) -> None:
+        """
+        Add fields to a dict entry, keeping its expiry. Validators are dropped since they
+        describe the entry as it was fetched before.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.value = {**entry.value, **values}
+                entry.etag = None
+                entry.last_modified = None
+                self._entries.move_to_end(key)
+                return
+        self.set(key, values)
+
+    def revalidate(self, key: str) -> Optional[Any]:
+        """Mark an entry fresh again after the upstream confirmed it is unchanged (HTTP 304)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.expires_at = time.time() + self.ttl
+            self.stats["revalidated"] += 1
+            return entry.value
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """Validators for a conditional request refreshing this entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return {}
+            headers = {}
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+            return headers
+
+    def refresh_in_background(self, key: str) -> bool:
+        """Schedule a refresh of key unless one is already running"""
+        if self._refresher is None:
+            return False
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS,
+                                                    thread_name_prefix="cache-refresh")
+        self._executor.submit(self._refresh, key)
+        return True
+
+    def _refresh(self, key: str) -> None:
+        try:
+            logger.info(f"Refreshing cache entry: {key}")
+            self._refresher(key)
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            # Keep serving the stale entry, the next access will try again
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _start_refresh_ahead(self) -> None:
+        if self._scanner is not None or self._refresher is None:
+            return
+        with self._lock:
+            if self._scanner is not None:
+                return
+            self._scanner = threading.Thread(target=self._refresh_ahead_loop,
+                                             name="cache-refresh-ahead", daemon=True)
+        self._scanner.start()
+
+    def _refresh_ahead_loop(self) -> None:
+        while True:
+            time.sleep(REFRESH_AHEAD_INTERVAL)
+            try:
+                self.refresh_ahead()
+            except Exception as e:
+                logger.error(f"Refresh-ahead scan failed: {e}")
+
+    def refresh_ahead(self) -> int:
+        """Refresh hot entries that are about to expire; returns the number scheduled"""
+        horizon = time.time() + self.ttl * REFRESH_AHEAD_FRACTION
+        due = []
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry.hits >= HOT_ACCESS_COUNT and entry.expires_at <= horizon:
+                    due.append(key)
+                # Decay access counts so only recently popular entries stay hot
+                entry.hits /= 2
+        return sum(1 for key in due if self.refresh_in_background(key))
+
+    def export_entries(self, limit: Optional[int] = None) -> List[Tuple[str, Any, float, Optional[str], Optional[str]]]:
+        """
+        (key, value, expires_at, etag, last_modified) of the limit most recently used
+        entries (default all), least recently used first
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        if limit is not None:
+            entries = entries[-limit:] if limit > 0 else []
+        return [(key, entry.value, entry.expires_at, entry.etag, entry.last_modified) for key, entry in entries]
+
+    def load_entries(self, entries: List[Tuple[str, Any, float, Optional[str], Optional[str]]]) -> int:
+        """
+        Bulk insert exported entries, least recently used first, keeping any entry already
+        present. Returns the number inserted.
+        """
+        inserted = 0
+        with self._lock:
+            # Most recently used first, so the least recently used are left out when full
+            for key, value, expires_at, etag, last_modified in reversed(entries):
+                if len(self._entries) >= self.max_entries:
+                    break
+                if key in self._entries:
+                    continue
+                self._entries[key] = CacheEntry(value, expires_at, etag, last_modified)
+                # Behind the entries this process already used
+                self._entries.move_to_end(key, last=False)
+                inserted += 1
+        self._start_refresh_ahead()
+        return inserted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size, for monitoring"""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), refreshing=len(self._refreshing))
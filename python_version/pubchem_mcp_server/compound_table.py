@@ -0,0 +1,333 @@
+"""
+Compound Table Module
+
+Read-only table of compound properties that server processes memory-map instead of each
+holding its own copy: pages are loaded on demand and shared between processes through the
+OS page cache.
+
+Table layout (all integers little-endian):
+
+    header   magic "PCTABLE1", format version, column count, row count, offsets and
+             sizes of the sections below
+    columns  JSON list of column names and value types
+    index    fixed-width rows sorted by CID: CID, heap offset of the row's values, byte
+             length of each value. Looked up by binary search.
+    hashes   open-addressing hash table of InChIKey hash -> row number + 1 (0 is empty)
+    heap     the values of every row as UTF-8 text, concatenated
+
+Tables are built from CSV or tab-separated files with a CID column, such as property
+tables downloaded from PUG REST.
+"""
+
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TextIO
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Table file location
+DEFAULT_TABLE_PATH = os.environ.get(
+    "PUBCHEM_MCP_COMPOUND_TABLE",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "compounds.table")
+)
+
+FILE_MAGIC = b"PCTABLE1"
+FORMAT_VERSION = 1
+
+# magic, version, column count, row count, columns offset and size, index offset,
+# hash table offset and slot count, heap offset and size
+HEADER = struct.Struct("<8sHH4xQQQQQQQQ")
+
+# InChIKey hash, row number + 1
+HASH_SLOT = struct.Struct("<QI4x")
+
+# Value types: text, integer, floating point
+TEXT, INTEGER, REAL = "s", "i", "f"
+
+# Rows with more CIDs are logged while building
+BUILD_LOG_INTERVAL = 1000000
+
+
+class CompoundTableError(Exception):
+    """Raised for unreadable or incompatible tables"""
+
+
+def _row_struct(columns: int) -> struct.Struct:
+    # CID, heap offset, byte length of each value
+    return struct.Struct("<IQ" + "I" * columns)
+
+
+def _inchikey_hash(key: str) -> int:
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode("ascii"), digest_size=8).digest(), "little") or 1
+
+
+def _value_type(value: str, current: str) -> str:
+    """Narrowest type of a column that also holds value"""
+    if not value or current == TEXT:
+        return current
+    try:
+        int(value)
+        return current
+    except ValueError:
+        pass
+    try:
+        float(value)
+        return REAL
+    except ValueError:
+        return TEXT
+
+
+class CompoundTable:
+    """Memory-mapped compound table with lookups by CID and InChIKey"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise CompoundTableError(f"{path} is empty")
+        if len(self._map) < HEADER.size:
+            raise CompoundTableError(f"{path} is too short to be a compound table")
+        (magic, version, column_count, self.count, columns_offset, columns_size, self._index_offset,
+         self._hash_offset, self._hash_slots, self._heap_offset, heap_size) = HEADER.unpack_from(self._map, 0)
+        if magic != FILE_MAGIC:
+            raise CompoundTableError(f"{path} is not a compound table")
+        if version != FORMAT_VERSION:
+            raise CompoundTableError(f"Compound table format version {version} is not supported "
+                                     f"(expected {FORMAT_VERSION})")
+        if self._heap_offset + heap_size != len(self._map):
+            raise CompoundTableError(f"{path} is truncated")
+        layout = json.loads(self._map[columns_offset:columns_offset + columns_size])
+        self.columns: List[str] = layout["columns"]
+        self._types: List[str] = layout["types"]
+        if len(self.columns) != column_count:
+            raise CompoundTableError(f"{path} has an inconsistent column list")
+        self._row = _row_struct(column_count)
+        self._inchikey_column = self.columns.index("InChIKey") if "InChIKey" in self.columns else None
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _cid_at(self, position: int) -> int:
+        # The CID is the first field of a row
+        return struct.unpack_from("<I", self._map, self._index_offset + position * self._row.size)[0]
+
+    def _find(self, cid: int) -> Optional[int]:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._cid_at(middle) < cid:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._cid_at(low) == cid:
+            return low
+        return None
+
+    def _values(self, position: int) -> List[str]:
+        fields = self._row.unpack_from(self._map, self._index_offset + position * self._row.size)
+        offset = self._heap_offset + fields[1]
+        values = []
+        for length in fields[2:]:
+            values.append(self._map[offset:offset + length].decode("utf-8"))
+            offset += length
+        return values
+
+    def _record(self, position: int, values: Optional[List[str]] = None) -> Dict[str, Any]:
+        values = values if values is not None else self._values(position)
+        record: Dict[str, Any] = {}
+        for name, kind, value in zip(self.columns, self._types, values):
+            if value and kind == INTEGER:
+                record[name] = int(value)
+            elif value and kind == REAL:
+                record[name] = float(value)
+            else:
+                record[name] = value
+        record["CID"] = str(self._cid_at(position))
+        return record
+
+    def get(self, cid: int) -> Optional[Dict[str, Any]]:
+        """Property record of a CID, or None if the table does not have it"""
+        if not 0 < cid < 2 ** 32:
+            return None
+        position = self._find(cid)
+        return self._record(position) if position is not None else None
+
+    def get_by_inchikey(self, inchikey: str) -> Optional[Dict[str, Any]]:
+        """Property record of the compound with an InChIKey, or None"""
+        if self._inchikey_column is None or not self._hash_slots:
+            return None
+        wanted = _inchikey_hash(inchikey)
+        mask = self._hash_slots - 1
+        slot = wanted & mask
+        while True:
+            key_hash, row = HASH_SLOT.unpack_from(self._map, self._hash_offset + slot * HASH_SLOT.size)
+            if row == 0:
+                return None
+            if key_hash == wanted:
+                values = self._values(row - 1)
+                # Distinct keys can share a hash
+                if values[self._inchikey_column] == inchikey:
+                    return self._record(row - 1, values)
+            slot = (slot + 1) & mask
+
+
+def open_compound_table(path: Optional[str] = DEFAULT_TABLE_PATH) -> Optional[CompoundTable]:
+    """The table at path, or None if there is none or it is unusable"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        table = CompoundTable(path)
+    except (OSError, ValueError, CompoundTableError) as e:
+        logger.error(f"Unable to open compound table {path}: {e}")
+        return None
+    logger.info(f"Opened compound table {path}: {len(table)} compounds, columns {', '.join(table.columns)}")
+    return table
+
+
+def build_compound_table(path: str, columns: Sequence[str], rows: Iterable[Sequence[str]],
+                         text_columns: Iterable[str] = ()) -> int:
+    """
+    Write a table from rows of (CID, value of each column) text, atomically replacing path.
+    Column types are inferred from the values, except text_columns which stay text. Only
+    the first row of a duplicated CID is kept. Returns the number of rows written.
+    """
+    columns = list(columns)
+    row_struct = _row_struct(len(columns))
+    types = [INTEGER] * len(columns)
+    for name in text_columns:
+        if name in columns:
+            types[columns.index(name)] = TEXT
+    inchikey_column = columns.index("InChIKey") if "InChIKey" in columns else None
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # The heap is written as rows are read; only the fixed-width index is kept in memory
+    heap = tempfile.TemporaryFile(dir=directory, prefix=".tmp-heap-")
+    index: Dict[int, bytes] = {}
+    inchikeys: Dict[int, int] = {}
+    heap_size = 0
+    duplicates = 0
+    try:
+        for row in rows:
+            cid = int(row[0])
+            if cid in index:
+                duplicates += 1
+                continue
+            values = [(row[i + 1] if i + 1 < len(row) else "").strip() for i in range(len(columns))]
+            encoded = [value.encode("utf-8") for value in values]
+            index[cid] = row_struct.pack(cid, heap_size, *(len(value) for value in encoded))
+            for i, value in enumerate(values):
+                types[i] = _value_type(value, types[i])
+            data = b"".join(encoded)
+            heap.write(data)
+            heap_size += len(data)
+            if inchikey_column is not None and values[inchikey_column]:
+                inchikeys[cid] = _inchikey_hash(values[inchikey_column])
+            if len(index) % BUILD_LOG_INTERVAL == 0:
+                logger.info(f"Read {len(index)} compounds")
+
+        cids = sorted(index)
+        slots = 0
+        hash_table = b""
+        if inchikeys:
+            slots = 1
+            # At most half full, so probe sequences stay short
+            while slots < 2 * len(inchikeys):
+                slots *= 2
+            table = bytearray(slots * HASH_SLOT.size)
+            mask = slots - 1
+            for position, cid in enumerate(cids):
+                key_hash = inchikeys.get(cid)
+                if key_hash is None:
+                    continue
+                slot = key_hash & mask
+                while HASH_SLOT.unpack_from(table, slot * HASH_SLOT.size)[1]:
+                    slot = (slot + 1) & mask
+                HASH_SLOT.pack_into(table, slot * HASH_SLOT.size, key_hash, position + 1)
+            hash_table = bytes(table)
+
+        layout = json.dumps({"columns": columns, "types": types}).encode("utf-8")
+        columns_offset = HEADER.size
+        index_offset = columns_offset + len(layout)
+        hash_offset = index_offset + row_struct.size * len(cids)
+        heap_offset = hash_offset + len(hash_table)
+        header = HEADER.pack(FILE_MAGIC, FORMAT_VERSION, len(columns), len(cids), columns_offset, len(layout),
+                             index_offset, hash_offset, slots, heap_offset, heap_size)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-table-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(layout)
+                for cid in cids:
+                    f.write(index[cid])
+                f.write(hash_table)
+                heap.seek(0)
+                while True:
+                    chunk = heap.read(1 << 20)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+    finally:
+        heap.close()
+
+    if duplicates:
+        logger.warning(f"Skipped {duplicates} duplicate CIDs")
+    logger.info(f"Wrote compound table {path}: {len(cids)} compounds, {heap_offset + heap_size} bytes")
+    return len(cids)
+
+
+def _open_text(path: str) -> TextIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def build_from_file(source: str, path: str = DEFAULT_TABLE_PATH, text_columns: Iterable[str] = ()) -> int:
+    """
+    Build a table from a (possibly gzipped) CSV or tab-separated file whose header row
+    names a CID column and the property columns
+    """
+    with _open_text(source) as f:
+        first = f.readline()
+        delimiter = "\t" if "\t" in first else ","
+        header = next(csv.reader([first], delimiter=delimiter))
+        if "CID" not in header:
+            raise ValueError(f"{source} has no CID column")
+        cid_column = header.index("CID")
+        columns = [name for i, name in enumerate(header) if i != cid_column]
+        order = [cid_column] + [i for i in range(len(header)) if i != cid_column]
+
+        def rows() -> Iterable[List[str]]:
+            for row in csv.reader(f, delimiter=delimiter):
+                if len(row) <= cid_column or not row[cid_column].strip().isdigit():
+                    continue
+                yield [row[i] if i < len(row) else "" for i in order]
+
+        return build_compound_table(path, columns, rows(), text_columns)
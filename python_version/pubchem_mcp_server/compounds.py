@@ -0,0 +1,109 @@
+"""
+Compound Store Module
+
+Local store of the SMILES of every compound the server has seen or imported, used by the
+search tools to check candidate structures without asking PubChem. Persisted as an
+append-only "CID<tab>SMILES" file, the same format as PubChem's CID-SMILES dump.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .append_file import complete_lines, locked_append, open_append
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Store file location
+DEFAULT_STORE_PATH = os.environ.get(
+    "PUBCHEM_MCP_COMPOUND_STORE",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "compounds.smi")
+)
+
+
+def read_smiles_file(path: str, batch_size: int = 10000,
+                     skip_partial: bool = False) -> Iterator[List[Tuple[int, str]]]:
+    """
+    Read "CID<tab>SMILES" lines in batches of (cid, smiles), skipping malformed lines, and
+    a last line without its newline if skip_partial is set (a file other processes append to)
+    """
+    batch: List[Tuple[int, str]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in complete_lines(f) if skip_partial else f:
+            parts = line.split()
+            if len(parts) < 2 or not parts[0].isdigit():
+                continue
+            batch.append((int(parts[0]), parts[1]))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class CompoundStore:
+    """CID to SMILES map backed by an append-only file"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_STORE_PATH):
+        self.path = path
+        self._smiles: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._file = None
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._smiles)
+
+    def __contains__(self, cid: int) -> bool:
+        self._ensure_loaded()
+        return int(cid) in self._smiles
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                try:
+                    # Later lines win, so updated compounds replace their earlier SMILES
+                    for batch in read_smiles_file(self.path, skip_partial=True):
+                        self._smiles.update(batch)
+                    logger.info(f"Loaded {len(self._smiles)} compounds from {self.path}")
+                except Exception as e:
+                    logger.error(f"Unable to load compound store {self.path}: {e}")
+            self._loaded = True
+
+    def get(self, cid: int) -> Optional[str]:
+        self._ensure_loaded()
+        return self._smiles.get(int(cid))
+
+    def add_many(self, compounds: List[Tuple[int, str]]) -> int:
+        """Store several compounds, returns the number that were new or changed"""
+        self._ensure_loaded()
+        with self._lock:
+            changed = [(int(cid), smiles) for cid, smiles in compounds
+                       if smiles and self._smiles.get(int(cid)) != smiles]
+            if not changed:
+                return 0
+            self._smiles.update(changed)
+            self._append_to_file(changed)
+        return len(changed)
+
+    def _append_to_file(self, compounds: List[Tuple[int, str]]) -> None:
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                self._file = open_append(self.path)
+            locked_append(self._file, "".join(f"{cid}\t{smiles}\n" for cid, smiles in compounds).encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Unable to write compound store {self.path}: {e}")
@@ -0,0 +1,230 @@
+"""
+Conformer Ensemble Module
+
+Generates conformer ensembles (e.g. for docking preparation) with RDKit: multithreaded
+ETKDG embedding, multithreaded MMFF optimization (UFF when MMFF lacks parameters), pruning
+of conformers that converge to the same geometry, and ranking by energy. Ensembles are
+cached as compressed SDF records keyed by InChIKey and generation parameters.
+"""
+
+import io
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .context import RequestCancelled, check_cancelled, current_context
+from .packed_xyz import mol_to_packed
+from .xyz_utils import RDKIT_AVAILABLE, structure_cache
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Ensemble cache subdirectory of the structure cache
+CONFORMER_CACHE_PREFIX = 'conformers'
+
+# Default generation parameters
+DEFAULT_NUM_CONFORMERS = 10
+DEFAULT_RMS_THRESHOLD = 0.5
+DEFAULT_MAX_ITERATIONS = 200
+DEFAULT_RANDOM_SEED = 42
+
+# Threads for embedding and optimization, 0 uses every core
+DEFAULT_NUM_THREADS = int(os.environ.get("PUBCHEM_MCP_CONFORMER_THREADS", "0"))
+
+# Conformers embedded per requested conformer when pruning, since it removes near-duplicates
+OVERSAMPLING = 2
+
+
+def _cache_name(inchikey: str, num_conformers: int, rms_threshold: float,
+                max_iterations: int, random_seed: int) -> str:
+    # Thread count does not change the result, so it is not part of the key
+    return f"{CONFORMER_CACHE_PREFIX}/{inchikey}_n{num_conformers}_rms{rms_threshold:g}_it{max_iterations}_s{random_seed}.sdf"
+
+
+def _prune_by_rms(mol: Any, ranked: List[Tuple[int, float]], rms_threshold: float,
+                  limit: int) -> List[Tuple[int, float]]:
+    """Keep the lowest-energy conformers that differ from every kept one by more than rms_threshold"""
+    heavy = Chem.RemoveHs(mol)
+    kept: List[Tuple[int, float]] = []
+    for conf_id, energy in ranked:
+        if all(AllChem.GetConformerRMS(heavy, kept_id, conf_id) > rms_threshold for kept_id, _ in kept):
+            kept.append((conf_id, energy))
+            if len(kept) >= limit:
+                break
+    return kept
+
+
+def generate_conformers(smiles: str, num_conformers: int = DEFAULT_NUM_CONFORMERS,
+                        rms_threshold: float = DEFAULT_RMS_THRESHOLD,
+                        max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                        random_seed: int = DEFAULT_RANDOM_SEED,
+                        num_threads: int = DEFAULT_NUM_THREADS) -> Optional[Any]:
+    """
+    Generate an energy-ranked conformer ensemble from SMILES. Returns a molecule with
+    hydrogens whose conformers are ordered by increasing energy (see ensemble_energies),
+    or None on failure.
+    """
+    if not RDKIT_AVAILABLE:
+        logger.error("RDKit not installed, cannot generate conformers")
+        return None
+    check_cancelled()
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            logger.warning(f"Unable to parse SMILES for conformer generation: {smiles}")
+            return None
+        mol = Chem.AddHs(mol)
+
+        params = AllChem.ETKDGv3()
+        params.randomSeed = random_seed
+        params.pruneRmsThresh = rms_threshold
+        params.numThreads = num_threads
+        context = current_context()
+        remaining = context.remaining() if context else None
+        if remaining is not None and hasattr(params, 'timeout'):
+            # Bound embedding time by the request's remaining budget
+            params.timeout = max(1, int(remaining))
+        embed_count = num_conformers * OVERSAMPLING if rms_threshold > 0 else num_conformers
+        conf_ids = list(AllChem.EmbedMultipleConfs(mol, embed_count, params))
+        if not conf_ids:
+            logger.warning("RDKit EmbedMultipleConfs produced no conformers.")
+            return None
+        check_cancelled()
+
+        if AllChem.MMFFHasAllMoleculeParams(mol):
+            results = AllChem.MMFFOptimizeMoleculeConfs(mol, numThreads=num_threads, maxIters=max_iterations)
+            force_field = "MMFF94"
+        else:
+            results = AllChem.UFFOptimizeMoleculeConfs(mol, numThreads=num_threads, maxIters=max_iterations)
+            force_field = "UFF"
+        check_cancelled()
+
+        # Optimization can bring distinct starting points to the same minimum, so prune again
+        ranked = sorted(((conf_id, energy) for conf_id, (_, energy) in zip(conf_ids, results)),
+                        key=lambda item: item[1])
+        kept = _prune_by_rms(mol, ranked, rms_threshold, num_conformers)
+
+        ensemble = Chem.Mol(mol)
+        ensemble.RemoveAllConformers()
+        lowest = kept[0][1]
+        for rank, (conf_id, energy) in enumerate(kept):
+            conformer = Chem.Conformer(mol.GetConformer(conf_id))
+            conformer.SetId(rank)
+            ensemble.AddConformer(conformer, assignId=False)
+        ensemble.SetProp("ForceField", force_field)
+        ensemble.SetProp("_Energies", ",".join(f"{energy - lowest:.4f}" for _, energy in kept))
+        logger.info(f"Generated {len(kept)} conformers ({len(conf_ids)} embedded, {force_field})")
+        return ensemble
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating conformers: {e}", exc_info=True)
+        return None
+
+
+def ensemble_energies(ensemble: Any) -> List[float]:
+    """Relative energies (kcal/mol) of an ensemble's conformers, in conformer order"""
+    return [float(e) for e in ensemble.GetProp("_Energies").split(",")]
+
+
+def ensemble_to_sdf(ensemble: Any, title: str = "") -> str:
+    """Multi-record SDF with one record per conformer"""
+    buffer = io.StringIO()
+    writer = Chem.SDWriter(buffer)
+    record = Chem.Mol(ensemble)
+    record.SetProp("_Name", title)
+    for conformer, energy in zip(ensemble.GetConformers(), ensemble_energies(ensemble)):
+        record.SetProp("ConformerRank", str(conformer.GetId()))
+        record.SetProp("RelativeEnergy", f"{energy:.4f}")
+        writer.write(record, confId=conformer.GetId())
+    writer.close()
+    return buffer.getvalue()
+
+
+def _frame_comments(ensemble: Any, compound_info: Dict[str, str]) -> List[str]:
+    info = " ".join(f"{key}={value}" for key, value in compound_info.items() if value)
+    return [f"{info} conformer={conformer.GetId()} energy={energy:.4f}".strip()
+            for conformer, energy in zip(ensemble.GetConformers(), ensemble_energies(ensemble))]
+
+
+def ensemble_to_xyz(ensemble: Any, compound_info: Dict[str, str]) -> str:
+    """Multi-frame XYZ with one frame per conformer"""
+    frames = []
+    for conformer, comment in zip(ensemble.GetConformers(), _frame_comments(ensemble, compound_info)):
+        lines = [str(ensemble.GetNumAtoms()), comment]
+        for i, atom in enumerate(ensemble.GetAtoms()):
+            pos = conformer.GetAtomPosition(i)
+            lines.append(f"{atom.GetSymbol()} {pos.x:.6f} {pos.y:.6f} {pos.z:.6f}")
+        frames.append("\n".join(lines) + "\n")
+    return "".join(frames)
+
+
+def ensemble_to_packed(ensemble: Any, compound_info: Dict[str, str]) -> str:
+    """Packed XYZ (see packed_xyz) with one frame per conformer"""
+    return mol_to_packed(ensemble, _frame_comments(ensemble, compound_info))
+
+
+def _load_cached(sdf: str) -> Optional[Any]:
+    supplier = Chem.SDMolSupplier()
+    supplier.SetData(sdf, removeHs=False)
+    ensemble = None
+    energies = []
+    for record in supplier:
+        if record is None:
+            return None
+        if ensemble is None:
+            ensemble = Chem.Mol(record)
+            ensemble.RemoveAllConformers()
+            for prop in ("ConformerRank", "RelativeEnergy"):
+                ensemble.ClearProp(prop)
+        conformer = Chem.Conformer(record.GetConformer())
+        conformer.SetId(len(energies))
+        ensemble.AddConformer(conformer, assignId=False)
+        energies.append(record.GetProp("RelativeEnergy"))
+    if ensemble is None:
+        return None
+    ensemble.SetProp("_Energies", ",".join(energies))
+    return ensemble
+
+
+def get_conformer_ensemble(smiles: str, inchikey: Optional[str] = None,
+                           num_conformers: int = DEFAULT_NUM_CONFORMERS,
+                           rms_threshold: float = DEFAULT_RMS_THRESHOLD,
+                           max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                           random_seed: int = DEFAULT_RANDOM_SEED,
+                           num_threads: int = DEFAULT_NUM_THREADS) -> Optional[Any]:
+    """Conformer ensemble from the cache, generating and caching it if needed"""
+    if not RDKIT_AVAILABLE:
+        logger.error("RDKit not installed, cannot generate conformers")
+        return None
+    if not inchikey:
+        mol = Chem.MolFromSmiles(smiles)
+        inchikey = Chem.MolToInchiKey(mol) if mol is not None else None
+
+    name = _cache_name(inchikey, num_conformers, rms_threshold, max_iterations, random_seed) if inchikey else None
+    if name is not None and structure_cache.exists(name):
+        try:
+            ensemble = _load_cached(structure_cache.read(name))
+            if ensemble is not None:
+                logger.info(f"Loaded conformer ensemble from cache: {name}")
+                return ensemble
+        except Exception as e:
+            logger.warning(f"Unable to read cached conformer ensemble {name}: {e}")
+
+    ensemble = generate_conformers(smiles, num_conformers, rms_threshold, max_iterations,
+                                   random_seed, num_threads)
+    if ensemble is not None and name is not None:
+        try:
+            structure_cache.write(name, ensemble_to_sdf(ensemble, inchikey))
+        except Exception as e:
+            logger.warning(f"Unable to cache conformer ensemble: {e}")
+    return ensemble
@@ -0,0 +1,183 @@
+"""
+Request Context Module
+
+Carries the cancellation state and deadline of the request being processed, so that
+HTTP calls, retries and 3D structure generation can give up as soon as the client
+cancels or the request's time budget runs out.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Default time budget for one request (seconds), 0 disables the deadline
+DEFAULT_REQUEST_BUDGET = float(os.environ.get("PUBCHEM_MCP_REQUEST_BUDGET", "300"))
+
+
+class RequestCancelled(Exception):
+    """Raised when the client cancelled the request being processed"""
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Raised when the request being processed ran out of time"""
+
+
+class RequestContext:
+    """Cancellation flag and deadline of one request"""
+
+    def __init__(self, request_id: Any = None, budget: Optional[float] = DEFAULT_REQUEST_BUDGET):
+        self.request_id = request_id
+        self.deadline = time.monotonic() + budget if budget else None
+        self.cancel_reason: Optional[str] = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the client cancelled this request"""
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: Optional[str] = None) -> None:
+        self.cancel_reason = reason or "Request cancelled"
+        self._cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """Raise if the request was cancelled or its deadline has passed"""
+        if self._cancelled.is_set():
+            raise RequestCancelled(self.cancel_reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded("Request deadline exceeded")
+
+    def timeout(self, default: Optional[float]) -> Optional[float]:
+        """The smaller of a default timeout and the time left before the deadline"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(default, remaining)
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep, waking up early (and raising) on cancellation or deadline"""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._cancelled.wait(seconds)
+        self.check()
+
+    def wait(self, event: threading.Event, poll: float = 0.1) -> None:
+        """Wait for an event, raising on cancellation or deadline"""
+        while not event.wait(poll):
+            self.check()
+
+
+_current_context: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar(
+    "pubchem_mcp_request_context", default=None
+)
+
+
+def current_context() -> Optional[RequestContext]:
+    """The context of the request being processed, if any"""
+    return _current_context.get()
+
+
+@contextmanager
+def request_scope(context: RequestContext) -> Iterator[RequestContext]:
+    """Make context the current request context for the enclosed code"""
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+def check_cancelled() -> None:
+    """Raise if the current request was cancelled or ran out of time"""
+    context = _current_context.get()
+    if context is not None:
+        context.check()
+
+
+def request_timeout(default: Optional[float]) -> Optional[float]:
+    """A default timeout, shortened to fit the current request's deadline"""
+    context = _current_context.get()
+    if context is None:
+        return default
+    return context.timeout(default)
+
+
+def request_sleep(seconds: float) -> None:
+    """Sleep, waking up early on cancellation of the current request"""
+    context = _current_context.get()
+    if context is None:
+        time.sleep(seconds)
+    else:
+        context.sleep(seconds)
+
+
+class InflightRequests:
+    """Tracks the running requests of one client connection so they can be cancelled"""
+
+    def __init__(self):
+        self._contexts: Dict[Any, RequestContext] = {}
+        self._lock = threading.Lock()
+        # Notified whenever a request or dispatched message completes
+        self._done = threading.Condition(self._lock)
+        # Messages handed to a worker whose response has not been sent yet
+        self._pending = 0
+
+    def start(self, request_id: Any, budget: Optional[float] = DEFAULT_REQUEST_BUDGET) -> RequestContext:
+        context = RequestContext(request_id, budget)
+        if request_id is not None:
+            with self._lock:
+                self._contexts[request_id] = context
+        return context
+
+    def finish(self, request_id: Any) -> None:
+        with self._lock:
+            self._contexts.pop(request_id, None)
+            self._done.notify_all()
+
+    def dispatched(self) -> None:
+        """Count a message handed to a worker until done() is called after its response is sent"""
+        with self._lock:
+            self._pending += 1
+
+    def done(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._done.notify_all()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no request is running or pending, returns False on timeout"""
+        with self._lock:
+            return self._done.wait_for(lambda: not self._contexts and not self._pending, timeout)
+
+    def __len__(self) -> int:
+        """Number of running requests"""
+        with self._lock:
+            return len(self._contexts)
+
+    def cancel(self, request_id: Any, reason: Optional[str] = None) -> bool:
+        """Cancel a running request, returns False if it is not running"""
+        with self._lock:
+            context = self._contexts.get(request_id)
+        if context is None:
+            return False
+        context.cancel(reason)
+        return True
+
+    def cancel_all(self, reason: Optional[str] = None) -> None:
+        with self._lock:
+            contexts = list(self._contexts.values())
+        for context in contexts:
+            context.cancel(reason)
@@ -0,0 +1,190 @@
+"""
+Daemon Module
+
+Lets many MCP clients share one long-running backend process. The daemon listens on a
+local Unix socket and owns the caches, HTTP connection pool and rate limiter; each
+client launches a thin stdio shim that forwards newline-delimited JSON-RPC to it.
+"""
+
+import fcntl
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+from .context import InflightRequests
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Default socket location, next to the log files
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser("~/.pubchem-mcp"), "daemon.sock")
+
+# How long a shim waits for an auto-started daemon to accept connections
+START_TIMEOUT = 15.0
+
+# handle_line(line, send, inflight): processes one message, sending responses and
+# notifications with send (possibly later, from another thread)
+LineHandler = Callable[[str, Callable[[str], None], InflightRequests], None]
+
+
+class _ConnectionHandler(socketserver.StreamRequestHandler):
+    """Serves one shim connection: one JSON-RPC message per line in each direction"""
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.inflight = InflightRequests()
+
+    def send(self, message_json: str):
+        # Responses and notifications are written from worker threads
+        try:
+            with self.write_lock:
+                self.wfile.write((message_json + "\n").encode('utf-8'))
+                self.wfile.flush()
+        except (OSError, ValueError) as e:
+            # ValueError: the connection was already closed. Nobody can receive the results
+            logger.warning(f"Shim disconnected while sending: {e}")
+            self.inflight.cancel_all("Client disconnected")
+
+    def handle(self):
+        handle_line = self.server.handle_line
+        logger.info("Shim connected")
+        try:
+            for raw_line in self.rfile:
+                line = raw_line.decode('utf-8')
+                if not line.strip():
+                    continue
+                handle_line(line, self.send, self.inflight)
+        except OSError as e:
+            # Nobody is waiting for the results any more
+            logger.warning(f"Lost connection to shim: {e}")
+            self.inflight.cancel_all("Client disconnected")
+        else:
+            # The shim's input ended: it keeps reading until the responses still in flight are sent
+            self.inflight.wait_idle()
+        logger.info("Shim disconnected")
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, handle_line: LineHandler):
+        self.handle_line = handle_line
+        super().__init__(socket_path, _ConnectionHandler)
+
+
+def serve(socket_path: str, handle_line: LineHandler) -> bool:
+    """
+    Run the daemon until interrupted.
+    Returns False without serving if another daemon already owns the socket.
+    """
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    # Only one daemon per socket; the lock is released automatically when we exit
+    lock_file = open(socket_path + ".lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        logger.info(f"Another daemon is already serving {socket_path}")
+        lock_file.close()
+        return False
+
+    # Holding the lock means any existing socket file is left over from a dead daemon
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    server = _DaemonServer(socket_path, handle_line)
+    os.chmod(socket_path, 0o600)
+    logger.info(f"Daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+        lock_file.close()
+    return True
+
+
+def _try_connect(socket_path: str) -> Optional[socket.socket]:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def connect(socket_path: str, start_command: Optional[List[str]] = None) -> socket.socket:
+    """Connect to the daemon, starting it with start_command if nothing is listening"""
+    sock = _try_connect(socket_path)
+    if sock is not None:
+        return sock
+
+    if not start_command:
+        raise ConnectionError(f"No daemon listening on {socket_path}")
+
+    logger.info(f"Starting daemon: {' '.join(start_command)}")
+    subprocess.Popen(
+        start_command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    delay = 0.05
+    while time.monotonic() < deadline:
+        sock = _try_connect(socket_path)
+        if sock is not None:
+            return sock
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    raise ConnectionError(f"Daemon did not start listening on {socket_path} within {START_TIMEOUT}s")
+
+
+def run_shim(socket_path: str, start_command: Optional[List[str]] = None) -> None:
+    """Forward JSON-RPC between this process's stdio and the daemon"""
+    sock = connect(socket_path, start_command)
+    logger.info(f"Shim connected to daemon at {socket_path}")
+    sock_in = sock.makefile('rb')
+
+    def pump_responses():
+        for raw_line in sock_in:
+            sys.stdout.write(raw_line.decode('utf-8'))
+            sys.stdout.flush()
+
+    reader = threading.Thread(target=pump_responses, daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                break
+            sock.sendall(line.encode('utf-8'))
+    except OSError as e:
+        logger.error(f"Lost connection to daemon: {e}")
+    finally:
+        # Let in-flight responses drain before exiting
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        reader.join()
+        sock.close()
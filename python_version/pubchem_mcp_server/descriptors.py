@@ -0,0 +1,272 @@
+"""
+Descriptors Module
+
+Computes RDKit molecular descriptors (logP, TPSA, rotatable bonds, ring counts, Lipinski
+flags, ...) locally from SMILES, instead of asking PubChem for more properties.
+
+Values are cached per compound (by InChIKey) and descriptor, so compounds are only computed
+again when a request asks for a descriptor not computed before. The cache is persisted as an
+append-only JSON lines file, one line per computation, tagged with the RDKit version so
+values from another version are recomputed. Large batches are computed on a process pool
+and returned as a (compounds, descriptors) NumPy matrix.
+"""
+
+import base64
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .append_file import locked_append, open_append
+from .context import check_cancelled
+from .workers import DERIVED_DESCRIPTORS, RDKIT_DESCRIPTORS, compute_chunk
+from .xyz_utils import RDKIT_AVAILABLE
+
+# Try to import NumPy, descriptor matrices are unavailable without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem, RDLogger, rdBase
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Cache file location
+DEFAULT_CACHE_PATH = os.environ.get(
+    "PUBCHEM_MCP_DESCRIPTOR_CACHE",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "descriptors.jsonl")
+)
+
+# Processes for large batches, 0 uses every core
+DEFAULT_WORKERS = int(os.environ.get("PUBCHEM_MCP_DESCRIPTOR_WORKERS", "0"))
+
+# Batches with fewer uncached molecules are computed in-process; shipping them to workers costs more
+PROCESS_POOL_MIN_MOLECULES = 500
+
+# Molecules per worker task
+CHUNK_SIZE = 100
+
+# Named descriptor sets
+DESCRIPTOR_SETS = {
+    "lipinski": ["MolWt", "MolLogP", "NumHDonors", "NumHAcceptors", "LipinskiViolations", "Lipinski"],
+    "druglike": ["MolWt", "ExactMolWt", "MolLogP", "MolMR", "TPSA", "NumHDonors", "NumHAcceptors",
+                 "NumRotatableBonds", "RingCount", "NumAromaticRings", "NumAliphaticRings",
+                 "HeavyAtomCount", "NumHeteroatoms", "FractionCSP3", "qed", "LipinskiViolations", "Lipinski"],
+}
+DEFAULT_DESCRIPTOR_SET = "druglike"
+
+if RDKIT_AVAILABLE:
+    DESCRIPTOR_SETS["all"] = list(RDKIT_DESCRIPTORS) + list(DERIVED_DESCRIPTORS)
+
+
+def descriptors_available() -> bool:
+    """Whether descriptors can be computed (requires RDKit)"""
+    return RDKIT_AVAILABLE
+
+
+def resolve_descriptor_names(spec: Union[None, str, Sequence[str]]) -> List[str]:
+    """
+    Descriptor names of a set name or a list of names (default: the druglike set).
+    Raises ValueError for unknown names.
+    """
+    if spec is None:
+        spec = DEFAULT_DESCRIPTOR_SET
+    if isinstance(spec, str):
+        if spec.lower() not in DESCRIPTOR_SETS:
+            raise ValueError(f"Unknown descriptor set '{spec}', options: {', '.join(DESCRIPTOR_SETS)}")
+        return list(DESCRIPTOR_SETS[spec.lower()])
+    unknown = [name for name in spec if name not in RDKIT_DESCRIPTORS and name not in DERIVED_DESCRIPTORS]
+    if unknown:
+        raise ValueError(f"Unknown descriptors: {', '.join(unknown)}")
+    return list(dict.fromkeys(spec))
+
+
+def molecule_key(smiles: str) -> Optional[str]:
+    """InChIKey of a SMILES string, or None if it cannot be parsed"""
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            return None
+        return Chem.MolToInchiKey(mol) or None
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+
+
+class DescriptorCache:
+    """Descriptor values per InChIKey, persisted as append-only JSON lines"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._file = None
+        self._values: Dict[str, Dict[str, float]] = {}
+        self._version = rdBase.rdkitVersion if RDKIT_AVAILABLE else ""
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._values)
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                try:
+                    self._load()
+                except Exception as e:
+                    logger.error(f"Unable to load descriptor cache {self.path}: {e}")
+            self._loaded = True
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash
+                    continue
+                if entry.get("rdkit") == self._version:
+                    self._values.setdefault(entry["key"], {}).update(entry["values"])
+        logger.info(f"Loaded descriptors of {len(self._values)} compounds from {self.path}")
+
+    def get(self, key: str, names: Sequence[str]) -> Optional[Dict[str, float]]:
+        """Cached values of names for a compound, or None unless all of them are cached"""
+        self._ensure_loaded()
+        known = self._values.get(key)
+        if known is None or any(name not in known for name in names):
+            return None
+        return {name: known[name] for name in names}
+
+    def put(self, entries: Dict[str, Dict[str, float]]) -> None:
+        """Store computed values (compound key -> {descriptor: value})"""
+        if not entries:
+            return
+        self._ensure_loaded()
+        with self._lock:
+            for key, values in entries.items():
+                self._values.setdefault(key, {}).update(values)
+            if not self.path:
+                return
+            lines = "".join(json.dumps({"key": key, "rdkit": self._version, "values": values}) + "\n"
+                            for key, values in entries.items())
+            try:
+                if self._file is None:
+                    self._file = open_append(self.path)
+                locked_append(self._file, lines.encode("utf-8"))
+            except OSError as e:
+                logger.error(f"Unable to write descriptor cache {self.path}: {e}")
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """The shared descriptor pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs HTTP and worker threads is unsafe. Tasks
+            # run compute_chunk from the side-effect-free workers module.
+            _pool = ProcessPoolExecutor(max_workers=DEFAULT_WORKERS or os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def compute_batch(molecules: Sequence[Tuple[Optional[str], str]], names: Sequence[str],
+                  cache: Optional[DescriptorCache] = None,
+                  workers: int = DEFAULT_WORKERS) -> List[Optional[Dict[str, float]]]:
+    """
+    Descriptor values of (InChIKey or None, SMILES) pairs, in order; None for SMILES that
+    cannot be parsed. Cached values are reused; the rest are computed, on the shared process pool
+    for large batches, and cached.
+    """
+    names = list(names)
+    results: List[Optional[Dict[str, float]]] = [None] * len(molecules)
+    pending: Dict[str, List[int]] = {}
+    for index, (key, smiles) in enumerate(molecules):
+        key = key or f"smiles:{smiles}"
+        cached = cache.get(key, names) if cache is not None else None
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.setdefault(key, []).append(index)
+    if not pending:
+        return results
+
+    keys = list(pending)
+    smiles = [molecules[pending[key][0]][1] for key in keys]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(smiles) >= PROCESS_POOL_MIN_MOLECULES:
+        computed = _compute_on_pool(smiles, names)
+    else:
+        computed = compute_chunk(smiles, names)
+
+    new_entries = {}
+    for key, values in zip(keys, computed):
+        for index in pending[key]:
+            results[index] = {name: values[name] for name in names} if values is not None else None
+        if values is not None:
+            new_entries[key] = values
+    if cache is not None:
+        cache.put(new_entries)
+    return results
+
+
+def _compute_on_pool(smiles: List[str], names: List[str]) -> List[Optional[Dict[str, float]]]:
+    """compute_chunk over the shared pool, stopping when the current request is cancelled"""
+    chunks = [smiles[i:i + CHUNK_SIZE] for i in range(0, len(smiles), CHUNK_SIZE)]
+    pool = get_process_pool()
+    pending = {pool.submit(compute_chunk, chunk, names): index for index, chunk in enumerate(chunks)}
+    results: List[List[Optional[Dict[str, float]]]] = [[] for _ in chunks]
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            check_cancelled()
+            for future in done:
+                results[pending.pop(future)] = future.result()
+    finally:
+        # Chunks not started yet are dropped when the request is cancelled
+        for future in pending:
+            future.cancel()
+    return [values for chunk in results for values in chunk]
+
+
+def to_matrix(results: Sequence[Optional[Dict[str, float]]], names: Sequence[str]) -> "np.ndarray":
+    """(compounds, descriptors) float64 matrix of compute_batch results, NaN where unavailable"""
+    matrix = np.full((len(results), len(names)), np.nan)
+    for row, values in enumerate(results):
+        if values is not None:
+            matrix[row] = [values[name] for name in names]
+    return matrix
+
+
+def matrix_payload(matrix: "np.ndarray", names: Sequence[str], rows: Sequence[str]) -> str:
+    """
+    JSON of a descriptor matrix: column and row labels, and the values as base64 of
+    little-endian float64 in row-major order (np.frombuffer(..., "<f8").reshape(shape))
+    """
+    return json.dumps({
+        "format": "descriptor-matrix",
+        "columns": list(names),
+        "rows": list(rows),
+        "shape": list(matrix.shape),
+        "dtype": "<f8",
+        "values": base64.b64encode(np.ascontiguousarray(matrix, dtype="<f8").tobytes()).decode("ascii"),
+    })
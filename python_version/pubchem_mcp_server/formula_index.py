@@ -0,0 +1,294 @@
+"""
+Formula Index Module
+
+Local index of the molecular formula and weight of every compound the server has seen or
+imported, for formula and mass searches without PubChem's asynchronous formula search.
+
+- Exact formulas are looked up in a hash map keyed by the Hill-normalized formula.
+- Element constraints (e.g. 6-8 carbons, at least one nitrogen) are vectorized masks over a
+  compounds x elements count matrix.
+- Mass windows are binary searches over the weights in sorted order.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .append_file import complete_lines, locked_append, open_append
+from .xyz_utils import RDKIT_AVAILABLE
+
+# Try to import NumPy, formula search is disabled if not available
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem, RDLogger
+    from rdkit.Chem import Descriptors, rdMolDescriptors
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Index file location
+DEFAULT_FORMULA_INDEX_PATH = os.environ.get(
+    "PUBCHEM_MCP_FORMULA_INDEX",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "formulas.tsv")
+)
+
+# Initial capacity of the in-memory arrays; they double when full
+INITIAL_CAPACITY = 1024
+
+_ELEMENT_PATTERN = re.compile(r"([A-Z][a-z]?)(\d*)")
+_PART_PATTERN = re.compile(r"^(\d*)(.*)$")
+_CONSTRAINT_PATTERN = re.compile(r"^\s*(?:(\d+)\s*-\s*(\d+)|(>=|<=|>|<|=)?\s*(\d+))\s*$")
+
+
+def parse_formula(formula: str) -> Optional[Dict[str, int]]:
+    """
+    Element counts of a molecular formula such as "C9H8O4" or "2C2H3O2.Ca". Charges are
+    ignored. Returns None if the formula cannot be parsed.
+    """
+    counts: Dict[str, int] = {}
+    for part in formula.strip().split("."):
+        multiplier, body = _PART_PATTERN.match(part.strip()).groups()
+        body = re.sub(r"[+-]\d*$", "", body)
+        if not body or _ELEMENT_PATTERN.sub("", body):
+            return None
+        for element, count in _ELEMENT_PATTERN.findall(body):
+            counts[element] = counts.get(element, 0) + int(count or 1) * int(multiplier or 1)
+    return counts or None
+
+
+def hill_formula(counts: Dict[str, int]) -> str:
+    """Hill-order formula string: C, H, then the other elements alphabetically"""
+    if "C" in counts:
+        order = ["C"] + (["H"] if "H" in counts else []) + sorted(e for e in counts if e not in ("C", "H"))
+    else:
+        order = sorted(counts)
+    return "".join(f"{e}{counts[e] if counts[e] != 1 else ''}" for e in order if counts[e])
+
+
+def parse_constraint(constraint) -> Tuple[int, int]:
+    """
+    (minimum, maximum) count from a constraint: an integer, "6-8", ">=1", "<=2", ">0" or "<3".
+    Raises ValueError for anything else.
+    """
+    if isinstance(constraint, bool):
+        raise ValueError(f"Invalid element constraint: {constraint}")
+    if isinstance(constraint, int):
+        return constraint, constraint
+    match = _CONSTRAINT_PATTERN.match(str(constraint))
+    if not match:
+        raise ValueError(f"Invalid element constraint: {constraint}")
+    low, high, op, value = match.groups()
+    if low is not None:
+        return int(low), int(high)
+    value = int(value)
+    return {
+        ">=": (value, 1 << 30), ">": (value + 1, 1 << 30),
+        "<=": (0, value), "<": (0, value - 1),
+    }.get(op, (value, value))
+
+
+def formula_from_smiles(smiles: str) -> Optional[Tuple[str, float]]:
+    """(formula, average molecular weight) computed with RDKit, or None"""
+    if not RDKIT_AVAILABLE:
+        return None
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+    if mol is None:
+        return None
+    return rdMolDescriptors.CalcMolFormula(mol), round(Descriptors.MolWt(mol), 2)
+
+
+class FormulaIndex:
+    """Formula and molecular weight of each compound, backed by an append-only file"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_FORMULA_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._file = None
+        self._size = 0
+        self._positions: Dict[int, int] = {}
+        self._columns: Dict[str, int] = {}
+        self._formulas: List[str] = []
+        self._by_formula: Dict[str, set] = {}
+        self._sorted_rows: Optional["np.ndarray"] = None
+        self._sorted_weights: Optional["np.ndarray"] = None
+        if NUMPY_AVAILABLE:
+            self._counts = np.zeros((INITIAL_CAPACITY, 0), dtype=np.uint16)
+            self._weights = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+            self._cids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return self._size
+
+    def __contains__(self, cid: int) -> bool:
+        self._ensure_loaded()
+        return int(cid) in self._positions
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and NUMPY_AVAILABLE and os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        for line in complete_lines(f):
+                            parts = line.split("\t")
+                            if len(parts) == 3 and parts[0].isdigit():
+                                self._store(int(parts[0]), parts[1], float(parts[2]))
+                    logger.info(f"Loaded {self._size} formulas from {self.path}")
+                except Exception as e:
+                    logger.error(f"Unable to load formula index {self.path}: {e}")
+            self._loaded = True
+
+    def _column(self, element: str) -> int:
+        column = self._columns.get(element)
+        if column is None:
+            column = self._columns[element] = len(self._columns)
+            self._counts = np.hstack([self._counts, np.zeros((len(self._counts), 1), dtype=np.uint16)])
+        return column
+
+    def _store(self, cid: int, formula: str, weight: float) -> bool:
+        counts = parse_formula(formula)
+        if counts is None:
+            return False
+        formula = hill_formula(counts)
+        row = self._positions.get(cid)
+        if row is None:
+            if self._size == len(self._cids):
+                capacity = len(self._cids) * 2
+                # Searches keep a reference to the old arrays, so grow into new ones
+                self._counts = np.vstack([self._counts, np.zeros_like(self._counts)])
+                self._weights = np.resize(self._weights, capacity)
+                self._cids = np.resize(self._cids, capacity)
+            row = self._size
+            self._size += 1
+            self._positions[cid] = row
+            self._cids[row] = cid
+            self._formulas.append(formula)
+        else:
+            self._by_formula.get(self._formulas[row], set()).discard(row)
+            self._formulas[row] = formula
+            self._counts[row] = 0
+        columns = [self._column(element) for element in counts]
+        self._counts[row, columns] = list(counts.values())
+        self._weights[row] = weight
+        self._by_formula.setdefault(formula, set()).add(row)
+        self._sorted_rows = None
+        return True
+
+    def add_many(self, compounds: List[Tuple[int, str, float]]) -> int:
+        """Index (cid, formula, weight) entries, returns the number new or changed"""
+        if not NUMPY_AVAILABLE:
+            return 0
+        self._ensure_loaded()
+        with self._lock:
+            changed = []
+            for cid, formula, weight in compounds:
+                cid = int(cid)
+                row = self._positions.get(cid)
+                if row is not None and self._formulas[row] == formula and self._weights[row] == weight:
+                    continue
+                if self._store(cid, formula, float(weight)):
+                    changed.append((cid, formula, float(weight)))
+            if changed:
+                self._append_to_file(changed)
+        return len(changed)
+
+    def add_smiles_many(self, compounds: List[Tuple[int, str]]) -> int:
+        """Index compounds not yet known from their SMILES, computing formula and weight with RDKit"""
+        if not NUMPY_AVAILABLE or not RDKIT_AVAILABLE:
+            return 0
+        self._ensure_loaded()
+        entries = []
+        for cid, smiles in compounds:
+            if int(cid) in self._positions:
+                continue
+            computed = formula_from_smiles(smiles)
+            if computed:
+                entries.append((cid, computed[0], computed[1]))
+        return self.add_many(entries)
+
+    def _append_to_file(self, entries: List[Tuple[int, str, float]]) -> None:
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                self._file = open_append(self.path)
+            locked_append(self._file, "".join(f"{cid}\t{formula}\t{weight}\n" for cid, formula, weight in entries).encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Unable to write formula index {self.path}: {e}")
+
+    def search(self, formula: Optional[str] = None, elements: Optional[Dict[str, object]] = None,
+               min_weight: Optional[float] = None, max_weight: Optional[float] = None,
+               allow_other_elements: bool = True,
+               limit: Optional[int] = None) -> Tuple[int, List[Tuple[int, str, float]]]:
+        """
+        Compounds matching every given criterion: (number of matches, the first limit matches
+        as (cid, formula, weight) sorted by weight).
+        Raises ValueError for an unparseable formula or element constraint.
+        """
+        self._ensure_loaded()
+        constraints = {element: parse_constraint(c) for element, c in (elements or {}).items()}
+
+        with self._lock:
+            size = self._size
+            if self._sorted_rows is None:
+                # Re-sorted on the first search after new compounds were added
+                self._sorted_rows = np.argsort(self._weights[:size], kind="stable")
+                self._sorted_weights = self._weights[self._sorted_rows]
+            sorted_rows, sorted_weights = self._sorted_rows, self._sorted_weights
+            counts, weights, cids = self._counts, self._weights, self._cids
+            columns = dict(self._columns)
+            formulas = self._formulas
+            exact_rows = None
+            if formula is not None:
+                parsed = parse_formula(formula)
+                if parsed is None:
+                    raise ValueError(f"Unable to parse formula: {formula}")
+                exact_rows = sorted(self._by_formula.get(hill_formula(parsed), ()))
+
+        if exact_rows is not None:
+            rows = np.array(exact_rows, dtype=np.int64)
+            rows = rows[np.argsort(weights[rows], kind="stable")]
+        else:
+            # Mass window: binary search over the weights in sorted order
+            start = 0 if min_weight is None else np.searchsorted(sorted_weights, min_weight, side="left")
+            end = size if max_weight is None else np.searchsorted(sorted_weights, max_weight, side="right")
+            rows = sorted_rows[start:end]
+
+        mask = np.ones(len(rows), dtype=bool)
+        if exact_rows is not None:
+            if min_weight is not None:
+                mask &= weights[rows] >= min_weight
+            if max_weight is not None:
+                mask &= weights[rows] <= max_weight
+        for element, (low, high) in constraints.items():
+            column = columns.get(element)
+            values = counts[rows, column] if column is not None else np.zeros(len(rows), dtype=np.uint16)
+            mask &= (values >= low) & (values <= high)
+        if not allow_other_elements:
+            others = [column for element, column in columns.items() if element not in constraints]
+            if others:
+                mask &= ~np.any(counts[np.ix_(rows, others)] > 0, axis=1)
+
+        rows = rows[mask]
+        return len(rows), [(int(cids[row]), formulas[row], float(weights[row])) for row in rows[:limit]]
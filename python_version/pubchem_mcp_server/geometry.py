@@ -0,0 +1,279 @@
+"""
+Geometry Module
+
+Vectorized NumPy analysis of 3D structures: centroid and bounding box, mass-weighted inertia
+tensor with principal moments and radius of gyration, bond perception from covalent radii,
+close non-bonded contacts, and pairwise distance matrices. Clients get compact numeric
+results instead of the full coordinate text.
+
+Bonds and contacts come from a uniform grid neighbor search. Atoms are binned into cells of
+the cutoff size, and only atoms in the same or adjacent cells are compared, so the cost grows
+linearly with the atom count instead of quadratically.
+"""
+
+import base64
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .xyz_utils import ELEMENT_NUMBERS
+
+# Try to import NumPy, geometry analysis is disabled if not available
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Covalent radii (Angstrom, Cordero et al. 2008), for bond perception
+COVALENT_RADII = {
+    'H': 0.31, 'Li': 1.28, 'B': 0.84, 'C': 0.76, 'N': 0.71, 'O': 0.66, 'F': 0.57, 'Na': 1.66,
+    'Mg': 1.41, 'Al': 1.21, 'Si': 1.11, 'P': 1.07, 'S': 1.05, 'Cl': 1.02, 'K': 2.03, 'Ca': 1.76,
+    'Fe': 1.32, 'Co': 1.26, 'Ni': 1.24, 'Cu': 1.32, 'Zn': 1.22, 'Se': 1.20, 'Br': 1.20, 'Pt': 1.36,
+    'I': 1.39,
+}
+DEFAULT_COVALENT_RADIUS = 1.5
+
+# Van der Waals radii (Angstrom, Bondi 1964), for close contacts
+VDW_RADII = {
+    'H': 1.20, 'Li': 1.82, 'B': 1.92, 'C': 1.70, 'N': 1.55, 'O': 1.52, 'F': 1.47, 'Na': 2.27,
+    'Mg': 1.73, 'Al': 1.84, 'Si': 2.10, 'P': 1.80, 'S': 1.80, 'Cl': 1.75, 'K': 2.75, 'Ca': 2.31,
+    'Ni': 1.63, 'Cu': 1.40, 'Zn': 1.39, 'Se': 1.90, 'Br': 1.85, 'Pt': 1.75, 'I': 1.98,
+}
+DEFAULT_VDW_RADIUS = 2.0
+
+# Standard atomic masses (u); other elements are approximated as twice their atomic number
+ATOMIC_MASSES = {
+    'H': 1.008, 'Li': 6.94, 'B': 10.81, 'C': 12.011, 'N': 14.007, 'O': 15.999, 'F': 18.998,
+    'Na': 22.990, 'Mg': 24.305, 'Al': 26.982, 'Si': 28.085, 'P': 30.974, 'S': 32.06, 'Cl': 35.45,
+    'K': 39.098, 'Ca': 40.078, 'Fe': 55.845, 'Co': 58.933, 'Ni': 58.693, 'Cu': 63.546, 'Zn': 65.38,
+    'Se': 78.971, 'Br': 79.904, 'Pt': 195.08, 'I': 126.904,
+}
+
+# Atoms are bonded when closer than the sum of their covalent radii plus this (Angstrom)
+BOND_TOLERANCE = 0.45
+MIN_BOND_LENGTH = 0.4
+
+# Non-bonded atoms closer than this fraction of their van der Waals radii sum are in contact
+CONTACT_SCALE = 0.8
+
+# Closest contacts listed individually
+MAX_CONTACTS_LISTED = 20
+
+# Decimal places of reported values
+PRECISION = 4
+
+# Rows of candidate pairs compared at once when finding the largest distance
+DISTANCE_BLOCK = 256
+
+ANALYSES = ("summary", "inertia", "bonds", "contacts", "distances")
+DEFAULT_ANALYSES = ["summary", "inertia", "bonds"]
+
+if NUMPY_AVAILABLE:
+    # Neighbor cell offsets that, with the atom's own cell, cover each adjacent pair of cells once
+    _HALF_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                              if (dx, dy, dz) > (0, 0, 0)], dtype=np.int64)
+
+
+def geometry_available() -> bool:
+    """Whether geometry analysis is available (requires NumPy)"""
+    return NUMPY_AVAILABLE
+
+
+def parse_xyz(xyz: str) -> Tuple[List[str], "np.ndarray"]:
+    """Element symbols and (atoms, 3) coordinates of the first frame of XYZ text"""
+    lines = xyz.strip().splitlines()
+    atom_count = int(lines[0])
+    symbols = []
+    coordinates = np.empty((atom_count, 3))
+    for i, line in enumerate(lines[2:2 + atom_count]):
+        parts = line.split()
+        symbols.append(parts[0])
+        coordinates[i] = parts[1:4]
+    if len(symbols) != atom_count:
+        raise ValueError(f"Expected {atom_count} atoms, found {len(symbols)}")
+    return symbols, coordinates
+
+
+def _radii(symbols: Sequence[str], table: Dict[str, float], default: float) -> "np.ndarray":
+    return np.array([table.get(s, default) for s in symbols])
+
+
+def _masses(symbols: Sequence[str]) -> "np.ndarray":
+    return np.array([ATOMIC_MASSES.get(s, 2.0 * ELEMENT_NUMBERS.get(s, 6)) for s in symbols])
+
+
+def neighbor_pairs(coordinates: "np.ndarray", cutoff: float) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """(i, j, distance) of every atom pair with i < j closer than cutoff, by grid search"""
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    count = len(coordinates)
+    if count < 2 or cutoff <= 0:
+        return empty
+    # Cells shifted by one so neighbor cells never have negative indices
+    cells = np.floor((coordinates - coordinates.min(axis=0)) / cutoff).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first_parts, second_parts = [], []
+    for offset in np.vstack([np.zeros((1, 3), dtype=np.int64), _HALF_OFFSETS]):
+        neighbor_keys = keys + (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+        starts = np.searchsorted(sorted_keys, neighbor_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbor_keys, side="right") - starts
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        first = np.repeat(np.arange(count), counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        second = order[np.repeat(starts, counts) + within]
+        if not offset.any():
+            # Same cell: each pair appears twice, plus the atom with itself
+            keep = first < second
+            first, second = first[keep], second[keep]
+        first_parts.append(first)
+        second_parts.append(second)
+    if not first_parts:
+        return empty
+    first = np.concatenate(first_parts)
+    second = np.concatenate(second_parts)
+    distances = np.linalg.norm(coordinates[first] - coordinates[second], axis=1)
+    keep = distances < cutoff
+    first, second, distances = first[keep], second[keep], distances[keep]
+    swap = first > second
+    first[swap], second[swap] = second[swap], first[swap].copy()
+    return first, second, distances
+
+
+def perceive_bonds(symbols: Sequence[str], coordinates: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """(i, j, length) of bonds, from covalent radii"""
+    radii = _radii(symbols, COVALENT_RADII, DEFAULT_COVALENT_RADIUS)
+    first, second, distances = neighbor_pairs(coordinates, 2 * radii.max() + BOND_TOLERANCE)
+    keep = (distances <= radii[first] + radii[second] + BOND_TOLERANCE) & (distances >= MIN_BOND_LENGTH)
+    return first[keep], second[keep], distances[keep]
+
+
+def close_contacts(symbols: Sequence[str], coordinates: "np.ndarray", bonds: Tuple["np.ndarray", "np.ndarray", "np.ndarray"],
+                   scale: float = CONTACT_SCALE) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """(i, j, distance) of atoms closer than scale x their vdW radii sum, excluding 1-2 and 1-3 pairs"""
+    radii = _radii(symbols, VDW_RADII, DEFAULT_VDW_RADIUS)
+    first, second, distances = neighbor_pairs(coordinates, 2 * radii.max() * scale)
+    keep = distances < (radii[first] + radii[second]) * scale
+    first, second, distances = first[keep], second[keep], distances[keep]
+    neighbors: Dict[int, set] = {}
+    for i, j in zip(bonds[0].tolist(), bonds[1].tolist()):
+        neighbors.setdefault(i, set()).add(j)
+        neighbors.setdefault(j, set()).add(i)
+    separated = np.array([j not in neighbors.get(i, ()) and not (neighbors.get(i, set()) & neighbors.get(j, set()))
+                          for i, j in zip(first.tolist(), second.tolist())], dtype=bool)
+    if not len(separated):
+        return first, second, distances
+    return first[separated], second[separated], distances[separated]
+
+
+def inertia(symbols: Sequence[str], coordinates: "np.ndarray") -> Dict[str, Any]:
+    """Center of mass, radius of gyration, principal moments (u*A^2) and normalized PMI ratios"""
+    masses = _masses(symbols)
+    total = masses.sum()
+    center = masses @ coordinates / total
+    centered = coordinates - center
+    squared = (centered ** 2).sum(axis=1)
+    tensor = np.eye(3) * (masses * squared).sum() - (centered * masses[:, None]).T @ centered
+    moments = np.linalg.eigvalsh(tensor)
+    result = {
+        "center_of_mass": _rounded(center),
+        "radius_of_gyration": _rounded(np.sqrt((masses * squared).sum() / total)),
+        "principal_moments": _rounded(moments),
+    }
+    if moments[2] > 0:
+        # Rod-like (0, 1, 1), disc-like (0.5, 0.5, 1), sphere-like (1, 1, 1)
+        result["npr"] = _rounded(moments[:2] / moments[2])
+    return result
+
+
+def distance_matrix(coordinates: "np.ndarray") -> "np.ndarray":
+    """(atoms, atoms) matrix of interatomic distances"""
+    differences = coordinates[:, None, :] - coordinates[None, :, :]
+    return np.sqrt((differences ** 2).sum(axis=-1))
+
+
+def max_distance(coordinates: "np.ndarray") -> float:
+    """
+    Largest interatomic distance, without the full distance matrix. Any atom at one end of
+    the longest distance D lies at least D - r_max from the centroid (r_max: the farthest
+    atom's distance), so only such atoms are compared, in blocks, against each other.
+    """
+    if len(coordinates) < 2:
+        return 0.0
+    radii = np.sqrt(((coordinates - coordinates.mean(axis=0)) ** 2).sum(axis=1))
+    # Lower bound on D: the farthest atom from the atom farthest from the centroid
+    farthest = coordinates[np.argmax(radii)]
+    best = float(np.sqrt(((coordinates - farthest) ** 2).sum(axis=1)).max())
+    candidates = coordinates[radii >= best - radii.max()]
+    for start in range(0, len(candidates), DISTANCE_BLOCK):
+        differences = candidates[start:start + DISTANCE_BLOCK, None, :] - candidates[None, :, :]
+        best = max(best, float(np.sqrt((differences ** 2).sum(axis=-1).max())))
+    return best
+
+
+def _rounded(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return np.round(value, PRECISION).tolist()
+    return round(float(value), PRECISION)
+
+
+def analyze(symbols: Sequence[str], coordinates: "np.ndarray",
+            analyses: Optional[Sequence[str]] = None, contact_scale: float = CONTACT_SCALE) -> Dict[str, Any]:
+    """Compact numeric results of the requested analyses (default: summary, inertia, bonds)"""
+    analyses = list(analyses or DEFAULT_ANALYSES)
+    unknown = [a for a in analyses if a not in ANALYSES]
+    if unknown:
+        raise ValueError(f"Unknown analyses: {', '.join(unknown)}; options: {', '.join(ANALYSES)}")
+    result: Dict[str, Any] = {"atom_count": len(symbols)}
+    if "summary" in analyses:
+        counts = Counter(symbols)
+        extent = coordinates.max(axis=0) - coordinates.min(axis=0)
+        result["elements"] = dict(sorted(counts.items()))
+        result["centroid"] = _rounded(coordinates.mean(axis=0))
+        result["bounding_box"] = _rounded(extent)
+        result["max_distance"] = _rounded(max_distance(coordinates))
+    if "inertia" in analyses:
+        result.update(inertia(symbols, coordinates))
+    bonds = None
+    if "bonds" in analyses or "contacts" in analyses:
+        bonds = perceive_bonds(symbols, coordinates)
+    if "bonds" in analyses:
+        types: Dict[str, List[float]] = {}
+        for i, j, length in zip(bonds[0].tolist(), bonds[1].tolist(), bonds[2].tolist()):
+            pair = "-".join(sorted((symbols[i], symbols[j])))
+            types.setdefault(pair, []).append(length)
+        result["bonds"] = {
+            "count": int(len(bonds[0])),
+            "by_type": {pair: {"count": len(lengths), "min": _rounded(min(lengths)),
+                               "mean": _rounded(sum(lengths) / len(lengths)), "max": _rounded(max(lengths))}
+                        for pair, lengths in sorted(types.items())},
+        }
+    if "contacts" in analyses:
+        first, second, distances = close_contacts(symbols, coordinates, bonds, contact_scale)
+        closest = np.argsort(distances)[:MAX_CONTACTS_LISTED]
+        result["contacts"] = {
+            "count": int(len(distances)),
+            "closest": [[int(first[k]), int(second[k]), f"{symbols[first[k]]}-{symbols[second[k]]}",
+                         _rounded(distances[k])] for k in closest],
+        }
+    if "distances" in analyses:
+        matrix = distance_matrix(coordinates)
+        result["distances"] = {
+            "shape": list(matrix.shape),
+            "dtype": "<f4",
+            "values": base64.b64encode(np.ascontiguousarray(matrix, dtype="<f4").tobytes()).decode("ascii"),
+        }
+    return result
@@ -0,0 +1,305 @@
+"""
+HTTP Transport Module
+
+Serves the MCP server over Streamable HTTP so one process can handle many clients.
+Requests are POSTed as JSON-RPC to a single endpoint; quick results come back as
+(compressed) JSON, while results that take longer than a moment are streamed as
+Server-Sent Events with keep-alive pings so proxies and clients don't time out.
+Requests carrying a progress token are streamed from the start so that progress
+notifications (and partial batch results) reach the client as they happen.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from .context import InflightRequests
+
+# Try to import aiohttp, the HTTP transport is unavailable without it
+try:
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Endpoint path for MCP messages
+MCP_PATH = "/mcp"
+
+# Header carrying the session assigned at initialization
+SESSION_HEADER = "Mcp-Session-Id"
+
+# Results slower than this are streamed over SSE instead of returned as JSON (seconds)
+SSE_AFTER = 1.0
+
+# Interval between SSE keep-alive comments (seconds)
+SSE_PING_INTERVAL = 15.0
+
+# Only compress bodies larger than this (bytes)
+COMPRESS_MIN_SIZE = 1024
+
+# Idle keep-alive connection timeout (seconds)
+KEEPALIVE_TIMEOUT = 75.0
+
+# Sessions without requests for this long are dropped; their clients get 404 and re-initialize (seconds)
+SESSION_IDLE_TIMEOUT = 3600.0
+
+# Most sessions kept; beyond it the least recently used session is dropped
+MAX_SESSIONS = 10000
+
+# Origins accepted when bound to a loopback address
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# handle_request(message, notify, inflight) -> response, or None if there is nothing to send
+RequestHandler = Callable[
+    [Dict[str, Any], Optional[Callable[[Dict[str, Any]], None]], Optional[InflightRequests]],
+    Optional[Dict[str, Any]]
+]
+
+
+class HttpTransport:
+    """Streamable HTTP transport that dispatches JSON-RPC messages to a blocking handler"""
+
+    def __init__(self, handle_request: RequestHandler,
+                 max_workers: int = 32, local_only: bool = True):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is not installed, install with: pip install -e \".[http]\"")
+        self.handle_request = handle_request
+        # Tool handlers block on network, disk and RDKit, so they run off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-http")
+        self.local_only = local_only
+        # Running requests per session (None for clients without a session), for cancellation.
+        # Least recently used first, so clients that never send DELETE are expired from the front.
+        self.sessions: "OrderedDict[Optional[str], InflightRequests]" = OrderedDict({None: InflightRequests()})
+        self._last_used: Dict[str, float] = {}
+
+    def create_app(self) -> "web.Application":
+        """Create the aiohttp application"""
+        app = web.Application()
+        app.router.add_post(MCP_PATH, self.handle_post)
+        app.router.add_get(MCP_PATH, self.handle_get)
+        app.router.add_delete(MCP_PATH, self.handle_delete)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def _on_shutdown(self, app):
+        self.executor.shutdown(wait=False)
+
+    def _check_origin(self, request: "web.Request") -> Optional["web.Response"]:
+        """Reject cross-origin browser requests to a local server (DNS rebinding protection)"""
+        origin = request.headers.get("Origin")
+        if not origin or not self.local_only:
+            return None
+        if urlparse(origin).hostname in LOCAL_HOSTS:
+            return None
+        logger.warning(f"Rejected request from origin: {origin}")
+        return web.Response(status=403, text="Forbidden origin")
+
+    def _touch_session(self, session_id: Optional[str]) -> None:
+        if session_id is not None:
+            self.sessions.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+
+    def _drop_session(self, session_id: str, reason: str) -> None:
+        self.sessions.pop(session_id).cancel_all(reason)
+        self._last_used.pop(session_id, None)
+
+    def _expire_sessions(self) -> None:
+        """Drop sessions idle past the timeout, then the least recently used beyond the cap"""
+        cutoff = time.monotonic() - SESSION_IDLE_TIMEOUT
+        idle = []
+        for session_id in self.sessions:
+            if session_id is None:
+                continue
+            if self._last_used[session_id] >= cutoff:
+                break
+            idle.append(session_id)
+        expired = 0
+        for session_id in idle:
+            if len(self.sessions[session_id]):
+                # Still working on a long request, so not idle
+                self._touch_session(session_id)
+            else:
+                self._drop_session(session_id, "Session expired")
+                expired += 1
+        while len(self.sessions) > MAX_SESSIONS + 1:
+            oldest = next(session_id for session_id in self.sessions if session_id is not None)
+            logger.warning(f"Session limit reached, dropping least recently used session {oldest}")
+            self._drop_session(oldest, "Session evicted")
+        if expired:
+            logger.info(f"Expired {expired} idle sessions, {len(self.sessions) - 1} remaining")
+
+    async def _dispatch(self, message: Dict[str, Any], inflight: InflightRequests,
+                        notify: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.handle_request, message, notify, inflight)
+
+    def _json_response(self, payload: Any,
+                       headers: Optional[Dict[str, str]] = None) -> "web.Response":
+        body = json.dumps(payload)
+        response = web.Response(text=body, content_type="application/json", headers=headers)
+        if len(body) >= COMPRESS_MIN_SIZE:
+            # Negotiates gzip/deflate from Accept-Encoding; large SDF/XYZ text shrinks well
+            response.enable_compression()
+        return response
+
+    async def handle_post(self, request: "web.Request") -> "web.StreamResponse":
+        """Handle JSON-RPC messages sent by the client"""
+        rejected = self._check_origin(request)
+        if rejected:
+            return rejected
+        # Looked up once: the session can expire or be evicted while the body is read
+        session_id = request.headers.get(SESSION_HEADER) or None
+        inflight = self.sessions.get(session_id)
+        if inflight is None:
+            return web.Response(status=404, text="Unknown session")
+        self._touch_session(session_id)
+
+        try:
+            payload = json.loads(await request.text())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return self._json_response({
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"code": -32700, "message": "Parse error: Invalid JSON"},
+            })
+
+        messages = payload if isinstance(payload, list) else [payload]
+        if not messages or not all(isinstance(m, dict) for m in messages):
+            return self._json_response({
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"code": -32600, "message": "Invalid request"},
+            })
+
+        # Notifications and responses only: acknowledge without a body
+        if not any("method" in m and "id" in m for m in messages):
+            for message in messages:
+                if "method" in message:
+                    await self._dispatch(message, inflight)
+            return web.Response(status=202)
+
+        headers = {}
+        if any(m.get("method") == "initialize" for m in messages):
+            session_id = uuid.uuid4().hex
+            self.sessions[session_id] = InflightRequests()
+            self._touch_session(session_id)
+            self._expire_sessions()
+            headers[SESSION_HEADER] = session_id
+
+        # Batches are answered together as JSON
+        if isinstance(payload, list):
+            results = await asyncio.gather(*(self._dispatch(m, inflight) for m in messages))
+            responses = [r for m, r in zip(messages, results) if r is not None and "id" in m]
+            return self._json_response(responses, headers)
+
+        accepts_sse = "text/event-stream" in request.headers.get("Accept", "")
+        notifications: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        def notify(message: Dict[str, Any]):
+            # Called from worker threads; notifications only reach SSE clients
+            if accepts_sse:
+                loop.call_soon_threadsafe(notifications.put_nowait, message)
+
+        task = asyncio.ensure_future(self._dispatch(payload, inflight, notify))
+        if not accepts_sse:
+            return self._result_response(await task, headers)
+
+        wants_progress = ((payload.get("params") or {}).get("_meta") or {}).get("progressToken") is not None
+        if not wants_progress:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), SSE_AFTER)
+                return self._result_response(result, headers)
+            except asyncio.TimeoutError:
+                pass
+        try:
+            return await self._stream_result(request, task, notifications, headers)
+        except ConnectionResetError:
+            # The client went away, stop working on its request
+            inflight.cancel(payload.get("id"), "Client disconnected")
+            raise
+
+    def _result_response(self, result: Optional[Dict[str, Any]], headers: Dict[str, str]) -> "web.Response":
+        if result is None:
+            # Cancelled by the client, nothing to send back
+            return web.Response(status=202, headers=headers)
+        retry_after = ((result.get("error") or {}).get("data") or {}).get("retryAfter")
+        if retry_after is not None:
+            # Shed under overload: let HTTP clients and proxies back off too
+            response = self._json_response(result, {**headers, "Retry-After": str(retry_after)})
+            response.set_status(503)
+            return response
+        return self._json_response(result, headers)
+
+    async def _stream_result(self, request: "web.Request", task: "asyncio.Future",
+                             notifications: "asyncio.Queue[Dict[str, Any]]",
+                             headers: Dict[str, str]) -> "web.StreamResponse":
+        """Stream notifications and then the result over SSE, pinging while idle"""
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            **headers,
+        })
+        await response.prepare(request)
+
+        async def send_event(message: Any):
+            await response.write(f"event: message\ndata: {json.dumps(message)}\n\n".encode('utf-8'))
+
+        while not task.done():
+            getter = asyncio.ensure_future(notifications.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=SSE_PING_INTERVAL,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await send_event(getter.result())
+            else:
+                getter.cancel()
+                if not done:
+                    await response.write(b": ping\n\n")
+
+        # Notifications are queued before the result is delivered, so flush them first
+        while not notifications.empty():
+            await send_event(notifications.get_nowait())
+        if task.result() is not None:
+            await send_event(task.result())
+        await response.write_eof()
+        return response
+
+    async def handle_get(self, request: "web.Request") -> "web.Response":
+        """This server sends no unsolicited messages, so there is no standalone stream"""
+        return web.Response(status=405, headers={"Allow": "POST, DELETE"})
+
+    async def handle_delete(self, request: "web.Request") -> "web.Response":
+        """Terminate a session"""
+        session_id = request.headers.get(SESSION_HEADER)
+        if not session_id or session_id not in self.sessions:
+            return web.Response(status=404, text="Unknown session")
+        self._drop_session(session_id, "Session terminated")
+        return web.Response(status=204)
+
+
+def run_http(handle_request: RequestHandler,
+             host: str = "127.0.0.1", port: int = 8000, max_workers: int = 32) -> None:
+    """Run the Streamable HTTP server until interrupted"""
+    transport = HttpTransport(handle_request, max_workers=max_workers, local_only=host in LOCAL_HOSTS)
+    logger.info(f"PubChem MCP server listening on http://{host}:{port}{MCP_PATH}")
+    web.run_app(
+        transport.create_app(),
+        host=host,
+        port=port,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        print=None,
+    )
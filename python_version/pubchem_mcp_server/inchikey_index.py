@@ -0,0 +1,167 @@
+"""
+InChIKey Index Module
+
+Local InChIKey lookups for the compounds the server has seen or imported:
+
+- A hash index from full InChIKey to CID answers identity queries without PubChem.
+- A second index on the connectivity block (the first 14 characters, which encode the
+  skeleton without stereochemistry, isotopes or protonation) returns every stereoisomer and
+  protonation variant of a structure in one lookup.
+
+Persisted as an append-only "CID<tab>InChIKey" file.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from .append_file import complete_lines, locked_append, open_append
+from .xyz_utils import RDKIT_AVAILABLE
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem, RDLogger
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Index file location
+DEFAULT_INCHIKEY_INDEX_PATH = os.environ.get(
+    "PUBCHEM_MCP_INCHIKEY_INDEX",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "inchikeys.tsv")
+)
+
+# Full standard InChIKey, and its connectivity block alone
+INCHIKEY_PATTERN = re.compile(r"^[A-Z]{14}-[A-Z]{10}-[A-Z]$")
+CONNECTIVITY_PATTERN = re.compile(r"^[A-Z]{14}$")
+
+CONNECTIVITY_LENGTH = 14
+
+
+def is_inchikey(query: str) -> bool:
+    return INCHIKEY_PATTERN.match(query.strip().upper()) is not None
+
+
+def inchikey_from_smiles(smiles: str) -> Optional[str]:
+    """Standard InChIKey computed with RDKit, or None"""
+    if not RDKIT_AVAILABLE:
+        return None
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+        key = Chem.MolToInchiKey(mol) if mol is not None else None
+    except Exception:
+        key = None
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+    return key or None
+
+
+class InChIKeyIndex:
+    """InChIKey and connectivity-block lookups, backed by an append-only file"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_INCHIKEY_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._file = None
+        self._by_key: Dict[str, int] = {}
+        self._by_cid: Dict[int, str] = {}
+        self._by_connectivity: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._by_cid)
+
+    def __contains__(self, cid: int) -> bool:
+        self._ensure_loaded()
+        return int(cid) in self._by_cid
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        for line in complete_lines(f):
+                            parts = line.split()
+                            if len(parts) == 2 and parts[0].isdigit() and INCHIKEY_PATTERN.match(parts[1]):
+                                self._store(int(parts[0]), parts[1])
+                    logger.info(f"Loaded {len(self._by_cid)} InChIKeys from {self.path}")
+                except Exception as e:
+                    logger.error(f"Unable to load InChIKey index {self.path}: {e}")
+            self._loaded = True
+
+    def _store(self, cid: int, key: str) -> None:
+        previous = self._by_cid.get(cid)
+        if previous is not None:
+            self._by_key.pop(previous, None)
+            self._by_connectivity.get(previous[:CONNECTIVITY_LENGTH], set()).discard(cid)
+        self._by_cid[cid] = key
+        self._by_key[key] = cid
+        self._by_connectivity.setdefault(key[:CONNECTIVITY_LENGTH], set()).add(cid)
+
+    def get(self, key: str) -> Optional[int]:
+        """CID of a full InChIKey, if it is indexed"""
+        self._ensure_loaded()
+        return self._by_key.get(key.strip().upper())
+
+    def key_of(self, cid: int) -> Optional[str]:
+        self._ensure_loaded()
+        return self._by_cid.get(int(cid))
+
+    def connectivity_matches(self, key: str) -> List[Tuple[int, str]]:
+        """(cid, InChIKey) of every compound sharing the connectivity block of key"""
+        self._ensure_loaded()
+        block = key.strip().upper()[:CONNECTIVITY_LENGTH]
+        with self._lock:
+            cids = sorted(self._by_connectivity.get(block, ()))
+            return [(cid, self._by_cid[cid]) for cid in cids]
+
+    def add_many(self, entries: List[Tuple[int, str]]) -> int:
+        """Index (cid, InChIKey) pairs, returns the number new or changed"""
+        self._ensure_loaded()
+        with self._lock:
+            changed = []
+            for cid, key in entries:
+                cid, key = int(cid), key.strip().upper()
+                if not INCHIKEY_PATTERN.match(key) or self._by_cid.get(cid) == key:
+                    continue
+                self._store(cid, key)
+                changed.append((cid, key))
+            if changed:
+                self._append_to_file(changed)
+        return len(changed)
+
+    def add_smiles_many(self, compounds: List[Tuple[int, str]]) -> int:
+        """Index compounds not yet known from their SMILES, computing InChIKeys with RDKit"""
+        if not RDKIT_AVAILABLE:
+            return 0
+        self._ensure_loaded()
+        entries = []
+        for cid, smiles in compounds:
+            if int(cid) in self._by_cid:
+                continue
+            key = inchikey_from_smiles(smiles)
+            if key:
+                entries.append((cid, key))
+        return self.add_many(entries)
+
+    def _append_to_file(self, entries: List[Tuple[int, str]]) -> None:
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                self._file = open_append(self.path)
+            locked_append(self._file, "".join(f"{cid}\t{key}\n" for cid, key in entries).encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Unable to write InChIKey index {self.path}: {e}")
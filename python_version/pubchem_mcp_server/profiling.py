@@ -0,0 +1,312 @@
+"""
+Profiling Module
+
+On-demand profiling of a running server, which cannot be started under a profiler when an
+MCP client spawns it. A profiling window covers the next N tool calls and writes to
+PUBCHEM_MCP_PROFILE_DIR (default ~/.pubchem-mcp/profiles):
+
+- cProfile: each request in the window is profiled in the thread handling it, and the
+  merged statistics are written as a .pstats file (python -m pstats, snakeviz).
+- sampling: a background thread samples the stacks of every thread (including batch and
+  HTTP workers that cProfile does not see) and writes them as folded stacks (.folded), the
+  input format of flamegraph.pl and speedscope.
+- memory: tracemalloc snapshots at the start and end of the window. The top allocation
+  growth is written as text, and the final snapshot is dumped for later comparison.
+
+Windows are started by the profile_next_n_requests admin tool, by SIGUSR1, or at startup
+with PUBCHEM_MCP_PROFILE_REQUESTS. SIGUSR2 writes a tracemalloc snapshot on its own.
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Output directory
+PROFILE_DIR = os.environ.get(
+    "PUBCHEM_MCP_PROFILE_DIR",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "profiles")
+)
+
+# Window started by SIGUSR1 or at startup
+DEFAULT_PROFILE_REQUESTS = int(os.environ.get("PUBCHEM_MCP_PROFILE_REQUESTS", "0"))
+DEFAULT_PROFILE_MODE = os.environ.get("PUBCHEM_MCP_PROFILE_MODE", "cprofile")
+DEFAULT_PROFILE_MEMORY = os.environ.get("PUBCHEM_MCP_PROFILE_MEMORY", "0") == "1"
+
+PROFILE_MODES = ("cprofile", "sampling", "both")
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Frames kept per tracemalloc allocation, and allocation sites reported
+TRACEMALLOC_FRAMES = 25
+MEMORY_TOP_STATS = 50
+
+# Innermost frames of threads that are waiting for work, left out of the samples
+_IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+                ("thread.py", "_worker")}
+
+
+def _output_prefix() -> str:
+    return os.path.join(PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of all other threads into folded-stack counts"""
+
+    def __init__(self):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename == __file__:
+                        # The profiler merging or writing its own results
+                        break
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                else:
+                    stack.append(names.get(ident, str(ident)))
+                    self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileSession:
+    """A profiling window over the next N requests"""
+
+    def __init__(self, requests: int, mode: str = "cprofile", memory: bool = False):
+        self.requests = requests
+        self.mode = mode
+        self.memory = memory
+        self.prefix = _output_prefix()
+        self.remaining = requests
+        self.active = 0
+        self.files: List[str] = []
+        self._lock = threading.Lock()
+        self._stats: Optional[pstats.Stats] = None
+        self._sampler: Optional[_Sampler] = None
+        self._started_tracemalloc = False
+        self._snapshot = None
+
+    def start(self) -> None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.mode in ("sampling", "both"):
+            self._sampler = _Sampler()
+            self._sampler.start()
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        logger.info(f"Profiling the next {self.requests} requests ({self.mode}, memory={self.memory}) "
+                    f"to {self.prefix}.*")
+
+    def begin_request(self) -> Optional[Any]:
+        """Count a request into the window; returns its profiler, if any"""
+        with self._lock:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            self.active += 1
+        profiler = True
+        if self.mode in ("cprofile", "both"):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Only one profiler can be active at a time on some Python versions
+                logger.warning(f"Request not profiled with cProfile: {e}")
+                profiler = True
+        return profiler
+
+    def end_request(self, profiler: Any) -> bool:
+        """Merge a request's profile; returns True if it closed the window"""
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        with self._lock:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.create_stats()
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+            self.active -= 1
+            if self.remaining > 0 or self.active > 0:
+                return False
+        self.finish()
+        return True
+
+    def finish(self) -> None:
+        """Stop profiling and write the results"""
+        if self._stats is not None:
+            self._write(f"{self.prefix}.pstats", lambda path: self._stats.dump_stats(path))
+        if self._sampler is not None:
+            self._sampler.stop()
+            stacks = self._sampler.stacks
+            self._write(f"{self.prefix}.folded",
+                        lambda path: open(path, "w", encoding="utf-8").writelines(
+                            f"{stack} {count}\n" for stack, count in stacks.most_common()))
+        if self._snapshot is not None:
+            snapshot = tracemalloc.take_snapshot()
+            self._write(f"{self.prefix}.memory.txt",
+                        lambda path: _write_memory_report(path, snapshot, self._snapshot))
+            self._write(f"{self.prefix}.tracemalloc", snapshot.dump)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        logger.info(f"Profiling finished after {self.requests} requests: {', '.join(self.files)}")
+
+    def _write(self, path: str, writer) -> None:
+        try:
+            writer(path)
+            self.files.append(path)
+        except Exception as e:
+            logger.error(f"Unable to write profile {path}: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "remaining": self.remaining, "mode": self.mode,
+                "memory": self.memory, "output_prefix": self.prefix}
+
+
+# Allocations of the profilers themselves, left out of memory reports
+_PROFILER_FILTERS = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+_PROFILER_FILTERS.append(tracemalloc.Filter(False, __file__))
+
+
+def _write_memory_report(path: str, snapshot: Any, baseline: Optional[Any]) -> None:
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = snapshot.filter_traces(_PROFILER_FILTERS)
+    lines = [f"Traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB", ""]
+    if baseline is not None:
+        lines.append(f"Top {MEMORY_TOP_STATS} allocation sites by growth:")
+        stats = snapshot.compare_to(baseline.filter_traces(_PROFILER_FILTERS), "lineno")
+    else:
+        lines.append(f"Top {MEMORY_TOP_STATS} allocation sites:")
+        stats = snapshot.statistics("lineno")
+    lines.extend(str(stat) for stat in stats[:MEMORY_TOP_STATS])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+_session: Optional[ProfileSession] = None
+_session_lock = threading.Lock()
+_last_memory_snapshot = None
+
+
+def start_profiling(requests: int, mode: str = "cprofile", memory: bool = False) -> ProfileSession:
+    """
+    Profile the next requests tool calls. Raises ValueError for an invalid mode or count,
+    and RuntimeError if a window is already open.
+    """
+    global _session
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Profiling mode must be one of {', '.join(PROFILE_MODES)}")
+    if requests < 1:
+        raise ValueError("Number of requests to profile must be at least 1")
+    with _session_lock:
+        if _session is not None:
+            raise RuntimeError(f"A profiling window is already open ({_session.remaining} requests remaining)")
+        session = ProfileSession(requests, mode, memory)
+        session.start()
+        _session = session
+    return session
+
+
+@contextmanager
+def profile_request() -> Iterator[None]:
+    """Profile the enclosed request if a profiling window is open"""
+    global _session
+    session = _session
+    profiler = session.begin_request() if session is not None else None
+    if profiler is None:
+        yield
+        return
+    try:
+        yield
+    finally:
+        if session.end_request(profiler):
+            with _session_lock:
+                if _session is session:
+                    _session = None
+
+
+def write_memory_snapshot() -> Optional[str]:
+    """
+    Write a tracemalloc report comparing against the previous call. The first call only
+    starts tracing. Returns the report path.
+    """
+    global _last_memory_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        _last_memory_snapshot = tracemalloc.take_snapshot()
+        logger.info("Started tracemalloc; the next snapshot will report growth since now")
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = f"{_output_prefix()}.memory.txt"
+    _write_memory_report(path, snapshot, _last_memory_snapshot)
+    snapshot.dump(path[:-len(".memory.txt")] + ".tracemalloc")
+    _last_memory_snapshot = snapshot
+    logger.info(f"Wrote memory snapshot {path}")
+    return path
+
+
+def _handle_profile_signal(signum, frame) -> None:
+    # Signal handlers run between bytecodes of the main thread, so start from another thread
+    requests = DEFAULT_PROFILE_REQUESTS or 10
+    threading.Thread(target=_start_from_signal, args=(requests,), daemon=True).start()
+
+
+def _start_from_signal(requests: int) -> None:
+    try:
+        start_profiling(requests, DEFAULT_PROFILE_MODE, DEFAULT_PROFILE_MEMORY)
+    except (ValueError, RuntimeError) as e:
+        logger.warning(f"Profiling not started: {e}")
+
+
+def _handle_memory_signal(signum, frame) -> None:
+    threading.Thread(target=write_memory_snapshot, daemon=True).start()
+
+
+def install_signal_handlers() -> None:
+    """SIGUSR1 opens a profiling window, SIGUSR2 writes a memory snapshot (POSIX only)"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, _handle_profile_signal)
+    if hasattr(signal, "SIGUSR2"):
+        signal.signal(signal.SIGUSR2, _handle_memory_signal)
+    if DEFAULT_PROFILE_REQUESTS > 0:
+        _start_from_signal(DEFAULT_PROFILE_REQUESTS)
@@ -9,11 +9,18 @@ you may need to install it manually. Please refer to the MCP documentation for h
 If you don't have the MCP SDK installed, you can still use the command line interface (cli.py) to retrieve PubChem data.
 """
 
+import asyncio
+import functools
 import json
 import logging
+import multiprocessing
+import os
 import signal
 import sys
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import requests
 
 # Try to import MCP SDK, provide a simplified version of the server if not available
 try:
@@ -35,6 +42,7 @@ except ImportError:
 
 from .pubchem_api import get_pubchem_data
 from .async_processor import get_processor
+from .upstream import PUBCHEM_REST_URL, pubchem_get
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -44,6 +52,13 @@ formatter = logging.Formatter('[%(levelname)s] %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Threads for blocking PubChem requests and disk access, which would otherwise stall the
+# event loop and every other request with it
+BLOCKING_WORKERS = int(os.environ.get("PUBCHEM_MCP_SERVER_WORKERS", "8"))
+
+# Processes for requests with RDKit 3D structure generation, which holds the GIL
+PROCESS_WORKERS = int(os.environ.get("PUBCHEM_MCP_SERVER_PROCESSES", "2"))
+
 
 class PubChemServer:
     """PubChem MCP Server class"""
@@ -62,6 +77,11 @@ class PubChemServer:
             }
         )
         
+        self.executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="pubchem-server")
+        # spawn: forking a process that runs worker threads is unsafe. Workers start on first use
+        self.processes = ProcessPoolExecutor(max_workers=PROCESS_WORKERS,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        
         self.setup_tool_handlers()
         
         # Error handling
@@ -71,6 +91,12 @@ class PubChemServer:
     def handle_sigint(self, sig, frame):
         """Handle SIGINT signal"""
         logger.info("Received interrupt signal, shutting down server...")
+        self.executor.shutdown(wait=False)
+        if sys.version_info >= (3, 9):
+            # Queued 3D requests would otherwise still run before the interpreter exits
+            self.processes.shutdown(wait=False, cancel_futures=True)
+        else:
+            self.processes.shutdown(wait=False)
         self.server.close()
         sys.exit(0)
     
@@ -79,6 +105,16 @@ class PubChemServer:
         self.server.set_request_handler(ListToolsRequest, self.handle_list_tools)
         self.server.set_request_handler(CallToolRequest, self.handle_call_tool)
     
+    async def run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking call on the worker threads instead of the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+    
+    async def run_in_process(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a CPU-bound call on the worker processes; func and args must be picklable"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.processes, functools.partial(func, *args))
+    
     async def handle_list_tools(self, request):
         """Handle list tools request"""
         return {
@@ -195,7 +231,10 @@ class PubChemServer:
                         "isError": True,
                     }
                 
-                result = get_pubchem_data(
+                # 3D structures are generated with RDKit, on a worker process
+                run = self.run_in_process if args.get("include_3d") else self.run_blocking
+                result = await run(
+                    get_pubchem_data,
                     args.get("query"),
                     args.get("format", "JSON"),
                     args.get("include_3d", False)
@@ -329,14 +368,12 @@ class PubChemServer:
             # We'll try for 3D SDF, but MOL/SMI might return 2D if 3D isn't standard.
             # Adjust record_type based on format if necessary, but PUG REST often handles it.
             record_type = "3d" if file_format == "sdf" else "2d" # Assume 2D for mol/smi unless PubChem provides 3D via display type
-            url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/{file_format.upper()}/?record_type={record_type}&response_type=display&display_type={file_format}"
+            url = f"{PUBCHEM_REST_URL}/compound/cid/{cid}/record/{file_format.upper()}/?record_type={record_type}&response_type=display&display_type={file_format}"
             logger.info(f"Attempting to download structure from URL: {url}")
 
             try:
-                # Use a session similar to pubchem_api.py
-                from .pubchem_api import create_session # Reuse session creation
-                session = create_session()
-                response = session.get(url, timeout=60)
+                # Shared rate-limited session, on a worker thread
+                response = await self.run_blocking(pubchem_get, url, 60)
                 response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
                 if response.text:
@@ -404,8 +441,6 @@ def main():
         cli_main()
         return
     
-    import asyncio
-    
     # Set logging level
     logging.basicConfig(level=logging.INFO)
     
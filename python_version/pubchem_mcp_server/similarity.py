@@ -0,0 +1,289 @@
+"""
+Similarity Search Module
+
+Local fingerprint index for Tanimoto similarity search over the compounds the server has
+seen (every compound fetched through get_pubchem_data) or imported from a CID-SMILES file.
+
+Fingerprints are Morgan (ECFP4-like) bit vectors, packed into rows of uint64 words. A search
+ANDs the query against every row, popcounts the result and ranks by Tanimoto similarity,
+all vectorized with NumPy. The index is persisted as an append-only file so new compounds
+are added without rewriting it.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .append_file import locked_append, open_append
+from .xyz_utils import RDKIT_AVAILABLE
+
+# Try to import NumPy, similarity search is disabled if not available
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem, RDLogger
+    from rdkit.Chem import rdFingerprintGenerator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Index file location
+DEFAULT_INDEX_PATH = os.environ.get(
+    "PUBCHEM_MCP_FINGERPRINT_INDEX",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "fingerprints.idx")
+)
+
+# Morgan fingerprint parameters (radius 2 ~ ECFP4)
+FINGERPRINT_BITS = 2048
+MORGAN_RADIUS = 2
+WORDS = FINGERPRINT_BITS // 64
+
+# File header: magic, fingerprint size and radius; a mismatch means the index must be rebuilt
+FILE_MAGIC = b"PCFPIDX1"
+HEADER_SIZE = 16
+
+# Rows scored per vectorized step, bounds the temporary memory of a search
+SEARCH_CHUNK_ROWS = 1 << 16
+
+# Initial capacity of the in-memory arrays; they double when full
+INITIAL_CAPACITY = 1024
+
+if NUMPY_AVAILABLE:
+    RECORD_DTYPE = np.dtype([("cid", "<i8"), ("fp", "<u8", (WORDS,))])
+    # Bits set in each byte value, for NumPy versions without bitwise_count
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def similarity_available() -> bool:
+    """Whether fingerprints can be computed (requires RDKit and NumPy)"""
+    return RDKIT_AVAILABLE and NUMPY_AVAILABLE
+
+
+def _popcount_rows(words: "np.ndarray") -> "np.ndarray":
+    """Number of set bits in each row of a 2D uint64 array"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.uint32)
+    return _POPCOUNT_TABLE[words.view(np.uint8)].sum(axis=1, dtype=np.uint32)
+
+
+_local = threading.local()
+
+
+def fingerprint(smiles: str) -> Optional["np.ndarray"]:
+    """Packed Morgan fingerprint of a SMILES string, or None if it cannot be parsed"""
+    if not similarity_available() or not smiles:
+        return None
+    generator = getattr(_local, "generator", None)
+    if generator is None:
+        # Generators are not shared between threads
+        generator = rdFingerprintGenerator.GetMorganGenerator(radius=MORGAN_RADIUS, fpSize=FINGERPRINT_BITS)
+        _local.generator = generator
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+    if mol is None:
+        return None
+    bits = generator.GetFingerprintAsNumPy(mol).astype(np.uint8)
+    return np.packbits(bits).view("<u8").copy()
+
+
+class FingerprintIndex:
+    """Append-only fingerprint index with vectorized Tanimoto top-k search"""
+
+    # Written at the start of the index file; subclasses using other fingerprints change it
+    magic = FILE_MAGIC
+    header_params = (FINGERPRINT_BITS, MORGAN_RADIUS)
+
+    def __init__(self, path: Optional[str] = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._file = None
+        self._size = 0
+        self._positions: Dict[int, int] = {}
+        if NUMPY_AVAILABLE:
+            self._fps = np.zeros((INITIAL_CAPACITY, WORDS), dtype="<u8")
+            self._counts = np.zeros(INITIAL_CAPACITY, dtype=np.uint32)
+            self._cids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return self._size
+
+    def __contains__(self, cid: int) -> bool:
+        self._ensure_loaded()
+        return int(cid) in self._positions
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and NUMPY_AVAILABLE:
+                try:
+                    self._load()
+                except Exception as e:
+                    logger.error(f"Unable to load fingerprint index {self.path}: {e}")
+            self._loaded = True
+
+    def _header(self) -> bytes:
+        return self.magic + np.array(self.header_params, dtype="<u4").tobytes()
+
+    def _fingerprint(self, smiles: str) -> Optional["np.ndarray"]:
+        return fingerprint(smiles)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if header != self._header():
+                logger.warning(f"Fingerprint index {self.path} has a different format, starting a new one")
+                os.replace(self.path, self.path + ".old")
+                return
+            # A partial trailing record (interrupted write) is ignored, the next append cuts it off
+            count = (os.path.getsize(self.path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+            records = np.fromfile(f, dtype=RECORD_DTYPE, count=count)
+        # Records of re-indexed compounds were appended again, the last one wins
+        last_rows = {cid: row for row, cid in enumerate(records["cid"].tolist())}
+        if len(last_rows) < len(records):
+            records = records[sorted(last_rows.values())]
+        self._reserve(len(records))
+        size = len(records)
+        self._fps[:size] = records["fp"]
+        self._cids[:size] = records["cid"]
+        for start in range(0, size, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, size)
+            self._counts[start:end] = _popcount_rows(self._fps[start:end])
+        self._positions = {cid: row for row, cid in enumerate(records["cid"].tolist())}
+        self._size = size
+        logger.info(f"Loaded {self._size} fingerprints from {self.path}")
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = len(self._cids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        # Searches keep a reference to the old arrays, so grow into new ones
+        fps = np.zeros((capacity, WORDS), dtype="<u8")
+        counts = np.zeros(capacity, dtype=np.uint32)
+        cids = np.zeros(capacity, dtype=np.int64)
+        fps[:self._size] = self._fps[:self._size]
+        counts[:self._size] = self._counts[:self._size]
+        cids[:self._size] = self._cids[:self._size]
+        self._fps, self._counts, self._cids = fps, counts, cids
+
+    def _store(self, cid: int, fp: "np.ndarray") -> None:
+        row = self._positions.get(cid)
+        if row is None:
+            self._reserve(1)
+            row = self._size
+            self._size += 1
+            self._positions[cid] = row
+            self._cids[row] = cid
+        self._fps[row] = fp
+        self._counts[row] = int(_popcount_rows(fp.reshape(1, WORDS))[0])
+
+    def _append_to_file(self, records: "np.ndarray") -> None:
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                self._file = open_append(self.path)
+            locked_append(self._file, records.tobytes(), self._header(), RECORD_DTYPE.itemsize)
+        except OSError as e:
+            logger.error(f"Unable to write fingerprint index {self.path}: {e}")
+
+    def get(self, cid: int) -> Optional["np.ndarray"]:
+        """The stored fingerprint of a compound, if it is indexed"""
+        self._ensure_loaded()
+        with self._lock:
+            row = self._positions.get(int(cid))
+            return None if row is None else self._fps[row].copy()
+
+    def add(self, cid: int, smiles: str) -> bool:
+        """Index a compound; returns False if its SMILES cannot be fingerprinted"""
+        return self.add_many([(cid, smiles)]) == 1
+
+    def add_many(self, compounds: List[Tuple[int, str]]) -> int:
+        """Index several compounds, returns the number added or updated"""
+        if not similarity_available():
+            return 0
+        self._ensure_loaded()
+        fingerprints = []
+        for cid, smiles in compounds:
+            fp = self._fingerprint(smiles)
+            if fp is not None:
+                fingerprints.append((int(cid), fp))
+        if not fingerprints:
+            return 0
+
+        with self._lock:
+            # Unchanged fingerprints are not written again
+            changed = [(cid, fp) for cid, fp in fingerprints
+                       if cid not in self._positions or not np.array_equal(self._fps[self._positions[cid]], fp)]
+            if not changed:
+                return len(fingerprints)
+            records = np.zeros(len(changed), dtype=RECORD_DTYPE)
+            for i, (cid, fp) in enumerate(changed):
+                self._store(cid, fp)
+                records[i] = (cid, fp)
+            self._append_to_file(records)
+        return len(fingerprints)
+
+    def search(self, query_fp: "np.ndarray", top_k: int = 10,
+               threshold: float = 0.0) -> List[Tuple[int, float]]:
+        """The top_k most similar compounds as (cid, Tanimoto similarity), best first"""
+        self._ensure_loaded()
+        with self._lock:
+            size = self._size
+            fps, counts, cids = self._fps, self._counts, self._cids
+
+        if size == 0 or top_k <= 0:
+            return []
+        query = np.ascontiguousarray(query_fp, dtype="<u8").reshape(1, WORDS)
+        query_count = int(_popcount_rows(query)[0])
+
+        similarities = np.empty(size, dtype=np.float32)
+        for start in range(0, size, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, size)
+            common = _popcount_rows(fps[start:end] & query)
+            union = counts[start:end] + query_count - common
+            np.divide(common, union, out=similarities[start:end], where=union > 0)
+            similarities[start:end][union == 0] = 0.0
+
+        k = min(top_k, size)
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best], kind="stable")]
+        return [(int(cids[row]), float(similarities[row])) for row in best
+                if similarities[row] >= threshold]
+
+    def screen(self, query_fp: "np.ndarray") -> List[int]:
+        """CIDs of the compounds whose fingerprint has every bit of query_fp set"""
+        self._ensure_loaded()
+        with self._lock:
+            size = self._size
+            fps, cids = self._fps, self._cids
+
+        query = np.ascontiguousarray(query_fp, dtype="<u8").reshape(1, WORDS)
+        matches = []
+        for start in range(0, size, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, size)
+            rows = np.flatnonzero(np.all((fps[start:end] & query) == query, axis=1))
+            matches.extend(cids[start + rows].tolist())
+        return matches
@@ -0,0 +1,168 @@
+"""
+SMILES Index Module
+
+Local structure-identity lookups: SMILES queries are canonicalized with RDKit and looked
+up in an index from canonical SMILES to CID, built from the SMILES of every compound the
+server has seen or imported and from earlier PubChem lookups. InChI queries are reduced
+to their InChIKey. Only misses go to PubChem's structure resolver.
+
+Keys are RDKit canonical isomeric SMILES, so a query with stereochemistry only matches a
+compound indexed with the same stereochemistry.
+
+Persisted as an append-only "CID<tab>canonical SMILES" file.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from .append_file import complete_lines, locked_append, open_append
+from .xyz_utils import RDKIT_AVAILABLE
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem, RDLogger
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Index file location
+DEFAULT_SMILES_INDEX_PATH = os.environ.get(
+    "PUBCHEM_MCP_SMILES_INDEX",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "smiles.tsv")
+)
+
+INCHI_PREFIX = "InChI="
+
+# Bonds, branches, brackets, stereo marks and ring closures: syntax that occurs in SMILES but
+# not in short names such as "CO" or "NO", which are also valid SMILES
+SMILES_SYNTAX = re.compile(r"[=#()\[\]@/\\%]|[A-Za-z]\d")
+
+
+def is_inchi(query: str) -> bool:
+    return query.strip().startswith(INCHI_PREFIX)
+
+
+def canonical_smiles(smiles: str) -> Optional[str]:
+    """RDKit canonical isomeric SMILES, or None if RDKit is unavailable or cannot parse it"""
+    if not RDKIT_AVAILABLE or not smiles or any(c.isspace() for c in smiles.strip()):
+        return None
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        mol = Chem.MolFromSmiles(smiles.strip())
+        return Chem.MolToSmiles(mol) if mol is not None and mol.GetNumAtoms() else None
+    except Exception:
+        return None
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+
+
+def inchikey_from_inchi(inchi: str) -> Optional[str]:
+    """InChIKey of an InChI, or None if RDKit is unavailable or the InChI is invalid"""
+    if not RDKIT_AVAILABLE:
+        return None
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        return Chem.InchiToInchiKey(inchi.strip()) or None
+    except Exception:
+        return None
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+
+
+def looks_like_smiles(query: str) -> bool:
+    """
+    Whether a query is unmistakably a SMILES string rather than a compound name: it uses
+    SMILES-only syntax and, with RDKit, parses. Strings that are both a plain name and
+    valid SMILES ("CO", "NO", "Br") are names.
+    """
+    query = query.strip()
+    if not query or any(c.isspace() for c in query) or SMILES_SYNTAX.search(query) is None:
+        return False
+    return canonical_smiles(query) is not None if RDKIT_AVAILABLE else True
+
+
+class SmilesIndex:
+    """Canonical SMILES to CID lookups, backed by an append-only file"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_SMILES_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._file = None
+        self._by_smiles: Dict[str, int] = {}
+        self._cids: Set[int] = set()
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._by_smiles)
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        for line in complete_lines(f):
+                            parts = line.split()
+                            if len(parts) == 2 and parts[0].isdigit():
+                                self._by_smiles[parts[1]] = int(parts[0])
+                                self._cids.add(int(parts[0]))
+                    logger.info(f"Loaded {len(self._by_smiles)} canonical SMILES from {self.path}")
+                except Exception as e:
+                    logger.error(f"Unable to load SMILES index {self.path}: {e}")
+            self._loaded = True
+
+    def get(self, canonical: str) -> Optional[int]:
+        """CID of a canonical SMILES, if it is indexed"""
+        self._ensure_loaded()
+        return self._by_smiles.get(canonical)
+
+    def add_many(self, entries: List[Tuple[int, str]]) -> int:
+        """Index (cid, canonical SMILES) pairs, returns the number new or changed"""
+        self._ensure_loaded()
+        with self._lock:
+            changed = []
+            for cid, canonical in entries:
+                cid = int(cid)
+                if not canonical or self._by_smiles.get(canonical) == cid:
+                    continue
+                self._by_smiles[canonical] = cid
+                self._cids.add(cid)
+                changed.append((cid, canonical))
+            if changed:
+                self._append_to_file(changed)
+        return len(changed)
+
+    def add_smiles_many(self, compounds: List[Tuple[int, str]]) -> int:
+        """Index compounds not yet known from their SMILES, canonicalizing them with RDKit"""
+        if not RDKIT_AVAILABLE:
+            return 0
+        self._ensure_loaded()
+        entries = []
+        for cid, smiles in compounds:
+            if int(cid) in self._cids:
+                continue
+            canonical = canonical_smiles(smiles)
+            if canonical:
+                entries.append((cid, canonical))
+        return self.add_many(entries)
+
+    def _append_to_file(self, entries: List[Tuple[int, str]]) -> None:
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                self._file = open_append(self.path)
+            locked_append(self._file, "".join(f"{cid}\t{canonical}\n" for cid, canonical in entries).encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Unable to write SMILES index {self.path}: {e}")
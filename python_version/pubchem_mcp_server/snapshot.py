@@ -0,0 +1,301 @@
+"""
+Cache Snapshot Module
+
+Exports the property cache and the structure cache into one bundle file, and loads such
+a bundle into a new node at startup so it serves the fleet's hot set from its first request.
+
+Bundle layout (all integers little-endian):
+
+    header     magic "PCSNAP01", format version, codec, creation time, entry count,
+               offsets and sizes of the sections below, SHA-256 of everything after
+               the header
+    dictionary optional zstd dictionary shared by every blob
+    index      fixed-width entries (key hash, blob offset, blob size, kind), sorted by
+               key hash, so a memory-mapped bundle is searched without loading it
+    blobs      one compressed blob per entry: the key, a newline and the payload
+
+Property entries keep their expiry and validators. Entries already expired on import are
+served stale and refreshed in the background, like any other stale entry.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .cache import PropertyCache
+from .structure_store import DICT_SIZE, TRAIN_MIN_SAMPLES, TRAIN_SAMPLES, ZSTD_AVAILABLE, StructureStore
+
+if ZSTD_AVAILABLE:
+    import zstandard
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Bundle loaded at startup
+DEFAULT_SNAPSHOT_PATH = os.environ.get("PUBCHEM_MCP_SNAPSHOT", "")
+
+# Directory of exported bundles when no path is given
+SNAPSHOT_DIR = os.path.join(os.path.expanduser("~/.pubchem-mcp"), "snapshots")
+
+FILE_MAGIC = b"PCSNAP01"
+FORMAT_VERSION = 1
+
+# magic, version, codec, flags, created, entry count, dictionary offset and size,
+# index offset, blobs offset and size, SHA-256 of dictionary, index and blobs
+HEADER = struct.Struct("<8sHHIQQQQQQQ32s")
+
+# key hash, blob offset, blob size, kind
+INDEX_ENTRY = struct.Struct("<QQIB3x")
+
+CODEC_GZIP = 1
+CODEC_ZSTD = 2
+
+KIND_PROPERTY = 1
+KIND_STRUCTURE = 2
+
+# zstd level of exported blobs; exports run on serving nodes, so not the slowest levels
+ZSTD_LEVEL = 10
+
+
+class SnapshotError(Exception):
+    """Raised for unreadable, corrupt or incompatible bundles"""
+
+
+def _key_hash(kind: int, key: str) -> int:
+    digest = hashlib.blake2b(bytes([kind]) + key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def write_snapshot(path: str, entries: List[Tuple[int, str, bytes]]) -> Dict[str, Any]:
+    """
+    Write (kind, key, payload) entries to a bundle, atomically replacing path.
+    Returns the entry count and size.
+    """
+    blobs = [key.encode("utf-8") + b"\n" + payload for _, key, payload in entries]
+    dictionary = b""
+    if ZSTD_AVAILABLE:
+        codec = CODEC_ZSTD
+        dict_data = None
+        if len(blobs) >= TRAIN_MIN_SAMPLES:
+            try:
+                step = max(1, len(blobs) // TRAIN_SAMPLES)
+                dict_data = zstandard.train_dictionary(DICT_SIZE, blobs[::step], level=ZSTD_LEVEL)
+                dictionary = dict_data.as_bytes()
+            except Exception as e:
+                logger.warning(f"Snapshot dictionary training failed: {e}")
+        compress = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress
+    else:
+        codec = CODEC_GZIP
+        compress = lambda data: gzip.compress(data, mtime=0)
+    compressed = [compress(blob) for blob in blobs]
+
+    dict_offset = HEADER.size
+    index_offset = dict_offset + len(dictionary)
+    blobs_offset = index_offset + INDEX_ENTRY.size * len(entries)
+    offsets = []
+    position = blobs_offset
+    for blob in compressed:
+        offsets.append(position)
+        position += len(blob)
+    hashes = [_key_hash(kind, key) for kind, key, _ in entries]
+    index = b"".join(INDEX_ENTRY.pack(hashes[i], offsets[i], len(compressed[i]), entries[i][0])
+                     for i in sorted(range(len(entries)), key=hashes.__getitem__))
+
+    digest = hashlib.sha256(dictionary)
+    digest.update(index)
+    for blob in compressed:
+        digest.update(blob)
+    header = HEADER.pack(FILE_MAGIC, FORMAT_VERSION, codec, 0, int(time.time()), len(entries),
+                         dict_offset, len(dictionary), index_offset, blobs_offset, position - blobs_offset,
+                         digest.digest())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(dictionary)
+            f.write(index)
+            for blob in compressed:
+                f.write(blob)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return {"entries": len(entries), "bytes": position}
+
+
+class SnapshotReader:
+    """Memory-mapped bundle with key lookups by binary search over the index"""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"{path} is empty")
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"{path} is too short to be a snapshot")
+        (magic, version, self.codec, _, self.created, self.count, dict_offset, dict_size,
+         self._index_offset, blobs_offset, blobs_size, checksum) = HEADER.unpack_from(self._map, 0)
+        if magic != FILE_MAGIC:
+            raise SnapshotError(f"{path} is not a snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"Snapshot format version {version} is not supported (expected {FORMAT_VERSION})")
+        if blobs_offset + blobs_size != len(self._map):
+            raise SnapshotError(f"{path} is truncated")
+        if verify and hashlib.sha256(self._map[HEADER.size:]).digest() != checksum:
+            raise SnapshotError(f"{path} failed its checksum")
+        if self.codec == CODEC_ZSTD:
+            if not ZSTD_AVAILABLE:
+                raise SnapshotError("The zstandard package is required to read this snapshot")
+            dict_data = (zstandard.ZstdCompressionDict(self._map[dict_offset:dict_offset + dict_size])
+                         if dict_size else None)
+            self._decompress = zstandard.ZstdDecompressor(dict_data=dict_data).decompress
+        elif self.codec == CODEC_GZIP:
+            self._decompress = gzip.decompress
+        else:
+            raise SnapshotError(f"Unknown snapshot codec {self.codec}")
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, position: int) -> Tuple[int, int, int, int]:
+        return INDEX_ENTRY.unpack_from(self._map, self._index_offset + position * INDEX_ENTRY.size)
+
+    def _blob(self, offset: int, size: int) -> Tuple[str, bytes]:
+        key, _, payload = self._decompress(self._map[offset:offset + size]).partition(b"\n")
+        return key.decode("utf-8"), payload
+
+    def get(self, kind: int, key: str) -> Optional[bytes]:
+        """Payload of an entry, or None if the bundle does not have it"""
+        wanted = _key_hash(kind, key)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        # Distinct keys can share a hash, so check every entry with it
+        while low < self.count:
+            key_hash, offset, size, entry_kind = self._entry(low)
+            if key_hash != wanted:
+                break
+            if entry_kind == kind:
+                entry_key, payload = self._blob(offset, size)
+                if entry_key == key:
+                    return payload
+            low += 1
+        return None
+
+    def entries(self, kind: Optional[int] = None) -> Iterator[Tuple[int, str, bytes]]:
+        """(kind, key, payload) of every entry, optionally of one kind, in file order"""
+        selected = []
+        for position in range(self.count):
+            _, offset, size, entry_kind = self._entry(position)
+            if kind is None or entry_kind == kind:
+                selected.append((offset, size, entry_kind))
+        # Blob order reads the file sequentially
+        for offset, size, entry_kind in sorted(selected):
+            key, payload = self._blob(offset, size)
+            yield entry_kind, key, payload
+
+
+def default_export_path() -> str:
+    return os.path.join(SNAPSHOT_DIR, time.strftime("snapshot-%Y%m%d-%H%M%S") + f"-{os.getpid()}.pcsnap")
+
+
+def export_snapshot(path: str, cache: PropertyCache, store: Optional[StructureStore],
+                    max_entries: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Write the property cache (its max_entries most recently used records, by default all)
+    and the structure records of those compounds to a bundle. Returns counts and size.
+    """
+    entries: List[Tuple[int, str, bytes]] = []
+    identifiers = set()
+    for key, value, expires_at, etag, last_modified in cache.export_entries(max_entries):
+        record = {"value": value, "expires_at": expires_at, "etag": etag, "last_modified": last_modified}
+        entries.append((KIND_PROPERTY, key, json.dumps(record, separators=(",", ":")).encode("utf-8")))
+        if key.startswith("cid:") and isinstance(value, dict):
+            identifiers.add(str(value.get("CID", key[4:])))
+            if value.get("InChIKey"):
+                identifiers.add(value["InChIKey"])
+    properties = len(entries)
+
+    if store is not None:
+        for name in sorted(set(store.names())):
+            # "<CID>.xyz", "<CID>.packed", or "conformers/<InChIKey>_<parameters>.sdf"
+            stem = os.path.basename(name).split(".", 1)[0].split("_", 1)[0]
+            if max_entries is not None and stem not in identifiers:
+                continue
+            text = store.read(name)
+            if text is not None:
+                entries.append((KIND_STRUCTURE, name, text.encode("utf-8")))
+
+    result = write_snapshot(path, entries)
+    result.update(properties=properties, structures=len(entries) - properties, path=path)
+    logger.info(f"Exported snapshot {path}: {properties} property records, "
+                f"{len(entries) - properties} structures, {result['bytes']} bytes")
+    return result
+
+
+def import_snapshot(path: str, cache: PropertyCache, store: Optional[StructureStore],
+                    on_record: Optional[Callable[[str, Any], None]] = None,
+                    overwrite_structures: bool = False) -> Dict[str, Any]:
+    """
+    Load a bundle into the property cache and structure store. Records already cached are
+    kept; on_record(key, value) is called for each imported property record. Raises
+    SnapshotError if the bundle is unusable.
+    """
+    started = time.perf_counter()
+    with SnapshotReader(path) as reader:
+        records = []
+        for _, key, payload in reader.entries(KIND_PROPERTY):
+            record = json.loads(payload)
+            records.append((key, record["value"], record["expires_at"], record.get("etag"),
+                            record.get("last_modified")))
+        imported = cache.load_entries(records)
+        if on_record:
+            for key, value, _, _, _ in records:
+                on_record(key, value)
+
+        structures = 0
+        if store is not None:
+            for _, name, payload in reader.entries(KIND_STRUCTURE):
+                if overwrite_structures or not store.exists(name):
+                    store.write(name, payload.decode("utf-8"))
+                    structures += 1
+        age = time.time() - reader.created
+
+    result = {"properties": imported, "structures": structures, "snapshot_age_seconds": round(age),
+              "seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"Imported snapshot {path}: {imported} property records, {structures} structures "
+                f"in {result['seconds']}s (snapshot {age / 3600:.1f} h old)")
+    return result
@@ -0,0 +1,289 @@
+"""
+Structure Store Module
+
+Compressed on-disk storage for structure files (XYZ, SDF). XYZ and SDF records are
+repetitive text, and the records of different compounds resemble one another. A zstd
+dictionary trained on a sample of records captures that shared structure, so each small
+file compresses far better than it would on its own.
+
+- Records are written as "<name>.zst" using the current dictionary. Once enough records
+  have been written, a dictionary is trained from them automatically.
+- Each zstd frame records the ID of its dictionary, and old dictionaries are kept, so files
+  written before a retrain stay readable.
+- Without the zstandard package, records are written as "<name>.gz".
+- Reads are transparent: .zst, .gz and legacy uncompressed files are all served.
+"""
+
+import gzip
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .tracing import span
+
+# Try to import zstandard, fall back to gzip if not available
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# zstd compression level; higher levels cost write time but reads are unaffected
+ZSTD_LEVEL = 19
+
+# gzip compression level for the fallback format
+GZIP_LEVEL = 9
+
+# Dictionary size (bytes)
+DICT_SIZE = 64 * 1024
+
+# Records sampled for training, and the minimum needed before training automatically
+TRAIN_SAMPLES = 1000
+TRAIN_MIN_SAMPLES = 200
+
+DICT_DIR_NAME = "dictionaries"
+
+
+class StructureStore:
+    """Compressed structure files in a directory, readable regardless of how they were written"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._root = str(self.directory)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._current_dict_id = 0
+        self._dicts_loaded = False
+        self._samples: List[bytes] = []
+        self._training_attempted = False
+
+    # Dictionaries
+
+    def _dict_dir(self) -> Path:
+        return self.directory / DICT_DIR_NAME
+
+    def _load_dictionaries(self) -> None:
+        if self._dicts_loaded:
+            return
+        with self._lock:
+            if self._dicts_loaded:
+                return
+            self._scan_dictionaries()
+            self._dicts_loaded = True
+
+    def _scan_dictionaries(self) -> None:
+        # Called with the lock held. Other processes sharing the directory train dictionaries
+        # too, so a rescan picks up theirs and switches to the newest one
+        newest = None
+        for path in sorted(self._dict_dir().glob("*.zdict")) if self._dict_dir().exists() else []:
+            try:
+                mtime = path.stat().st_mtime
+                dictionary = self._dictionaries.get(int(path.stem)) if path.stem.isdigit() else None
+                if dictionary is None:
+                    dictionary = zstandard.ZstdCompressionDict(path.read_bytes())
+                    self._dictionaries[dictionary.dict_id()] = dictionary
+                if newest is None or mtime > newest[0]:
+                    newest = (mtime, dictionary.dict_id())
+            except Exception as e:
+                logger.error(f"Unable to load compression dictionary {path}: {e}")
+        if newest and newest[1] != self._current_dict_id:
+            self._current_dict_id = newest[1]
+            # Compressors are bound to a dictionary, so drop the cached ones
+            self._local = threading.local()
+
+    def _reload_dictionaries(self) -> None:
+        with self._lock:
+            self._scan_dictionaries()
+
+    def train_dictionary(self, samples: List[bytes]) -> Optional[int]:
+        """Train and activate a new dictionary from sample records, returns its ID"""
+        if not ZSTD_AVAILABLE or len(samples) < 10:
+            return None
+        self._load_dictionaries()
+        try:
+            dictionary = zstandard.train_dictionary(DICT_SIZE, samples, level=ZSTD_LEVEL)
+        except Exception as e:
+            logger.warning(f"Compression dictionary training failed: {e}")
+            return None
+        dict_id = dictionary.dict_id()
+        self._dict_dir().mkdir(parents=True, exist_ok=True)
+        self._write_atomic(self._dict_dir() / f"{dict_id}.zdict", dictionary.as_bytes())
+        with self._lock:
+            self._dictionaries[dict_id] = dictionary
+            self._current_dict_id = dict_id
+            # Compressors are bound to a dictionary, so drop the cached ones
+            self._local = threading.local()
+        logger.info(f"Trained compression dictionary {dict_id} from {len(samples)} records")
+        return dict_id
+
+    def _collect_sample(self, data: bytes) -> None:
+        if self._current_dict_id or self._training_attempted:
+            return
+        with self._lock:
+            if self._training_attempted:
+                return
+            self._samples.append(data)
+            if len(self._samples) < TRAIN_MIN_SAMPLES:
+                return
+            samples, self._samples = self._samples, []
+            self._training_attempted = True
+            # Use a dictionary another process trained in the meantime instead of training a rival one
+            self._scan_dictionaries()
+            if self._current_dict_id:
+                return
+        self.train_dictionary(samples)
+
+    # Compression
+
+    def _compressor(self) -> "zstandard.ZstdCompressor":
+        # zstd compressor objects are not thread-safe, so each thread keeps its own
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            dictionary = self._dictionaries.get(self._current_dict_id)
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompress_zstd(self, data: bytes) -> bytes:
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            dictionary = self._dictionaries.get(dict_id) if dict_id else None
+            if dict_id and dictionary is None:
+                # Written by another process with a dictionary it trained after we loaded ours
+                self._reload_dictionaries()
+                dictionary = self._dictionaries.get(dict_id)
+                if dictionary is None:
+                    raise ValueError(f"Compression dictionary {dict_id} is missing")
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(data)
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    # Records
+
+    def _paths(self, name: str) -> List[str]:
+        # Plain string paths, pathlib costs as much as decompression on this hot path
+        base = os.path.join(self._root, name)
+        return [base + ".zst", base + ".gz", base]
+
+    def exists(self, name: str) -> bool:
+        return any(os.path.exists(path) for path in self._paths(name))
+
+    def write(self, name: str, text: str) -> None:
+        """Store a record compressed, replacing any earlier version in any format"""
+        with span("structure_cache.write", name=name, size=len(text)):
+            self._write(name, text)
+
+    def _write(self, name: str, text: str) -> None:
+        data = text.encode("utf-8")
+        zst_path, gz_path, plain_path = self._paths(name)
+        if ZSTD_AVAILABLE:
+            self._load_dictionaries()
+            self._collect_sample(data)
+            self._write_atomic(Path(zst_path), self._compressor().compress(data))
+            stale = (gz_path, plain_path)
+        else:
+            self._write_atomic(Path(gz_path), gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+            stale = (zst_path, plain_path)
+        for path in stale:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def read(self, name: str) -> Optional[str]:
+        """A stored record, or None if it does not exist"""
+        with span("structure_cache.read", name=name) as current:
+            text = self._read(name)
+            current.set_attribute("hit", text is not None)
+            return text
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            return self._read_record(name)
+        except Exception as e:
+            # A damaged or undecodable record is a miss: the caller fetches and rewrites it
+            logger.warning(f"Unable to read structure record {name}, treating it as missing: {e}")
+            return None
+
+    def _read_record(self, name: str) -> Optional[str]:
+        zst_path, gz_path, plain_path = self._paths(name)
+        # Opening directly instead of checking existence first saves a stat per read
+        try:
+            with open(zst_path, "rb") as f:
+                data = f.read()
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError(f"{zst_path} requires the zstandard package")
+            self._load_dictionaries()
+            return self._decompress_zstd(data).decode("utf-8")
+        except FileNotFoundError:
+            pass
+        try:
+            with open(gz_path, "rb") as f:
+                return gzip.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            pass
+        try:
+            with open(plain_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def names(self) -> Iterator[str]:
+        """Names of all stored records"""
+        for path in self.directory.rglob("*"):
+            if not path.is_file() or path.name.startswith(".tmp-") or DICT_DIR_NAME in path.parts:
+                continue
+            name = str(path.relative_to(self.directory))
+            if name.endswith(".zst") or name.endswith(".gz"):
+                name = name.rsplit(".", 1)[0]
+            yield name
+
+    def compact(self) -> int:
+        """
+        Retrain the dictionary on a sample of the stored records and rewrite every record
+        with it, converting legacy uncompressed and gzip files. Returns the number rewritten.
+        """
+        names = sorted(set(self.names()))
+        if ZSTD_AVAILABLE and names:
+            step = max(1, len(names) // TRAIN_SAMPLES)
+            samples = []
+            for name in names[::step][:TRAIN_SAMPLES]:
+                text = self.read(name)
+                if text:
+                    samples.append(text.encode("utf-8"))
+            self.train_dictionary(samples)
+        for name in names:
+            text = self.read(name)
+            if text is not None:
+                self.write(name, text)
+        logger.info(f"Rewrote {len(names)} structure records")
+        return len(names)
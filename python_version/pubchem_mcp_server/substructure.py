@@ -0,0 +1,149 @@
+"""
+Substructure Search Module
+
+Substructure search over the local compound store. RDKit pattern fingerprints of every stored
+compound are kept in a packed bit index; a compound can only contain the query if its
+fingerprint has all of the query's bits set, which rules out most of the store with one
+vectorized pass. The surviving candidates are checked with HasSubstructMatch in a process
+pool, and matches are reported as each chunk of candidates completes.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .compounds import CompoundStore
+from .context import check_cancelled
+from .similarity import FINGERPRINT_BITS, NUMPY_AVAILABLE, FingerprintIndex, similarity_available
+from .workers import match_chunk, parse_query
+from .xyz_utils import RDKIT_AVAILABLE
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+if RDKIT_AVAILABLE:
+    from rdkit import Chem, DataStructs, RDLogger
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Pattern fingerprint index file location
+DEFAULT_PATTERN_INDEX_PATH = os.environ.get(
+    "PUBCHEM_MCP_PATTERN_INDEX",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "patterns.idx")
+)
+
+# Worker processes for substructure matching
+SUBSTRUCTURE_WORKERS = int(os.environ.get("PUBCHEM_MCP_SUBSTRUCTURE_WORKERS", str(os.cpu_count() or 2)))
+
+# Candidates checked per worker task
+MATCH_CHUNK_SIZE = 1000
+
+# Below this many candidates, matching in-process is faster than using the pool
+INLINE_CANDIDATES = 2000
+
+# on_matches(checked, total, new_matches): called as chunks of candidates complete
+MatchCallback = Callable[[int, int, List[int]], None]
+
+
+def pattern_fingerprint(mol: Any) -> "np.ndarray":
+    """Packed RDKit pattern fingerprint of a molecule or query"""
+    bits = np.zeros(FINGERPRINT_BITS, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.PatternFingerprint(mol, fpSize=FINGERPRINT_BITS), bits)
+    return np.packbits(bits).view("<u8").copy()
+
+
+class PatternIndex(FingerprintIndex):
+    """Pattern fingerprints of the stored compounds, for screening substructure candidates"""
+
+    magic = b"PCPATIDX"
+    header_params = (FINGERPRINT_BITS, 0)
+
+    def __init__(self, path: Optional[str] = DEFAULT_PATTERN_INDEX_PATH):
+        super().__init__(path)
+
+    def _fingerprint(self, smiles: str) -> Optional["np.ndarray"]:
+        RDLogger.DisableLog("rdApp.*")
+        try:
+            mol = Chem.MolFromSmiles(smiles)
+        finally:
+            RDLogger.EnableLog("rdApp.*")
+        return pattern_fingerprint(mol) if mol is not None else None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """The shared matching pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs HTTP and worker threads is unsafe. Tasks
+            # run match_chunk from the side-effect-free workers module.
+            _pool = ProcessPoolExecutor(max_workers=SUBSTRUCTURE_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def substructure_search(query: str, index: PatternIndex, store: CompoundStore,
+                        query_type: Optional[str] = None, max_results: int = 100,
+                        on_matches: Optional[MatchCallback] = None) -> Tuple[List[int], Dict[str, int]]:
+    """
+    Find stored compounds containing the query. Returns (cids, stats); the search stops
+    once max_results matches are found. Raises ValueError if the query cannot be parsed.
+    """
+    if not similarity_available():
+        raise RuntimeError("Substructure search requires RDKit and NumPy")
+
+    pattern = parse_query(query, query_type)
+    if pattern is None:
+        raise ValueError(f"Unable to parse query: {query}")
+
+    candidate_cids = index.screen(pattern_fingerprint(pattern))
+    candidates = [(cid, store.get(cid)) for cid in candidate_cids]
+    candidates = [(cid, smiles) for cid, smiles in candidates if smiles]
+    stats = {"indexed": len(index), "candidates": len(candidates), "checked": 0}
+    logger.info(f"Substructure screen kept {len(candidates)} of {stats['indexed']} compounds")
+
+    chunks = [candidates[i:i + MATCH_CHUNK_SIZE] for i in range(0, len(candidates), MATCH_CHUNK_SIZE)]
+    matches: List[int] = []
+
+    def collect(chunk_size: int, found: List[int]) -> bool:
+        found = found[:max_results - len(matches)]
+        matches.extend(found)
+        stats["checked"] += chunk_size
+        if on_matches:
+            on_matches(stats["checked"], len(candidates), found)
+        return len(matches) >= max_results
+
+    if len(candidates) <= INLINE_CANDIDATES:
+        for chunk in chunks:
+            check_cancelled()
+            if collect(len(chunk), match_chunk(query, query_type, chunk)):
+                break
+        return matches, stats
+
+    pool = get_process_pool()
+    pending = {pool.submit(match_chunk, query, query_type, chunk): len(chunk) for chunk in chunks}
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            check_cancelled()
+            for future in done:
+                if collect(pending.pop(future), future.result()):
+                    return matches, stats
+    finally:
+        # Chunks not started yet are dropped when the search stops early
+        for future in pending:
+            future.cancel()
+    return matches, stats
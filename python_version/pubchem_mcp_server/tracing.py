@@ -0,0 +1,232 @@
+"""
+Tracing Module
+
+Lightweight per-request tracing, to attribute slow requests to the stage that made them
+slow (property fetch, SDF download, RDKit parsing, SMILES fallback, structure cache I/O).
+
+- trace_request() opens the root span of a request. span() opens a child of the current
+  span. The current span is a context variable, so it follows async tasks and threads
+  started with contextvars.copy_context(). Outside a traced request, span() does nothing.
+- A request is traced when it is head-sampled (PUBCHEM_MCP_TRACE_SAMPLE_RATE, fraction of
+  requests) or when it turns out slower than PUBCHEM_MCP_TRACE_SLOW_MS. Both default to
+  off, so tracing costs nothing unless enabled.
+- Finished traces are appended to PUBCHEM_MCP_TRACE_FILE as JSON lines, one span per line,
+  with OpenTelemetry field names. When the OpenTelemetry SDK is installed the spans are also
+  replayed into the configured tracer provider, so any OTel exporter can receive them.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Try to import OpenTelemetry, spans are only written to the JSON lines file if not available
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Fraction of requests traced, decided when they start
+TRACE_SAMPLE_RATE = float(os.environ.get("PUBCHEM_MCP_TRACE_SAMPLE_RATE", "0"))
+
+# Requests slower than this (milliseconds) are exported even when not sampled, 0 disables
+TRACE_SLOW_MS = float(os.environ.get("PUBCHEM_MCP_TRACE_SLOW_MS", "0"))
+
+# JSON lines export file
+TRACE_FILE = os.environ.get(
+    "PUBCHEM_MCP_TRACE_FILE",
+    os.path.join(os.path.expanduser("~/.pubchem-mcp"), "traces.jsonl")
+)
+
+
+class Span:
+    """One timed stage of a request"""
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.thread = threading.current_thread().name
+        self.status = "OK"
+        self.status_message: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.status = "ERROR"
+        self.status_message = message
+
+    def end(self) -> None:
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._start)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+            "thread": self.thread,
+        }
+
+
+class _NoopSpan:
+    """Stand-in when the current request is not traced"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one request"""
+
+    def __init__(self, sampled: bool):
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "pubchem_mcp_current_span", default=None
+)
+
+_export_lock = threading.Lock()
+_export_file = None
+
+
+def tracing_enabled() -> bool:
+    return TRACE_SAMPLE_RATE > 0 or TRACE_SLOW_MS > 0
+
+
+def current_span() -> Any:
+    """The current span, or a no-op span outside traced requests"""
+    return _current_span.get() or NOOP_SPAN
+
+
+class _SpanScope:
+    """Context manager that makes a new span current, a no-op outside traced requests"""
+
+    __slots__ = ("name", "attributes", "trace", "span", "token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], trace: Optional[Trace] = None):
+        self.name = name
+        self.attributes = attributes
+        self.trace = trace
+        self.span: Optional[Span] = None
+
+    def __enter__(self) -> Any:
+        parent = _current_span.get()
+        trace = self.trace or (parent.trace if parent is not None else None)
+        if trace is None:
+            return NOOP_SPAN
+        self.span = Span(trace, self.name, parent, self.attributes)
+        trace.add(self.span)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.span is None:
+            return
+        if exc_type is not None:
+            self.span.set_error(f"{exc_type.__name__}: {exc}")
+        self.span.end()
+        _current_span.reset(self.token)
+
+
+def span(name: str, /, **attributes: Any) -> _SpanScope:
+    """Time the enclosed code as a child of the current span"""
+    return _SpanScope(name, attributes)
+
+
+@contextmanager
+def trace_request(name: str, /, **attributes: Any) -> Iterator[Any]:
+    """Open the root span of a request, exporting the trace when it ends if it is kept"""
+    if not tracing_enabled() or _current_span.get() is not None:
+        with span(name, **attributes) as current:
+            yield current
+        return
+    trace = Trace(sampled=random.random() < TRACE_SAMPLE_RATE)
+    scope = _SpanScope(name, attributes, trace)
+    try:
+        with scope as root:
+            yield root
+    finally:
+        if scope.span is not None and (trace.sampled or (TRACE_SLOW_MS > 0 and scope.span.duration_ms >= TRACE_SLOW_MS)):
+            export(trace)
+
+
+def export(trace: Trace) -> None:
+    """Append a finished trace to the JSON lines file and to OpenTelemetry"""
+    global _export_file
+    with trace._lock:
+        spans = list(trace.spans)
+    if TRACE_FILE:
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        try:
+            with _export_lock:
+                if _export_file is None:
+                    os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+                    _export_file = open(TRACE_FILE, "a", encoding="utf-8")
+                _export_file.write(lines)
+                _export_file.flush()
+        except OSError as e:
+            logger.error(f"Unable to write trace file {TRACE_FILE}: {e}")
+    if OTEL_AVAILABLE:
+        _export_otel(spans)
+
+
+def _export_otel(spans: List[Span]) -> None:
+    """Replay finished spans into the configured OpenTelemetry tracer provider"""
+    tracer = otel_trace.get_tracer(__name__)
+    otel_spans: Dict[str, Any] = {}
+    # Spans are recorded in creation order, so parents are created before their children
+    for s in spans:
+        parent = otel_spans.get(s.parent_id)
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        attributes = {k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in s.attributes.items()}
+        attributes["pubchem_mcp.trace_id"] = s.trace.trace_id
+        otel_span = tracer.start_span(s.name, context=context, attributes=attributes, start_time=s.start_ns)
+        if s.status == "ERROR":
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, s.status_message))
+        otel_spans[s.span_id] = otel_span
+    for s in spans:
+        otel_spans[s.span_id].end(end_time=s.end_ns)
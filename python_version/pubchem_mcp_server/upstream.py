@@ -0,0 +1,408 @@
+"""
+Upstream HTTP Module
+
+Provides the shared HTTP session and rate limiter used for all PubChem requests.
+Requests honour the deadline and cancellation of the current request context,
+including the waits for a rate limit token and between retries.
+
+To keep tail latency down when PubChem has a slow node, timeouts adapt to observed
+latency, slow requests are hedged with a duplicate after the p95 delay (when the rate
+limiter has a token to spare), and a circuit breaker fails fast while PubChem is down.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from .context import check_cancelled, current_context, request_sleep, request_timeout
+from .tracing import span
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter('[%(levelname)s] %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Base URL of PUG REST, overridable to point at a mirror or a local stub
+PUBCHEM_REST_URL = os.environ.get("PUBCHEM_MCP_PUBCHEM_URL", "https://pubchem.ncbi.nlm.nih.gov/rest/pug").rstrip("/")
+
+# PubChem usage policy: no more than 5 requests per second
+PUBCHEM_REQUESTS_PER_SECOND = 5.0
+
+# Connection pool size of the shared session
+POOL_MAXSIZE = 32
+
+# Retries of failed requests: connection errors and these status codes
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Adaptive timeouts: a multiple of the observed p99 latency, within [MIN_TIMEOUT, caller's timeout]
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+TIMEOUT_PERCENTILE = 99
+TIMEOUT_MULTIPLIER = 3.0
+MIN_TIMEOUT = 5.0
+
+# Hedging: send a duplicate request once the first is slower than this percentile
+HEDGE_PERCENTILE = 95
+
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling PubChem while the circuit breaker is open"""
+
+
+class LatencyTracker:
+    """Sliding window of observed latencies for one kind of PubChem endpoint"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: deque = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency percentile, or None until enough samples have been observed"""
+        with self.lock:
+            if len(self.samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout(self, maximum: Optional[float]) -> Optional[float]:
+        """Adaptive timeout derived from the tail latency, never above maximum"""
+        p = self.percentile(TIMEOUT_PERCENTILE)
+        if p is None:
+            return maximum
+        adaptive = max(MIN_TIMEOUT, p * TIMEOUT_MULTIPLIER)
+        return adaptive if maximum is None else min(maximum, adaptive)
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, letting one probe through per reset period"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            # Half-open: let a single probe through (another one if it was abandoned)
+            if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+                return False
+            self.probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info("PubChem circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started = None
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.probe_started is not None or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logger.warning(f"PubChem circuit breaker opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self.probe_started = None
+
+
+class RateLimiter:
+    """Token bucket rate limiter shared by all threads of the process"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available, without waiting"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """
+        Take a token, waiting until one becomes available. Gives up (raising) if the current
+        request is cancelled or runs out of time while waiting.
+        """
+        while True:
+            check_cancelled()
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            request_sleep(wait)
+
+
+def create_session(retry: bool = True) -> requests.Session:
+    """Create a requests session with retry functionality"""
+    session = requests.Session()
+    retry_strategy = requests.adapters.Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=sorted(RETRY_STATUSES),
+    ) if retry else 0
+    adapter = requests.adapters.HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=4,
+        pool_maxsize=POOL_MAXSIZE,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_rate_limiter = RateLimiter(PUBCHEM_REQUESTS_PER_SECOND)
+
+# Requests run here so the calling thread can stop waiting when its request is cancelled
+_http_executor = ThreadPoolExecutor(max_workers=POOL_MAXSIZE, thread_name_prefix="pubchem-http")
+
+_latency: Dict[str, LatencyTracker] = {}
+_latency_lock = threading.Lock()
+_breaker = CircuitBreaker()
+_hedged_requests = 0
+
+
+def get_session() -> requests.Session:
+    """Get the process-wide session, so connections are pooled across calls"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Retries are done by pubchem_get so they can respect request deadlines
+                _session = create_session(retry=False)
+    return _session
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide PubChem rate limiter"""
+    return _rate_limiter
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get the process-wide PubChem circuit breaker"""
+    return _breaker
+
+
+def _endpoint_kind(url: str) -> str:
+    """Group URLs whose latencies are comparable (property lookups vs. structure records)"""
+    if "/property/" in url:
+        return "property"
+    if "/record/" in url:
+        return "record"
+    return "other"
+
+
+def _latency_tracker(kind: str) -> LatencyTracker:
+    with _latency_lock:
+        tracker = _latency.get(kind)
+        if tracker is None:
+            tracker = _latency[kind] = LatencyTracker()
+        return tracker
+
+
+def upstream_stats() -> Dict[str, Any]:
+    """Latency percentiles, hedging and circuit breaker state, for monitoring"""
+    latency = {}
+    with _latency_lock:
+        trackers = dict(_latency)
+    for kind, tracker in trackers.items():
+        latency[kind] = {
+            "samples": len(tracker.samples),
+            "p50": tracker.percentile(50),
+            "p95": tracker.percentile(95),
+            "p99": tracker.percentile(99),
+        }
+    return {
+        "latency": latency,
+        "hedged_requests": _hedged_requests,
+        "circuit_breaker": _breaker.state,
+    }
+
+
+def _wait_first(futures: List[Future], timeout: Optional[float] = None) -> set:
+    """
+    Wait until one of the futures finishes or the timeout passes, returning the finished ones.
+    Gives up (raising) if the current request is cancelled in the meantime.
+    """
+    context = current_context()
+    if context is None:
+        return wait(futures, timeout=timeout, return_when=FIRST_COMPLETED).done
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        context.check()
+        slice_timeout = 0.1 if deadline is None else max(0.0, min(0.1, deadline - time.monotonic()))
+        done = wait(futures, timeout=slice_timeout, return_when=FIRST_COMPLETED).done
+        if done or (deadline is not None and time.monotonic() >= deadline):
+            return done
+
+
+def _timed_request(session: requests.Session, method: str, url: str, timeout: Optional[float],
+                   tracker: LatencyTracker, **kwargs) -> requests.Response:
+    # Runs in a copy of the request context: a copy that starts after cancellation is not sent
+    check_cancelled()
+    start = time.monotonic()
+    send = session.post if method == "POST" else session.get
+    response = send(url, timeout=timeout, **kwargs)
+    if response.status_code < 500:
+        tracker.record(time.monotonic() - start)
+    return response
+
+
+def _hedged_request(session: requests.Session, method: str, url: str, timeout: Optional[float],
+                    tracker: LatencyTracker, hedge: bool, **kwargs) -> requests.Response:
+    """Request url, sending a duplicate if the first attempt is slower than the p95 latency"""
+    global _hedged_requests
+
+    def submit() -> Future:
+        return _http_executor.submit(contextvars.copy_context().run, _timed_request,
+                                     session, method, url, timeout, tracker, **kwargs)
+
+    futures = [submit()]
+    pending = list(futures)
+    try:
+        hedge_delay = tracker.percentile(HEDGE_PERCENTILE) if hedge else None
+        if hedge_delay is not None and not _wait_first(futures, hedge_delay):
+            # Only hedge when it doesn't push us over PubChem's rate limit
+            if _rate_limiter.try_acquire():
+                logger.info(f"Hedging request slower than {hedge_delay:.2f}s: {url}")
+                with _latency_lock:
+                    _hedged_requests += 1
+                futures.append(submit())
+                pending.append(futures[-1])
+
+        while True:
+            done = _wait_first(pending)
+            pending = [f for f in pending if f not in done]
+            for future in done:
+                if future.exception() is not None:
+                    continue
+                response = future.result()
+                # A transient error from one copy shouldn't win over the other copy
+                if response.status_code in RETRY_STATUSES and pending:
+                    continue
+                return response
+            if not pending:
+                # Every copy failed: surface the primary's outcome
+                return futures[0].result()
+    finally:
+        # Copies still queued when a winner is found or the request is cancelled are never sent;
+        # copies already sending end by their timeout, which the request's deadline caps
+        for future in pending:
+            future.cancel()
+
+
+def _retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    delay = BACKOFF_FACTOR * (2 ** attempt)
+    if response is not None and response.status_code == 429:
+        try:
+            delay = max(delay, float(response.headers.get("Retry-After", 0)))
+        except ValueError:
+            pass
+    return delay
+
+
+def pubchem_get(url: str, timeout: Optional[float] = None, hedge: bool = True, **kwargs) -> requests.Response:
+    """
+    Issue a rate-limited GET request to PubChem on the shared session.
+    timeout is an upper bound: the actual timeout adapts to observed latency and is capped
+    by the current request's remaining time budget. Retries connection errors and transient
+    status codes with exponential backoff. Raises CircuitOpenError while PubChem is failing.
+    """
+    return _pubchem_request("GET", url, timeout, hedge, **kwargs)
+
+
+def pubchem_post(url: str, data: Dict[str, str], timeout: Optional[float] = None,
+                 hedge: bool = True, **kwargs) -> requests.Response:
+    """
+    Issue a rate-limited POST request to PubChem, for inputs too long or too awkward to
+    escape in a URL (SMILES, InChI). Behaves like pubchem_get otherwise; PUG REST lookups
+    are reads, so they are retried and hedged the same way.
+    """
+    return _pubchem_request("POST", url, timeout, hedge, data=data, **kwargs)
+
+
+def _pubchem_request(method: str, url: str, timeout: Optional[float], hedge: bool, **kwargs) -> requests.Response:
+    with span(f"pubchem.{method.lower()}", url=url) as current:
+        session = get_session()
+        tracker = _latency_tracker(_endpoint_kind(url))
+        attempt = 0
+        while True:
+            check_cancelled()
+            if not _breaker.allow():
+                raise CircuitOpenError(f"PubChem is unavailable (circuit breaker open), not requesting: {url}")
+            _rate_limiter.acquire()
+            response = None
+            try:
+                response = _hedged_request(session, method, url, request_timeout(tracker.timeout(timeout)), tracker,
+                                           hedge, **kwargs)
+                if response.status_code >= 500:
+                    _breaker.record_failure()
+                else:
+                    _breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                    current.set_attribute("status_code", response.status_code)
+                    current.set_attribute("attempts", attempt + 1)
+                    return response
+                logger.warning(f"PubChem returned {response.status_code}, retrying ({attempt + 1}/{MAX_RETRIES}): {url}")
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                _breaker.record_failure()
+                if attempt >= MAX_RETRIES:
+                    raise
+                logger.warning(f"PubChem request failed, retrying ({attempt + 1}/{MAX_RETRIES}): {e}")
+            request_sleep(_retry_delay(response, attempt))
+            attempt += 1
@@ -0,0 +1,116 @@
+"""
+Process Pool Workers Module
+
+Functions run by the spawned worker processes of the descriptor and substructure pools.
+
+A spawned worker imports the module of every function it is given, so this module only
+imports RDKit and the standard library, and has no import-time side effects: no log
+handlers, files, indexes or pools. Everything the workers need is passed in each task.
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Try to import RDKit, workers are only started when it is available
+try:
+    from rdkit import Chem, RDLogger
+    from rdkit.Chem import Descriptors
+    RDKIT_AVAILABLE = True
+except ImportError:
+    RDKIT_AVAILABLE = False
+
+# Lipinski's rule of five: (descriptor, upper limit)
+LIPINSKI_LIMITS = [("MolWt", 500), ("MolLogP", 5), ("NumHDonors", 5), ("NumHAcceptors", 10)]
+
+# Descriptors computed from other descriptors: name -> (inputs, function of their values)
+DERIVED_DESCRIPTORS: Dict[str, Tuple[List[str], Callable[..., float]]] = {
+    "LipinskiViolations": ([name for name, _ in LIPINSKI_LIMITS],
+                           lambda *values: float(sum(v > limit for v, (_, limit) in zip(values, LIPINSKI_LIMITS)))),
+}
+# Rule of five passed: at most one violation
+DERIVED_DESCRIPTORS["Lipinski"] = (["LipinskiViolations"], lambda violations: float(violations <= 1))
+
+if RDKIT_AVAILABLE:
+    RDKIT_DESCRIPTORS: Dict[str, Callable[[Any], float]] = dict(Descriptors.descList)
+else:
+    RDKIT_DESCRIPTORS = {}
+
+
+def _with_inputs(names: Sequence[str]) -> List[str]:
+    """names preceded by every descriptor a derived one among them is computed from"""
+    ordered: List[str] = []
+
+    def add(name: str) -> None:
+        if name in ordered:
+            return
+        for dependency in DERIVED_DESCRIPTORS.get(name, ([], None))[0]:
+            add(dependency)
+        ordered.append(name)
+
+    for name in names:
+        add(name)
+    return ordered
+
+
+def compute_values(smiles: str, names: Sequence[str]) -> Optional[Dict[str, float]]:
+    """Descriptor values of a SMILES string, or None if it cannot be parsed"""
+    mol = Chem.MolFromSmiles(smiles) if smiles else None
+    if mol is None:
+        return None
+    values: Dict[str, float] = {}
+    for name in _with_inputs(names):
+        try:
+            if name in DERIVED_DESCRIPTORS:
+                inputs, function = DERIVED_DESCRIPTORS[name]
+                values[name] = function(*(values[i] for i in inputs))
+            else:
+                values[name] = float(RDKIT_DESCRIPTORS[name](mol))
+        except Exception:
+            values[name] = math.nan
+    return values
+
+
+def compute_chunk(smiles: List[str], names: List[str]) -> List[Optional[Dict[str, float]]]:
+    """Worker: descriptor values of each SMILES string"""
+    RDLogger.DisableLog("rdApp.*")
+    return [compute_values(s, names) for s in smiles]
+
+
+def parse_query(query: str, query_type: Optional[str] = None) -> Optional[Any]:
+    """
+    Parse a substructure query. SMILES is tried first unless query_type is 'smarts', so
+    aromatic rings written in Kekulé form still match; SMARTS-only syntax falls back to SMARTS.
+    """
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        if query_type != "smarts":
+            mol = Chem.MolFromSmiles(query)
+            if mol is not None or query_type == "smiles":
+                return mol
+        return Chem.MolFromSmarts(query)
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+
+
+# Parsed query of the current task, reused by the following tasks of the same search
+_worker_query: Dict[str, Any] = {}
+
+
+def match_chunk(query: str, query_type: Optional[str], compounds: List[Tuple[int, str]]) -> List[int]:
+    """Worker: CIDs of the compounds containing the query"""
+    key = f"{query_type}:{query}"
+    pattern = _worker_query.get(key)
+    if pattern is None:
+        _worker_query.clear()
+        pattern = _worker_query[key] = parse_query(query, query_type)
+
+    matches = []
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        for cid, smiles in compounds:
+            mol = Chem.MolFromSmiles(smiles)
+            if mol is not None and mol.HasSubstructMatch(pattern):
+                matches.append(cid)
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+    return matches
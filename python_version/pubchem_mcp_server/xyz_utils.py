@@ -10,7 +10,10 @@ import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 
-import requests
+from .context import RequestCancelled, check_cancelled, current_context
+from .structure_store import StructureStore
+from .tracing import span
+from .upstream import PUBCHEM_REST_URL, pubchem_get
 
 # Try to import RDKit, use None if not available
 try:
@@ -38,6 +41,9 @@ try:
 except Exception as e:
     logger.error(f"Unable to create cache directory: {e}")
 
+# Compressed XYZ/SDF files in the cache directory
+structure_cache = StructureStore(CACHE_DIR)
+
 
 class Atom:
     """Atom class, represents an atom in 3D space"""
@@ -72,16 +78,18 @@ class XYZData:
 
 def download_sdf_from_pubchem(cid: str) -> Optional[str]:
     """Download SDF format 3D structure from PubChem"""
-    url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/SDF/?record_type=3d&response_type=display&display_type=sdf"
+    url = f"{PUBCHEM_REST_URL}/compound/cid/{cid}/record/SDF/?record_type=3d&response_type=display&display_type=sdf"
     logger.info(f"Downloading SDF from: {url}")
     try:
-        response = requests.get(url, timeout=60)
+        response = pubchem_get(url, timeout=60)
         if response.status_code == 200 and response.text:
             logger.info(f"Successfully downloaded SDF for CID: {cid} (Length: {len(response.text)})")
             return response.text
         else:
             logger.error(f"Failed to download SDF, CID: {cid}. Status code: {response.status_code}, Content empty: {not response.text}")
             return None
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error downloading SDF, CID: {cid}. Error: {e}", exc_info=True)
         return None
@@ -92,6 +100,8 @@ def generate_3d_from_smiles(smiles: str) -> Optional[Any]:
     if not RDKIT_AVAILABLE:
         logger.error("RDKit not installed, cannot generate 3D structure from SMILES")
         return None
+    # Don't start embedding for a request that was cancelled or is out of time
+    check_cancelled()
     logger.info(f"Attempting to generate 3D from SMILES: {smiles}")
     try:
         mol = Chem.MolFromSmiles(smiles)
@@ -99,16 +109,29 @@ def generate_3d_from_smiles(smiles: str) -> Optional[Any]:
             logger.warning("RDKit MolFromSmiles returned None.")
             return None
         mol_with_h = Chem.AddHs(mol)
-        embed_result = AllChem.EmbedMolecule(mol_with_h, randomSeed=42)
+        context = current_context()
+        remaining = context.remaining() if context else None
+        if remaining is not None and hasattr(AllChem, 'ETKDGv3'):
+            # Bound embedding time by the request's remaining budget
+            params = AllChem.ETKDGv3()
+            params.randomSeed = 42
+            if hasattr(params, 'timeout'):
+                params.timeout = max(1, int(remaining))
+            embed_result = AllChem.EmbedMolecule(mol_with_h, params)
+        else:
+            embed_result = AllChem.EmbedMolecule(mol_with_h, randomSeed=42)
         if embed_result < 0: # EmbedMolecule returns -1 on failure
              logger.warning("RDKit EmbedMolecule failed.")
              return None
+        check_cancelled()
         optimize_result = AllChem.MMFFOptimizeMolecule(mol_with_h)
         if optimize_result != 0: # MMFFOptimizeMolecule returns 0 on success, 1 on failure
             logger.warning("RDKit MMFFOptimizeMolecule failed.")
             # Continue anyway, maybe the unoptimized structure is usable
         logger.info("Successfully generated 3D structure from SMILES.")
         return mol_with_h
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error generating 3D structure from SMILES: {e}", exc_info=True)
         return None
@@ -234,19 +257,21 @@ def get_xyz_structure(sdf_content: Optional[str], cid: str, smiles: str, compoun
     """
     logger.info(f"Getting XYZ structure: cid={cid}, sdf_provided={sdf_content is not None}")
     xyz_string = None
-    cache_file = CACHE_DIR / f"{cid}.xyz"
+    cache_name = f"{cid}.xyz"
 
     # --- Primary Path: Process provided SDF content ---
     if sdf_content:
         logger.info("Processing provided SDF content...")
         if RDKIT_AVAILABLE:
-            mol = sdf_to_mol(sdf_content)
-            if mol:
-                xyz_string = mol_to_xyz(mol, compound_info)
+            with span("rdkit.sdf_to_xyz", source="provided"):
+                mol = sdf_to_mol(sdf_content)
+                if mol:
+                    xyz_string = mol_to_xyz(mol, compound_info)
         # If RDKit failed or not available, try custom parser
         if not xyz_string:
             logger.info("RDKit failed or unavailable for provided SDF, trying custom parser...")
-            atoms = parse_sdf(sdf_content)
+            with span("xyz.parse_sdf", source="provided"):
+                atoms = parse_sdf(sdf_content)
             if atoms:
                 info_line = ' '.join(f"{k}={v}" for k, v in compound_info.items() if v)
                 xyz_data = XYZData(len(atoms), info_line, atoms)
@@ -257,10 +282,10 @@ def get_xyz_structure(sdf_content: Optional[str], cid: str, smiles: str, compoun
             logger.info("Successfully generated XYZ from provided SDF.")
             # Save to cache even if SDF was provided externally
             try:
-                cache_file.write_text(xyz_string, encoding='utf-8')
-                logger.info(f"Saved XYZ (from provided SDF) to cache: {cache_file}")
+                structure_cache.write(cache_name, xyz_string)
+                logger.info(f"Saved XYZ (from provided SDF) to cache: {cache_name}")
             except Exception as e:
-                logger.error(f"Error writing cache file {cache_file}: {e}")
+                logger.error(f"Error writing cache file {cache_name}: {e}")
             return xyz_string
         else:
             logger.warning("Failed to generate XYZ from provided SDF content.")
@@ -270,26 +295,30 @@ def get_xyz_structure(sdf_content: Optional[str], cid: str, smiles: str, compoun
     logger.info("Attempting fallback methods (cache check, download, SMILES generation)...")
 
     # Fallback 1: Check cache
-    if cache_file.exists():
+    if structure_cache.exists(cache_name):
         try:
-            logger.info(f"Reading XYZ structure from cache: {cache_file}")
-            return cache_file.read_text(encoding='utf-8')
+            logger.info(f"Reading XYZ structure from cache: {cache_name}")
+            return structure_cache.read(cache_name)
         except Exception as e:
-            logger.error(f"Error reading cache file {cache_file}: {e}")
+            logger.error(f"Error reading cache file {cache_name}: {e}")
 
     # Fallback 2: Download SDF and process it (if not provided initially)
+    check_cancelled()
     if not sdf_content: # Only download if SDF wasn't provided
-        downloaded_sdf = download_sdf_from_pubchem(cid)
+        with span("sdf.download", cid=cid):
+            downloaded_sdf = download_sdf_from_pubchem(cid)
         if downloaded_sdf:
             logger.info("Processing downloaded SDF...")
             if RDKIT_AVAILABLE:
-                mol = sdf_to_mol(downloaded_sdf)
-                if mol:
-                    xyz_string = mol_to_xyz(mol, compound_info)
+                with span("rdkit.sdf_to_xyz", source="downloaded"):
+                    mol = sdf_to_mol(downloaded_sdf)
+                    if mol:
+                        xyz_string = mol_to_xyz(mol, compound_info)
             # If RDKit failed or not available, try custom parser
             if not xyz_string:
                 logger.info("RDKit failed or unavailable for downloaded SDF, trying custom parser...")
-                atoms = parse_sdf(downloaded_sdf)
+                with span("xyz.parse_sdf", source="downloaded"):
+                    atoms = parse_sdf(downloaded_sdf)
                 if atoms:
                     info_line = ' '.join(f"{k}={v}" for k, v in compound_info.items() if v)
                     xyz_data = XYZData(len(atoms), info_line, atoms)
@@ -300,10 +329,10 @@ def get_xyz_structure(sdf_content: Optional[str], cid: str, smiles: str, compoun
                  logger.info("Successfully generated XYZ from downloaded SDF.")
                  # Save to cache
                  try:
-                     cache_file.write_text(xyz_string, encoding='utf-8')
-                     logger.info(f"Saved XYZ (from downloaded SDF) to cache: {cache_file}")
+                     structure_cache.write(cache_name, xyz_string)
+                     logger.info(f"Saved XYZ (from downloaded SDF) to cache: {cache_name}")
                  except Exception as e:
-                     logger.error(f"Error writing cache file {cache_file}: {e}")
+                     logger.error(f"Error writing cache file {cache_name}: {e}")
                  return xyz_string
             else:
                  logger.warning("Failed to generate XYZ from downloaded SDF.")
@@ -313,17 +342,18 @@ def get_xyz_structure(sdf_content: Optional[str], cid: str, smiles: str, compoun
     # Fallback 3: Generate from SMILES using RDKit (if all SDF methods failed)
     if RDKIT_AVAILABLE and smiles:
         logger.info(f"Attempting to generate 3D structure from SMILES as final fallback: {smiles}")
-        mol = generate_3d_from_smiles(smiles)
+        with span("rdkit.smiles_to_3d", smiles=smiles):
+            mol = generate_3d_from_smiles(smiles)
+            xyz_string = mol_to_xyz(mol, compound_info) if mol else None
         if mol:
-            xyz_string = mol_to_xyz(mol, compound_info)
             if xyz_string:
                 logger.info("Successfully generated XYZ from SMILES.")
                 # Save to cache
                 try:
-                    cache_file.write_text(xyz_string, encoding='utf-8')
-                    logger.info(f"Saved XYZ (from SMILES) to cache: {cache_file}")
+                    structure_cache.write(cache_name, xyz_string)
+                    logger.info(f"Saved XYZ (from SMILES) to cache: {cache_name}")
                 except Exception as e:
-                    logger.error(f"Error writing cache file {cache_file}: {e}")
+                    logger.error(f"Error writing cache file {cache_name}: {e}")
                 return xyz_string
             else:
                 logger.warning("mol_to_xyz returned None (from SMILES).")
@@ -16,6 +16,10 @@ setup(
     ],
     extras_require={
         "rdkit": ["rdkit>=2022.9.1"],
+        "http": ["aiohttp>=3.8"],
+        "similarity": ["rdkit>=2022.9.1", "numpy>=1.20"],
+        "compression": ["zstandard>=0.20"],
+        "tracing": ["opentelemetry-sdk>=1.20"],
     },
     entry_points={
         "console_scripts": [
@@ -0,0 +1,13 @@
+"""
+Shared test setup: the server and its modules keep caches, indexes and logs under
+~/.pubchem-mcp, so tests run with HOME pointing at a scratch directory.
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ["HOME"] = tempfile.mkdtemp(prefix="pubchem-mcp-test-")
+
+# mcp_server.py is a script next to the package, not part of it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
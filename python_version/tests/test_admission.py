@@ -0,0 +1,35 @@
+"""Tests that batch calls are admitted as a class of their own and charge each compound"""
+
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+import mcp_server  # noqa: E402
+from pubchem_mcp_server.admission import BATCH, LOOKUP, STRUCTURE, AdmissionController  # noqa: E402
+
+
+def test_batch_calls_have_their_own_class():
+    assert mcp_server.tool_class("get_pubchem_data_batch", {"queries": ["2244"]}) == BATCH
+    assert mcp_server.tool_class("get_pubchem_data_batch", {"format": "XYZ", "include_3d": True}) == BATCH
+    assert mcp_server.tool_class("get_pubchem_data", {"format": "XYZ", "include_3d": True}) == STRUCTURE
+
+
+def test_batch_compounds_count_against_their_class(monkeypatch):
+    # One lookup at a time and no queue: compounds beyond the first are shed
+    admission = AdmissionController({LOOKUP: (1, 0), STRUCTURE: (1, 0), BATCH: (1, 0)})
+    monkeypatch.setattr(mcp_server, "_admission", admission)
+    monkeypatch.setattr(mcp_server, "prefetch_properties", lambda cids, properties: None)
+
+    def slow_get_pubchem_data(query, format, include_3d, progress, properties):
+        time.sleep(0.2)
+        return "{}"
+
+    monkeypatch.setattr(mcp_server, "get_pubchem_data", slow_get_pubchem_data)
+
+    results = mcp_server.get_pubchem_data_batch(["1", "2", "3"])
+
+    assert sorted(entry["isError"] for entry in results) == [False, True, True]
+    assert admission.stats()[LOOKUP]["admitted"] == 1
+    assert admission.stats()[LOOKUP]["shed"] == 2
@@ -0,0 +1,59 @@
+"""Tests for appends to files shared by several processes"""
+
+import os
+import subprocess
+import sys
+
+from pubchem_mcp_server.append_file import complete_lines, locked_append, open_append
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Appends per writer process, each far larger than one write() of a buffered file
+APPENDS = 50
+LINES_PER_APPEND = 2000
+
+WRITER = """
+import sys
+from pubchem_mcp_server.append_file import locked_append, open_append
+name, path = sys.argv[1], sys.argv[2]
+f = open_append(path)
+for i in range({appends}):
+    locked_append(f, "".join(f"{{name}}\\t{{i}}\\t{{j}}\\n" for j in range({lines})).encode("utf-8"))
+""".format(appends=APPENDS, lines=LINES_PER_APPEND)
+
+
+def test_appends_from_several_processes_do_not_interleave(tmp_path):
+    path = str(tmp_path / "index.tsv")
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([SERVER_DIR] + sys.path))
+    writers = [subprocess.Popen([sys.executable, "-c", WRITER, name, path], env=environment)
+               for name in ("a", "b", "c")]
+    assert [writer.wait(timeout=120) for writer in writers] == [0, 0, 0]
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3 * APPENDS * LINES_PER_APPEND
+    # Each append is one unbroken run of lines
+    for start in range(0, len(lines), LINES_PER_APPEND):
+        name, i, _ = lines[start].split("\t")
+        assert lines[start:start + LINES_PER_APPEND] == [f"{name}\t{i}\t{j}" for j in range(LINES_PER_APPEND)]
+
+
+def test_partial_line_is_skipped_and_cut_off(tmp_path):
+    path = tmp_path / "index.tsv"
+    path.write_bytes(b"1\tC\n2\tCC(=")
+
+    with open(path, encoding="utf-8") as f:
+        assert list(complete_lines(f)) == ["1\tC\n"]
+    locked_append(open_append(str(path)), b"3\tCCC\n")
+    assert path.read_bytes() == b"1\tC\n3\tCCC\n"
+
+
+def test_partial_binary_record_is_cut_off_after_the_header(tmp_path):
+    path = tmp_path / "index.bin"
+    f = open_append(str(path))
+    locked_append(f, b"AAAA", header=b"HDR", record_size=4)
+    with open(path, "ab") as crashed:
+        crashed.write(b"BB")
+    locked_append(f, b"CCCC", header=b"HDR", record_size=4)
+
+    assert path.read_bytes() == b"HDRAAAACCCC"
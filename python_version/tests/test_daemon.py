@@ -0,0 +1,64 @@
+"""
+Tests that the daemon sends the responses of requests still in flight when a shim's input ends
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from pubchem_mcp_server.context import request_scope
+from pubchem_mcp_server.daemon import _DaemonServer
+
+# How long the slow request handler works before responding, in seconds
+DELAY = 0.3
+
+
+def slow_handle_line(line, send, inflight):
+    """Answers each line with its text after DELAY, from a worker thread like dispatch_line"""
+    context = inflight.start(line.strip())
+
+    def process():
+        try:
+            with request_scope(context):
+                context.sleep(DELAY)
+            send(f"done {line.strip()}")
+        except Exception as e:
+            send(f"{type(e).__name__} {line.strip()}")
+        finally:
+            inflight.finish(line.strip())
+            inflight.done()
+
+    inflight.dispatched()
+    threading.Thread(target=process, daemon=True).start()
+
+
+@pytest.fixture
+def daemon():
+    # Unix socket paths are limited to about 100 characters
+    directory = tempfile.mkdtemp(prefix="pubchem-mcp-", dir="/tmp")
+    socket_path = os.path.join(directory, "daemon.sock")
+    server = _DaemonServer(socket_path, slow_handle_line)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(directory)
+
+
+def test_responses_drain_after_input_ends(daemon):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(daemon)
+    sock.sendall(b"first\nsecond\n")
+    sock.shutdown(socket.SHUT_WR)
+
+    sock.settimeout(10)
+    with sock.makefile("rb") as responses:
+        lines = sorted(line.decode("utf-8").strip() for line in responses)
+    sock.close()
+
+    assert lines == ["done first", "done second"]
+
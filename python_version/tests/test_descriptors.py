@@ -0,0 +1,28 @@
+"""Tests for descriptor batches computed on the shared process pool"""
+
+import pytest
+
+pytest.importorskip("rdkit")
+
+from pubchem_mcp_server import descriptors  # noqa: E402
+from pubchem_mcp_server.context import RequestCancelled, RequestContext, request_scope  # noqa: E402
+
+# Distinct alkanes and alcohols, enough for a batch to go to the pool
+MOLECULES = [(None, "C" * n + "O" * (n % 3)) for n in range(1, descriptors.PROCESS_POOL_MIN_MOLECULES + 2)]
+
+
+def test_large_batches_reuse_one_pool():
+    first = descriptors.compute_batch(MOLECULES, ["MolWt"], workers=2)
+    pool = descriptors.get_process_pool()
+    second = descriptors.compute_batch(MOLECULES, ["MolWt"], workers=2)
+
+    assert descriptors.get_process_pool() is pool
+    assert first == second
+    assert first[0] == pytest.approx({"MolWt": 32.042}, rel=1e-3)
+
+
+def test_cancelled_request_stops_the_batch():
+    context = RequestContext()
+    context.cancel("Client disconnected")
+    with request_scope(context), pytest.raises(RequestCancelled):
+        descriptors.compute_batch(MOLECULES, ["TPSA"], workers=2)
@@ -0,0 +1,24 @@
+"""Tests for the vectorized geometry analyses"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("requests")
+from pubchem_mcp_server.geometry import analyze, distance_matrix, max_distance  # noqa: E402
+
+
+@pytest.mark.parametrize("atoms", [2, 3, 50, 700])
+@pytest.mark.parametrize("shape", ["blob", "rod", "shell"])
+def test_max_distance_matches_distance_matrix(atoms, shape):
+    coordinates = np.random.default_rng(atoms).normal(size=(atoms, 3))
+    if shape == "rod":
+        coordinates[:, 0] *= 20
+    elif shape == "shell":
+        # Every atom equally far from the centroid: nothing can be pruned
+        coordinates /= np.linalg.norm(coordinates, axis=1)[:, None]
+    assert max_distance(coordinates) == pytest.approx(distance_matrix(coordinates).max())
+
+
+def test_summary_of_a_single_atom():
+    result = analyze(["C"], np.zeros((1, 3)), ["summary"])
+    assert result["max_distance"] == 0.0
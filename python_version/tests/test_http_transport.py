@@ -0,0 +1,100 @@
+"""Tests for HTTP session bookkeeping"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from pubchem_mcp_server import http_transport  # noqa: E402
+from pubchem_mcp_server.http_transport import SESSION_HEADER, HttpTransport  # noqa: E402
+
+INITIALIZE = {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}}
+PING = {"jsonrpc": "2.0", "id": 2, "method": "ping"}
+
+
+def echo(message, notify, inflight):
+    return {"jsonrpc": "2.0", "id": message.get("id"), "result": {}}
+
+
+def run_with_client(transport, scenario):
+    async def run():
+        async with TestClient(TestServer(transport.create_app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+async def initialize(client):
+    response = await client.post("/mcp", json=INITIALIZE)
+    assert response.status == 200
+    return response.headers[SESSION_HEADER]
+
+
+def test_sessions_beyond_the_cap_evict_the_least_recently_used(monkeypatch):
+    monkeypatch.setattr(http_transport, "MAX_SESSIONS", 3)
+    transport = HttpTransport(echo)
+
+    async def scenario(client):
+        first = await initialize(client)
+        others = [await initialize(client) for _ in range(2)]
+        # Using the first session makes the second one the least recently used
+        assert (await client.post("/mcp", json=PING, headers={SESSION_HEADER: first})).status == 200
+        await initialize(client)
+        return first, others
+
+    first, others = run_with_client(transport, scenario)
+    assert len(transport.sessions) == 3 + 1
+    assert first in transport.sessions
+    assert others[0] not in transport.sessions
+
+
+def test_idle_sessions_expire(monkeypatch):
+    monkeypatch.setattr(http_transport, "SESSION_IDLE_TIMEOUT", 0.05)
+    transport = HttpTransport(echo)
+
+    async def scenario(client):
+        idle = await initialize(client)
+        await asyncio.sleep(0.1)
+        await initialize(client)
+        response = await client.post("/mcp", json=PING, headers={SESSION_HEADER: idle})
+        return response.status
+
+    # The client of an expired session is told to initialize again
+    assert run_with_client(transport, scenario) == 404
+    assert len(transport.sessions) == 1 + 1
+
+
+def test_sessions_with_running_requests_do_not_expire(monkeypatch):
+    monkeypatch.setattr(http_transport, "SESSION_IDLE_TIMEOUT", 0.05)
+    transport = HttpTransport(echo)
+
+    async def scenario(client):
+        busy = await initialize(client)
+        transport.sessions[busy].start("long-request")
+        await asyncio.sleep(0.1)
+        await initialize(client)
+        return busy
+
+    busy = run_with_client(transport, scenario)
+    assert busy in transport.sessions
+
+
+def test_session_evicted_while_the_body_is_read():
+    transport = HttpTransport(echo)
+
+    async def scenario(client):
+        session = await initialize(client)
+
+        async def body():
+            yield b'{"jsonrpc": "2.0", "id": 2, '
+            await asyncio.sleep(0.1)
+            transport._drop_session(session, "Session evicted")
+            yield b'"method": "ping"}'
+
+        response = await client.post("/mcp", data=body(), headers={SESSION_HEADER: session,
+                                                                   "Content-Type": "application/json"})
+        return response.status
+
+    # The request already in progress is still answered
+    assert run_with_client(transport, scenario) == 200
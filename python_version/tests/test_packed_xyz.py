@@ -0,0 +1,65 @@
+"""Tests for packed XYZ output of get_pubchem_data's 3D structures"""
+
+import pytest
+
+pytest.importorskip("requests")
+
+import mcp_server  # noqa: E402
+from pubchem_mcp_server.packed_xyz import packed_to_xyz, xyz_to_packed  # noqa: E402
+
+# Water, as PubChem's 3D SDF records lay it out
+WATER_SDF = """962
+  -OEChem-
+
+  3  2  0     0  0  0  0  0  0999 V2000
+    0.0000    0.0000    0.0000 O   0  0  0  0  0  0  0  0  0  0  0  0
+    0.2774    0.8929    0.2544 H   0  0  0  0  0  0  0  0  0  0  0  0
+    0.6068   -0.2383   -0.7169 H   0  0  0  0  0  0  0  0  0  0  0  0
+  1  2  1  0  0  0  0
+  1  3  1  0  0  0  0
+M  END
+$$$$
+"""
+
+COMPOUND_INFO = {'id': '962', 'name': 'oxidane', 'formula': 'H2O', 'smiles': 'O', 'inchikey': ''}
+
+
+class FakeResponse:
+    status_code = 200
+    text = WATER_SDF
+
+
+class FakeStore:
+    def __init__(self):
+        self.records = {}
+
+    def write(self, name, text):
+        self.records[name] = text
+
+    def exists(self, name):
+        return name in self.records
+
+    def read(self, name):
+        return self.records.get(name)
+
+
+def test_packed_conversion_matches_the_text_route():
+    packed = mcp_server.convert_sdf_to_packed(WATER_SDF, COMPOUND_INFO)
+    assert packed == xyz_to_packed(mcp_server.convert_sdf_to_xyz(WATER_SDF, COMPOUND_INFO))
+
+
+def test_packed_structure_is_built_and_cached_without_xyz_text(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(mcp_server, "structure_cache", store)
+    monkeypatch.setattr(mcp_server, "pubchem_get", lambda url, timeout: FakeResponse())
+
+    def no_text(*args):
+        raise AssertionError("XYZ text built for a packed request")
+
+    monkeypatch.setattr(mcp_server, "convert_sdf_to_xyz", no_text)
+    monkeypatch.setattr(mcp_server, "xyz_to_packed", no_text)
+
+    packed = mcp_server.get_xyz_structure("962", COMPOUND_INFO, packed=True)
+
+    assert store.records == {"962.packed": packed}
+    assert packed_to_xyz(packed).splitlines()[2] == "O 0.000000 0.000000 0.000000"
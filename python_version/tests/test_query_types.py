@@ -0,0 +1,104 @@
+"""Tests for query type detection in get_pubchem_data"""
+
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+import requests  # noqa: E402
+
+import mcp_server  # noqa: E402
+from pubchem_mcp_server.smiles_index import RDKIT_AVAILABLE  # noqa: E402
+
+
+class FakeFetch:
+    """Stands in for fetch_properties, answering only the given name and SMILES lookups"""
+
+    def __init__(self, names=None, smiles=None):
+        self.names = names or {}
+        self.smiles = smiles or {}
+        self.calls = []
+
+    def __call__(self, identifier_path, properties, conditional_key=None, post_data=None):
+        self.calls.append((identifier_path, post_data))
+        kind, _, identifier = identifier_path.partition("/")
+        if kind == "smiles":
+            cid = self.smiles.get(post_data["smiles"])
+        elif kind == "name":
+            cid = self.names.get(identifier)
+        else:
+            cid = identifier if kind == "cid" else None
+        if cid is None:
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError("404 Not Found", response=response)
+        return [dict({prop: f"{prop}-{cid}" for prop in properties}, CID=cid)], {}
+
+
+@pytest.mark.parametrize("query", ["CO", "NO", "Br", "aspirin"])
+def test_ambiguous_short_strings_are_names(query):
+    assert mcp_server.detect_query_type(query) == "name"
+
+
+@pytest.mark.parametrize("query, query_type", [
+    ("2244", "cid"),
+    ("BSYNRYMUTXBXSQ-UHFFFAOYSA-N", "inchikey"),
+    ("InChI=1S/CH4O/c1-2/h2H,1H3", "inchi"),
+    ("CC(=O)Oc1ccccc1C(=O)O", "smiles"),
+])
+def test_unambiguous_queries(query, query_type):
+    assert mcp_server.detect_query_type(query) == query_type
+
+
+def test_name_lookup_comes_first(monkeypatch):
+    fetch = FakeFetch(names={"CO": "281"}, smiles={"CO": "887"})
+    monkeypatch.setattr(mcp_server, "fetch_properties", fetch)
+    result = json.loads(mcp_server.get_pubchem_data("CO"))
+    assert result["CID"] == "281"
+    assert fetch.calls == [("name/CO", None)]
+
+
+def test_explicit_smiles_query_type(monkeypatch):
+    fetch = FakeFetch(names={"NO": "145068"}, smiles={"NO": "787"})
+    monkeypatch.setattr(mcp_server, "fetch_properties", fetch)
+    result = json.loads(mcp_server.get_pubchem_data("NO", query_type="smiles"))
+    assert result["CID"] == "787"
+    assert [path for path, _ in fetch.calls] == ["smiles"]
+
+
+@pytest.mark.skipif(not RDKIT_AVAILABLE, reason="requires RDKit")
+def test_unknown_name_falls_back_to_smiles(monkeypatch):
+    fetch = FakeFetch(smiles={"CCCO": "1031"})
+    monkeypatch.setattr(mcp_server, "fetch_properties", fetch)
+    result = json.loads(mcp_server.get_pubchem_data("CCCO"))
+    assert result["CID"] == "1031"
+    assert [path for path, _ in fetch.calls] == ["name/CCCO", "smiles"]
+
+
+def test_unknown_name_without_smiles_fallback(monkeypatch):
+    fetch = FakeFetch()
+    monkeypatch.setattr(mcp_server, "fetch_properties", fetch)
+    assert mcp_server.get_pubchem_data("no such compound").startswith("Error:")
+    assert len(fetch.calls) == 1
+
+
+@pytest.mark.parametrize("query", ["2244", " 2244 ", "CID 2244", "cid:2244", "CID2244"])
+def test_cid_queries_are_normalized(query):
+    assert mcp_server.detect_query_type(query) == "cid"
+    assert mcp_server.parse_cid(query) == "2244"
+
+
+def test_similarity_search_accepts_prefixed_cids(monkeypatch):
+    if not mcp_server.similarity_available():
+        pytest.skip("Similarity search requires RDKit and NumPy")
+    looked_up = []
+    monkeypatch.setattr(mcp_server._similarity_index, "get", lambda cid: looked_up.append(cid))
+    monkeypatch.setattr(mcp_server, "get_pubchem_data",
+                        lambda query, properties: json.dumps({"CanonicalSMILES": "CC(=O)OC1=CC=CC=C1C(=O)O"}))
+    monkeypatch.setattr(mcp_server._similarity_index, "search", lambda fp, top_k, threshold: [])
+
+    result = json.loads(mcp_server.similarity_search("CID 2244"))
+
+    assert looked_up == [2244]
+    assert result["results"] == []
+    assert mcp_server.similarity_search("CID two", query_type="cid") == "Error: Invalid CID: CID two"
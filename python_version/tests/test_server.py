@@ -0,0 +1,108 @@
+"""
+Tests that PubChemServer's tool calls run off the event loop, so concurrent calls overlap.
+The MCP SDK and the server's data modules are replaced with stubs.
+"""
+
+import asyncio
+import importlib
+import sys
+import time
+import types
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("requests")
+
+# Delay of the blocking get_pubchem_data stub, in seconds
+DELAY = 0.5
+
+
+class StubServer:
+    """Stand-in for mcp.server.Server"""
+
+    def __init__(self, *args):
+        self.handlers = {}
+
+    def set_request_handler(self, request_type, handler):
+        self.handlers[request_type] = handler
+
+
+def stub_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+@pytest.fixture
+def server_module(monkeypatch):
+    stubs = {
+        "mcp": stub_module("mcp"),
+        "mcp.server": stub_module("mcp.server", Server=StubServer),
+        "mcp.server.stdio": stub_module("mcp.server.stdio", StdioServerTransport=object),
+        "mcp.types": stub_module("mcp.types", CallToolRequest="CallToolRequest", ListToolsRequest="ListToolsRequest",
+                                 McpError=Exception, INVALID_REQUEST=-32600, METHOD_NOT_FOUND=-32601,
+                                 INVALID_PARAMS=-32602),
+        "pubchem_mcp_server.pubchem_api": stub_module("pubchem_mcp_server.pubchem_api",
+                                                      get_pubchem_data=lambda *args: ""),
+        "pubchem_mcp_server.async_processor": stub_module("pubchem_mcp_server.async_processor",
+                                                          get_processor=lambda: None),
+    }
+    for name, module in stubs.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "pubchem_mcp_server.server", raising=False)
+    module = importlib.import_module("pubchem_mcp_server.server")
+    yield module
+    sys.modules.pop("pubchem_mcp_server.server", None)
+
+
+@pytest.fixture
+def server(server_module):
+    instance = server_module.PubChemServer()
+    yield instance
+    instance.executor.shutdown()
+    instance.processes.shutdown()
+
+
+def call(name, **arguments):
+    return SimpleNamespace(params=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_concurrent_tool_calls_overlap(server_module, server, monkeypatch):
+    def slow_get_pubchem_data(query, format, include_3d):
+        time.sleep(DELAY)
+        return f"{query} as {format}"
+
+    monkeypatch.setattr(server_module, "get_pubchem_data", slow_get_pubchem_data)
+
+    async def call_twice():
+        return await asyncio.gather(server.handle_call_tool(call("get_pubchem_data", query="aspirin")),
+                                    server.handle_call_tool(call("get_pubchem_data", query="caffeine")))
+
+    start = time.perf_counter()
+    results = asyncio.run(call_twice())
+    elapsed = time.perf_counter() - start
+
+    assert [r["content"][0]["text"] for r in results] == ["aspirin as JSON", "caffeine as JSON"]
+    assert elapsed < 2 * DELAY
+
+
+def test_3d_structures_are_generated_on_worker_processes(server_module, server, monkeypatch):
+    used = []
+
+    async def run_in_process(func, *args):
+        used.append("process")
+        return func(*args)
+
+    async def run_blocking(func, *args):
+        used.append("thread")
+        return func(*args)
+
+    monkeypatch.setattr(server_module, "get_pubchem_data", lambda query, format, include_3d: "xyz")
+    monkeypatch.setattr(server, "run_in_process", run_in_process)
+    monkeypatch.setattr(server, "run_blocking", run_blocking)
+
+    asyncio.run(server.handle_call_tool(call("get_pubchem_data", query="2244", format="XYZ", include_3d=True)))
+    asyncio.run(server.handle_call_tool(call("get_pubchem_data", query="2244")))
+
+    assert used == ["process", "thread"]
@@ -0,0 +1,38 @@
+"""Tests for SMILES query detection and the canonical SMILES index"""
+
+import pytest
+
+pytest.importorskip("requests")
+from pubchem_mcp_server.smiles_index import RDKIT_AVAILABLE, SmilesIndex, looks_like_smiles  # noqa: E402
+
+requires_rdkit = pytest.mark.skipif(not RDKIT_AVAILABLE, reason="requires RDKit")
+
+# Names that are also valid SMILES: carbon monoxide, nitric oxide, bromine
+AMBIGUOUS_NAMES = ["CO", "NO", "Br", "CCO", "CN"]
+
+
+@pytest.mark.parametrize("query", AMBIGUOUS_NAMES + ["aspirin", "caffeine", "vitamin C", ""])
+def test_names_are_not_smiles(query):
+    assert not looks_like_smiles(query)
+
+
+@pytest.mark.parametrize("query", ["CC(=O)Oc1ccccc1C(=O)O", "C1CCCCC1", "C[C@H](N)C(=O)O", "C#N", "[Na+].[Cl-]"])
+def test_smiles_syntax_is_detected(query):
+    assert looks_like_smiles(query)
+
+
+@requires_rdkit
+def test_unparseable_smiles_syntax_is_a_name():
+    assert not looks_like_smiles("(R)-ibuprofen")
+
+
+@requires_rdkit
+def test_index_is_keyed_by_canonical_smiles(tmp_path):
+    path = tmp_path / "smiles.tsv"
+    index = SmilesIndex(str(path))
+    index.add_smiles_many([(702, "OCC"), (5950, "C[C@H](N)C(=O)O"), (602, "CC(N)C(=O)O")])
+    assert index.get("CCO") == 702
+    # Stereoisomers are distinct keys
+    assert index.get("C[C@H](N)C(=O)O") == 5950
+    assert index.get("CC(N)C(=O)O") == 602
+    assert SmilesIndex(str(path)).get("CCO") == 702
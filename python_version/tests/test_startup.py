@@ -0,0 +1,40 @@
+"""
+Tests that importing the server has no side effects: spawned process pool workers
+re-import mcp_server.py (as __mp_main__) and import the workers module
+"""
+
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, home, **env):
+    environment = dict(os.environ, HOME=str(home), PYTHONPATH=os.pathsep.join([SERVER_DIR] + sys.path), **env)
+    return subprocess.run([sys.executable, "-c", code], cwd=SERVER_DIR, env=environment,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_workers_module_imports_only_what_workers_need(tmp_path):
+    result = run_python("import sys, pubchem_mcp_server.workers; "
+                        "print(sorted(m for m in sys.modules if m.startswith(('pubchem_mcp_server', 'requests'))))",
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "['pubchem_mcp_server', 'pubchem_mcp_server.workers']"
+
+
+def test_reimporting_the_server_script_has_no_side_effects(tmp_path):
+    pytest.importorskip("requests")
+    from pubchem_mcp_server.compound_table import build_compound_table
+
+    table = tmp_path / "compounds.table"
+    build_compound_table(str(table), ["MolecularFormula"], [("2244", "C9H8O4")])
+    result = run_python("import runpy; runpy.run_path('mcp_server.py', run_name='__mp_main__')",
+                        tmp_path, PUBCHEM_MCP_COMPOUND_TABLE=str(table))
+    assert result.returncode == 0, result.stderr
+    assert glob.glob(str(tmp_path / ".pubchem-mcp" / "*.log")) == []
+    assert "Opened compound table" not in result.stderr
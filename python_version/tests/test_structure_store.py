@@ -0,0 +1,40 @@
+"""
+Tests that structure records stay readable across processes sharing the cache directory,
+and that undecodable records read as misses
+"""
+
+import random
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from pubchem_mcp_server.structure_store import StructureStore
+
+
+def xyz_record(index):
+    rng = random.Random(index)
+    atoms = [f"{rng.choice('CNOH')} {rng.uniform(-5, 5):.6f} {rng.uniform(-5, 5):.6f} {rng.uniform(-5, 5):.6f}"
+             for _ in range(20)]
+    return f"20\nCID {index}\n" + "\n".join(atoms) + "\n"
+
+
+def test_reads_records_compressed_with_another_processes_dictionary(tmp_path):
+    # Two stores on one directory stand in for two server processes
+    reader = StructureStore(tmp_path)
+    reader.write("before", xyz_record(0))
+    writer = StructureStore(tmp_path)
+    assert writer.train_dictionary([xyz_record(i).encode("utf-8") for i in range(200)])
+    writer.write("after", xyz_record(1))
+
+    assert reader.read("after") == xyz_record(1)
+    assert reader.read("before") == xyz_record(0)
+
+
+def test_undecodable_record_is_a_miss(tmp_path):
+    store = StructureStore(tmp_path)
+    (tmp_path / "broken.zst").write_bytes(b"not a zstd frame")
+    (tmp_path / "truncated.gz").write_bytes(b"\x1f\x8b\x08")
+
+    assert store.read("broken") is None
+    assert store.read("truncated") is None
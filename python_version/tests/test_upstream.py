@@ -0,0 +1,54 @@
+"""Tests that waits for PubChem's rate limit give up when the request is cancelled or out of time"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from pubchem_mcp_server import upstream  # noqa: E402
+from pubchem_mcp_server.context import (DeadlineExceeded, RequestCancelled, RequestContext,  # noqa: E402
+                                        request_scope)
+
+
+def drained_limiter():
+    # One request every 10 seconds, with the only token already taken
+    limiter = upstream.RateLimiter(0.1, burst=1)
+    limiter.acquire()
+    return limiter
+
+
+def test_cancelled_request_stops_waiting_for_a_token():
+    limiter = drained_limiter()
+    context = RequestContext()
+    threading.Timer(0.1, context.cancel, ["Client disconnected"]).start()
+
+    start = time.monotonic()
+    with request_scope(context), pytest.raises(RequestCancelled):
+        limiter.acquire()
+    assert time.monotonic() - start < 1
+
+
+def test_wait_for_a_token_ends_at_the_deadline():
+    limiter = drained_limiter()
+
+    start = time.monotonic()
+    with request_scope(RequestContext(budget=0.2)), pytest.raises(DeadlineExceeded):
+        limiter.acquire()
+    assert time.monotonic() - start < 1
+
+
+def test_copies_starting_after_cancellation_are_not_sent():
+    sent = []
+
+    class Session:
+        def get(self, url, timeout=None):
+            sent.append(url)
+
+    context = RequestContext()
+    context.cancel()
+    with request_scope(context), pytest.raises(RequestCancelled):
+        upstream._hedged_request(Session(), "GET", "https://example.invalid", 1.0,
+                                 upstream.LatencyTracker(), hedge=False)
+    assert sent == []